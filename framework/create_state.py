@@ -12,20 +12,26 @@ PHI = 0
 CONFIG_PATH = 'fits.json'
 
 # imports
+import os
+import sys
 import json
 import numpy as np
 # from core import Manager
-from core import analysis
+FRAMEWORK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(FRAMEWORK_DIR, '..', 'oscar', 'machine_learning'))
+from calibration import get_fits
 
-# load config dictionary
-with open(CONFIG_PATH, 'r') as f:
+# load config dictionary and its calibration curves
+with open(os.path.join(FRAMEWORK_DIR, CONFIG_PATH), 'r') as f:
     CONFIG = json.load(f)
+CURVES = get_fits(os.path.join(FRAMEWORK_DIR, CONFIG_PATH))
 
 # functions
 
 def guess_qp(target_phi):
-    ''' Guess the quartz plate angle that achieves a target phi parameter using the config fit. '''
-    return analysis.find_value('sec', CONFIG['phi']['params'], target_phi)
+    ''' Guess the quartz plate angle that achieves a target phi parameter using the config fit. The fit spans a full period of phi, so the target is taken mod 360 into it. '''
+    phi_0 = CURVES['phi'].range[0]
+    return CURVES['phi'].inverse((target_phi - phi_0) % 360 + phi_0)
 
 def guess_uvhwp(target_alpha):
     ''' Guess the UVHWP angle that achieves a target alpha parameter using the config fit. '''
@@ -38,20 +44,20 @@ def guess_uvhwp(target_alpha):
         return CONFIG['alpha']['UVHWP_min']
     else:
         # otherwise use the linear fit
-        return analysis.find_value('line', CONFIG['alpha']['params'], target_alpha)
+        return CURVES['alpha'].inverse(target_alpha)
 
 def guess_bchwp(target_beta):
-    ''' Guess the UVHWP angle that achieves a target beta parameter using the config fit. '''
+    ''' Guess the BCHWP angle that achieves a target beta parameter using the config fit. '''
     # check bounds
     if target_beta > CONFIG['beta']['beta_max']:
         # requesting a target beta > maximum -> use the maximum
-        return CONFIG['beta']['UVHWP_max']
-    elif target_beta < CONFIG['beta']['alpha_min']:
-        # requesting a target alpha < minimum -> use the minimum
-        return CONFIG['beta']['UVHWP_min']
+        return CONFIG['beta']['BCHWP_max']
+    elif target_beta < CONFIG['beta']['beta_min']:
+        # requesting a target beta < minimum -> use the minimum
+        return CONFIG['beta']['BCHWP_min']
     else:
         # otherwise, we are in the linear-ish region so use the linear fit
-        return analysis.find_value('line', CONFIG['beta']['params'], target_beta)
+        return CURVES['beta'].inverse(target_beta)
 
 if __name__ == '__main__':
     print(guess_qp(PHI))
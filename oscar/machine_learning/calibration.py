@@ -0,0 +1,88 @@
+# file to hold the calibration curves of the state creation components, with fast inverse maps
+import json
+from os.path import join, dirname, abspath
+import numpy as np
+from scipy.interpolate import PchipInterpolator
+
+FITS_PATH = join(dirname(abspath(__file__)), '..', '..', 'framework', 'fits.json')
+
+## fit forms of framework/fits.json; angles in degrees ##
+def sec(x, a, b, c):
+    ''' Secant fit of phi vs QP angle, as in sweep_fits_updated.fit_phi. '''
+    return a / np.cos(np.deg2rad(b*x)) + c
+
+def line(x, m, b):
+    return m*x + b
+
+# name: (fit function, its parameter names, domain keys in the json or a fixed domain)
+FIT_FORMS = {
+    'phi': (sec, ('a', 'b', 'c'), (0, 38.299)), # the secant is even in x; the fit only includes phi up to phi(0)+360
+    'alpha': (line, ('m', 'b'), ('UVHWP_max', 'UVHWP_min')),
+    'beta': (line, ('m', 'b'), ('BCHWP_min', 'BCHWP_max')),
+}
+
+class CalibrationCurve:
+    ''' A vectorized forward map of a component angle with a monotone-spline inverse on its validity range.
+    The inverse interpolates a dense table of the forward map with a PCHIP spline, which keeps the monotonicity of the table, and is refined by one Newton step when the derivative is known.
+    params:
+        forward: vectorized function of the angle
+        domain: (low, high) angles over which forward is trusted; it must be strictly monotone there
+        deriv: optional vectorized derivative of forward
+        num_points: size of the table
+    '''
+    def __init__(self, forward, domain, deriv=None, num_points=4097):
+        self.forward = forward
+        self.deriv = deriv
+        self.domain = (min(domain), max(domain))
+        x = np.linspace(*self.domain, num_points)
+        y = forward(x)
+        dy = np.diff(y)
+        if not(np.all(dy > 0) or np.all(dy < 0)):
+            raise ValueError(f'Forward map is not strictly monotone on {self.domain}.')
+        if dy[0] < 0:
+            x, y = x[::-1], y[::-1]
+        self.range = (y[0], y[-1])
+        self._inverse = PchipInterpolator(y, x, extrapolate=False)
+
+    def __call__(self, x):
+        return self.forward(np.asarray(x, dtype=float))
+
+    def is_valid(self, y):
+        ''' Whether each target value is reachable within the domain. '''
+        y = np.asarray(y, dtype=float)
+        return (y >= self.range[0]) & (y <= self.range[1])
+
+    def inverse(self, y, clip=True):
+        ''' Angles giving the target values y.
+        params:
+            y: target values, any shape
+            clip: whether to send unreachable targets to the closest end of the domain; otherwise they give nan
+        '''
+        y = np.asarray(y, dtype=float)
+        if clip:
+            y = np.clip(y, *self.range)
+        x = self._inverse(y)
+        if self.deriv is not None:
+            x = np.clip(x - (self.forward(x) - y) / self.deriv(x), *self.domain)
+        return x[()]
+
+def load_fits(path=FITS_PATH):
+    ''' Calibration curves of the fits in a fits.json, keyed as in the json: 'phi' (QP), 'alpha' (UVHWP), 'beta' (BCHWP). Angles and parameters in degrees. '''
+    with open(path, 'r') as f:
+        config = json.load(f)
+    curves = {}
+    for name, (func, param_names, domain) in FIT_FORMS.items():
+        if name not in config: continue
+        params = [config[name]['params'][p] for p in param_names]
+        if isinstance(domain[0], str):
+            domain = [config[name][key] for key in domain]
+        curves[name] = CalibrationCurve(lambda x, func=func, params=params: func(x, *params), domain)
+    return curves
+
+_FITS_CACHE = {}
+def get_fits(path=FITS_PATH):
+    ''' load_fits, loaded once per path. '''
+    path = abspath(path)
+    if path not in _FITS_CACHE:
+        _FITS_CACHE[path] = load_fits(path)
+    return _FITS_CACHE[path]
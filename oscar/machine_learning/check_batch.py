@@ -0,0 +1,91 @@
+# file to check the batched rewrites against the per-state functions they replace
+import numpy as np
+from scipy.linalg import sqrtm
+
+from rho_methods import *
+from jones import get_Jrho, get_Jrho_batch, get_random_Jangles
+
+def get_random_rhos(num, rank=4, seed=0):
+    ''' num random density matrices (num,4,4) of the given rank, from Gaussian Ginibre matrices. '''
+    rng = np.random.default_rng(seed)
+    G = rng.normal(size=(num, 4, rank)) + 1j*rng.normal(size=(num, 4, rank))
+    rhos = G @ np.conj(np.swapaxes(G, -1, -2))
+    return rhos / np.trace(rhos, axis1=-2, axis2=-1)[:, None, None]
+
+def get_random_product_rhos(num, seed=0):
+    ''' num random separable product states rho_A x rho_B, (num,4,4). '''
+    rng = np.random.default_rng(seed)
+    def qubit(n):
+        G = rng.normal(size=(n, 2, 2)) + 1j*rng.normal(size=(n, 2, 2))
+        r = G @ np.conj(np.swapaxes(G, -1, -2))
+        return r / np.trace(r, axis1=-2, axis2=-1)[:, None, None]
+    return np.einsum('nij,nkl->nikjl', qubit(num), qubit(num)).reshape((num, 4, 4))
+
+def check_Jrho(num=20):
+    ''' get_Jrho_batch matches get_Jrho setting by setting, for every setup, with and without the experimental components. '''
+    for setup in ['C0', 'C1', 'C2', 'I']:
+        for expt in [True, False]:
+            angles = np.array([get_random_Jangles(setup=setup, expt=expt) for _ in range(num)])
+            rhos = np.array([get_Jrho(a, setup=setup, expt=expt) for a in angles])
+            err = np.max(np.abs(get_Jrho_batch(angles, setup, expt=expt) - rhos))
+            assert err < 1e-9, f'get_Jrho_batch differs from get_Jrho by {err} for setup {setup}, expt={expt}'
+
+def check_witnesses(num=10, tol=1e-6):
+    ''' compute_witnesses_batch reduced by get_witness_mins matches compute_witnesses on mixed and pure states, and is never worse than it by more than tol. '''
+    rhos = np.concatenate([get_random_rhos(num, 4, 1), get_random_rhos(num, 1, 2)])
+    W_batch = np.array(get_witness_mins(compute_witnesses_batch(rhos)[0])).T
+    W_single = np.array([compute_witnesses(rho) for rho in rhos], dtype=float)
+    assert np.all(W_batch <= W_single + tol), f'compute_witnesses_batch is above compute_witnesses by {np.max(W_batch - W_single)}'
+    err = np.max(np.abs(W_batch - W_single))
+    assert err < tol, f'compute_witnesses_batch differs from compute_witnesses by {err}'
+
+def check_counts_witnesses(num=200, num_params=50, tol=1e-12):
+    ''' The counts formulas of Wp2 and Wp5 agree with the operators <phi|PT(rho)|phi> and are nonnegative on product states. The old count-ratio forms had a sign error in one cross term and reached -0.10 there. '''
+    rng = np.random.default_rng(3)
+    rhos = np.concatenate([get_random_rhos(num, 4, 4), get_random_product_rhos(num, 5)])
+    S = get_stokes_from_projs(normalize_counts(1e4*get_all_projs(rhos)))
+    pt_rhos = partial_transpose_batch(rhos)
+    for name in ['Wp2', 'Wp5']:
+        i = WITNESS_NAMES.index(name)
+        params = rng.uniform(0, 2*np.pi, (num_params, 1, WITNESS_NUM_PARAMS[i]))
+        W_counts = get_witness_stokes(i, params, S[None])
+        phi = WITNESS_KETS[i](params)[0]
+        W_op = np.real(np.einsum('...i,...ij,...j->...', np.conj(phi), pt_rhos[None], phi))
+        err = np.max(np.abs(W_counts - W_op))
+        assert err < tol, f'counts {name} differs from the operator by {err}'
+        assert np.min(W_counts[:, num:]) > -tol, f'counts {name} is negative on a product state: {np.min(W_counts[:, num:])}'
+
+def check_fidelity(num=200, tol=1e-7):
+    ''' get_fidelity_batch matches (Tr sqrt(sqrt(rho1) rho2 sqrt(rho1)))^2 from scipy's sqrtm, for mixed and pure pairs, and <psi|rho2|psi> when every rho1 is pure.
+    A zero eigenvalue limits either square root to about sqrt(eps), hence tol. '''
+    rhos1 = np.concatenate([get_random_rhos(num, 4, 6), get_random_rhos(num, 1, 7)])
+    rhos2 = np.concatenate([get_random_rhos(num, 3, 8), get_random_rhos(num, 4, 9)])
+    fidelity = get_fidelity_batch(rhos1, rhos2)
+    for rho1, rho2, F in zip(rhos1, rhos2, fidelity):
+        sqrt_rho1 = sqrtm(rho1)
+        F_ref = np.real(np.trace(sqrtm(sqrt_rho1 @ rho2 @ sqrt_rho1)))**2
+        assert abs(F - F_ref) < tol, f'get_fidelity_batch gives {F}, sqrtm {F_ref}'
+    psi = np.linalg.eigh(rhos1[num:])[1][..., -1]
+    F_ref = np.real(np.einsum('ni,nij,nj->n', np.conj(psi), rhos2[num:], psi))
+    err = np.max(np.abs(get_fidelity_batch(rhos1[num:], rhos2[num:]) - F_ref))
+    assert err < 1e-12, f'get_fidelity_batch differs from <psi|rho|psi> by {err} for pure rho1'
+
+def check_mle(num=200, num_counts=1000, tol=1e-10):
+    ''' reconstruct_rho_mle returns physical states from noisy counts, and recovers exact projections of a state. '''
+    rng = np.random.default_rng(10)
+    rhos = np.concatenate([get_random_rhos(num, 4, 11), get_random_rhos(num, 1, 12)])
+    counts = rng.poisson(num_counts*get_all_projs(rhos)) + 1e-9 # keep every basis pair normalizable
+    rhos_mle = reconstruct_rho_mle(normalize_counts(counts))
+    eig_vals = np.linalg.eigvalsh(herm_part(rhos_mle))
+    assert np.max(np.abs(rhos_mle - np.conj(np.swapaxes(rhos_mle, -1, -2)))) < tol, 'reconstruct_rho_mle returned a non-Hermitian matrix'
+    assert np.max(np.abs(np.trace(rhos_mle, axis1=-2, axis2=-1) - 1)) < tol, 'reconstruct_rho_mle returned a matrix without unit trace'
+    assert np.min(eig_vals) > -tol, f'reconstruct_rho_mle returned a negative eigenvalue {np.min(eig_vals)}'
+    err = np.max(np.abs(reconstruct_rho_mle(get_all_projs(rhos)) - rhos))
+    assert err < 1e-8, f'reconstruct_rho_mle misses exact projections by {err}'
+
+CHECKS = [check_Jrho, check_witnesses, check_counts_witnesses, check_fidelity, check_mle]
+
+if __name__ == '__main__':
+    for check in CHECKS:
+        check()
+        print(check.__name__, 'ok')
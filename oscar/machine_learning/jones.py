@@ -4,11 +4,12 @@
 from os.path import isdir, join
 import os
 import numpy as np
-from scipy.optimize import minimize, approx_fprime
+from scipy.optimize import minimize
 
 # special methods for density matrices #
 from rho_methods import *
 from random_gen import *
+from calibration import CalibrationCurve
 
 ### experimental variables to reflect non-idealities in model ###
 # QP #
@@ -92,6 +93,12 @@ def a(x, params=[5.02266366e-09, -7.89724832e+02, -3.41393047e-03,  2.37070122e+
     return a*x**4 + b*x*3 + c*x**2 + d*x +e
 
 
+def da(x, params=[5.02266366e-09, -7.89724832e+02, -3.41393047e-03,  2.37070122e+03,-1.90440641e+02]):
+    ''' Derivative of a with respect to the QP angle in radians; same params as a. '''
+    x = np.rad2deg(x)
+    a, b, c, d, e = params
+    return (4*a*x**3 + b*3 + 2*c*x + d) * 180/np.pi
+
 def BBO_expt(QP_rot):
     return np.array([[0, 0, 0, a(QP_rot)], [1, 0,0,0]], dtype='complex').T
 
@@ -122,15 +129,22 @@ def get_phi(QP_rot, params=[-1.39457353e+01, -2.22473380e-02,  1.27918243e-01,
 
     return -phi
 
+def get_dphi(QP_rot, params=[-1.39457353e+01, -2.22473380e-02,  1.27918243e-01,  3.38791354e+00,-1.45863718e+01, -3.35914837e+02,2.57078371e+03, 1.25499431e+02, -4.44347126e+04, 9.90780793e+04]):
+    '''Derivative of get_phi with respect to QP_rot, both in radians; same params as get_phi.'''
+    a, b, c, d, e, f, g, h, i, j = params
+    dphi = a*np.sin(QP_rot) / np.cos(QP_rot)**2 + 8*b*QP_rot**7 + 7*c*QP_rot**6 + 6*d*QP_rot**5 + 5*e*QP_rot**4 + 4*f*QP_rot**3 + 3*g*QP_rot**2 + 2*h*QP_rot + i
+    return -dphi
+
+# get_phi is monotone on the experimental QP range, so its inverse is a table lookup
+QP_PHI_CURVE = CalibrationCurve(get_phi, (5.646885307179586, 2*np.pi), deriv=get_dphi)
+
 def get_QP_rot(phi):
     '''Function to return inverse of get_phi, that is what the theoretical angle is'.
-    Assumes input is in degrees.
+    Assumes input is in degrees, and outputs in degrees; vectorized. phi is taken mod 360 into the range of get_phi, and phases outside it go to the nearest end of the QP range.
     '''
-    phi = np.deg2rad(phi)
-    def diff(QP_rot):
-        return phi - get_phi(QP_rot)
-    val = minimize(diff, x0=[np.pi], bounds = [(0, 2*np.pi)]).fun[0] % (2*np.pi)
-    return np.rad2deg(val)
+    low = QP_PHI_CURVE.range[0]
+    phi = (np.deg2rad(phi) - low) % (2*np.pi) + low
+    return np.rad2deg(QP_PHI_CURVE.inverse(phi))
 
 def get_QP_expt(QP_rot):
     ''' QP matrix for angle phi_a, where phi_a is the actual angle of the QP'''
@@ -319,88 +333,227 @@ def get_Jrho(angles, setup = 'C0', add_noise = False, p = 0.04, expt = True, che
             return rho
 
 
-def get_random_Jangles(setup='C1', expt=True):
-    ''' Returns random angles for the Jrho_C setup. Confirms that the density matrix is valid.
-    params: 
-        setup: see get_Jrho
-        bad: boolean for whether to return U*Is_0 or U*Is_0 @ adjoint(U*Is_0) -- set to False by default.
-
+#### batched calculations ####
+# Component matrices for stacks of angles (...), as (...,2,2) arrays; same conventions as R, H, Q and get_QP above.
+def R_batch(alpha):
+    ''' Rotation matrices for angles alpha (...) '''
+    c, s = np.cos(alpha), np.sin(alpha)
+    return np.stack([np.stack([c, s], axis=-1), np.stack([-s, c], axis=-1)], axis=-2)
+def H_batch(theta):
+    ''' HWP matrices for angles theta (...) '''
+    return R_batch(theta) @ np.diag([-1, 1]) @ R_batch(-theta)
+def Q_batch(alpha):
+    ''' QWP matrices for angles alpha (...) '''
+    return R_batch(alpha) @ np.diag([np.e**(np.pi / 4 * 1j), np.e**(-np.pi / 4 * 1j)]) @ R_batch(-alpha)
+def dH_batch(theta):
+    ''' Derivatives of H_batch; dR(x)/dx = R(x + pi/2) '''
+    return R_batch(theta + np.pi/2) @ np.diag([-1, 1]) @ R_batch(-theta) - R_batch(theta) @ np.diag([-1, 1]) @ R_batch(np.pi/2 - theta)
+def dQ_batch(alpha):
+    ''' Derivatives of Q_batch; dR(x)/dx = R(x + pi/2) '''
+    J = np.diag([np.e**(np.pi / 4 * 1j), np.e**(-np.pi / 4 * 1j)])
+    return R_batch(alpha + np.pi/2) @ J @ R_batch(-alpha) - R_batch(alpha) @ J @ R_batch(np.pi/2 - alpha)
+
+def chain_grad(factors):
+    ''' Product M_n ... M_1 of a chain of (...,2,2) factors given in the order light meets them, [(M_1, dM_1, j_1), ...], and the derivative of the product with respect to each factor's angle.
+    returns:
+        prod: (...,2,2)
+        grads: list of (j, dprod) with dprod = M_n ... dM_i ... M_1
     '''
+    right = [np.eye(2)] # right[i] = M_i ... M_1
+    for M, _, _ in factors:
+        right.append(M @ right[-1])
+    grads = []
+    left = np.eye(2) # M_n ... M_(i+1)
+    for i in range(len(factors) - 1, -1, -1):
+        M, dM, j = factors[i]
+        grads.append((j, left @ dM @ right[i]))
+        left = left @ M
+    return right[-1], grads
+
+# number of angles of each setup, in the order of get_Jrho
+JONES_NUM_ANGLES = {'C0': 3, 'C1': 4, 'C2': 5, 'I': 9}
+
+def get_Jpsi_batch(angles, setup='C0', expt=True, return_grad=False):
+    ''' Unnormalized pair ket U s0 for a stack of waveplate settings, and optionally its analytic derivatives with respect to each angle.
+    Only the pump column of the Jones matrix U is needed, so the state is propagated as a vector: the pump through UV_HWP, QP (or the initial QWPs for 'I'),
+    the BBO maps it to the 2x2 amplitude matrix psi of the pair, and the local optics act as A psi B^T, which is kron(A, B) on the flattened state.
+    Params:
+        angles: (...,k) angles for setup, in the order of get_Jrho; k is JONES_NUM_ANGLES[setup]
+        setup: 'C0', 'C1', 'C2', 'I'
+        expt: boolean to use the experimental QP (get_QP_expt) and BBO (BBO_expt) for the C setups, applied elementwise
+        return_grad: boolean to also return the derivatives
+    Returns:
+        psi: (...,4)
+        dpsi: (...,k,4), only if return_grad
+    '''
+    if setup not in JONES_NUM_ANGLES:
+        raise ValueError(f'Invalid setup. You have {setup} but needs to be either "C0", "C1", "C2", or "I".')
+    angles = np.asarray(angles, dtype=float)
+    k = JONES_NUM_ANGLES[setup]
+    if angles.shape[-1] != k:
+        raise ValueError(f'Setup {setup} takes {k} angles, but angles has shape {angles.shape}.')
+    batch_shape = angles.shape[:-1]
+    angles = np.moveaxis(angles, -1, 0)
+    zeros = np.zeros(batch_shape)
+
+    # optics in the order the light meets them, as (matrix, derivative, index of angle)
+    def waveplate(kind, j):
+        return (H_batch(angles[j]), dH_batch(angles[j]), j) if kind == 'H' else (Q_batch(angles[j]), dQ_batch(angles[j]), j)
+    if setup == 'I':
+        pump_factors = [waveplate('H', 0), waveplate('Q', 1), waveplate('Q', 2)]
+        bbo_a, dbbo_a = 1 + zeros, zeros
+    else:
+        phi = angles[1]
+        g, dg = (get_phi(phi), get_dphi(phi)) if expt else (phi, 1 + zeros)
+        QP = np.zeros(batch_shape + (2,2), dtype=complex)
+        QP[..., 0, 0], QP[..., 1, 1] = 1, np.exp(1j*g)
+        dQP = np.zeros_like(QP)
+        dQP[..., 1, 1] = 1j*dg*np.exp(1j*g)
+        pump_factors = [waveplate('H', 0), (QP, dQP, 1)]
+        bbo_a, dbbo_a = (a(phi), da(phi)) if expt else (1 + zeros, zeros)
+    if setup == 'C0':
+        A_factors, B_factors = [], [waveplate('H', 2)]
+    elif setup == 'C1':
+        A_factors, B_factors = [], [waveplate('H', 2), waveplate('Q', 3)]
+    elif setup == 'C2':
+        A_factors, B_factors = [waveplate('Q', 4)], [waveplate('H', 2), waveplate('Q', 3)]
+    else: # 'I'
+        A_factors, B_factors = [waveplate('H', 4), waveplate('Q', 8), waveplate('Q', 7)], [waveplate('H', 3), waveplate('Q', 6), waveplate('Q', 5)]
+
+    # BBO: H pump -> a |VV>, V pump -> |HH>
+    def bbo(pump, ratio):
+        psi = np.zeros(pump.shape[:-1] + (2,2), dtype=complex)
+        psi[..., 0, 0] = pump[..., 1]
+        psi[..., 1, 1] = ratio * pump[..., 0]
+        return psi
+
+    P, pump_grads = chain_grad(pump_factors)
+    A, A_grads = chain_grad(A_factors)
+    B, B_grads = chain_grad(B_factors)
+    pump = P[..., :, 0] # s0 = |H>
+    psi = bbo(pump, bbo_a)
+    psi_out = (A @ psi @ np.swapaxes(B, -1, -2)).reshape(batch_shape + (4,))
+    if not return_grad:
+        return psi_out
+
+    dpsi = np.zeros(batch_shape + (k, 2, 2), dtype=complex)
+    for j, dP in pump_grads:
+        dpsi[..., j, :, :] += A @ bbo(dP[..., :, 0], bbo_a) @ np.swapaxes(B, -1, -2)
+    if setup != 'I':
+        dpsi[..., 1, :, :] += A @ bbo(pump * np.array([1, 0]), dbbo_a) @ np.swapaxes(B, -1, -2)
+    for j, dA in A_grads:
+        dpsi[..., j, :, :] += dA @ psi @ np.swapaxes(B, -1, -2)
+    for j, dB in B_grads:
+        dpsi[..., j, :, :] += A @ psi @ np.swapaxes(dB, -1, -2)
+    return psi_out, dpsi.reshape(batch_shape + (k, 4))
+
+def get_Jrho_batch(angles, setup='C0', add_noise=False, p=0.04, expt=True):
+    ''' Batched get_Jrho: density matrices for a stack of waveplate settings in one call, from get_Jpsi_batch.
+    Params:
+        angles: (...,k) angles for setup, in the order of get_Jrho; k is JONES_NUM_ANGLES[setup]
+        setup: 'C0', 'C1', 'C2', 'I'
+        add_noise: boolean to mix each state with the maximally mixed one
+        p: probability of noise
+        expt: boolean to use the experimental QP (get_QP_expt) and BBO (BBO_expt) for the C setups, applied elementwise
+    Returns:
+        (...,4,4) density matrices
+    '''
+    psi = get_Jpsi_batch(angles, setup, expt)
+    rho = np.einsum('...i,...j->...ij', psi, np.conj(psi))
+    rho /= np.trace(rho, axis1=-2, axis2=-1)[..., None, None]
+    if add_noise:
+        rho = (1-p)*rho + p*np.eye(4)/4
+    return rho
+
+def get_Jangle_bounds(setup='C0', expt=True):
+    ''' Ranges of the angles of each setup, in the order of get_Jrho, as a list of (low, high). '''
+    H_bound = (0, np.pi/4)
+    Q_bound = (0, np.pi/2)
+    if expt:
+        # QP_bound = (0, np.deg2rad(38.299))
+        QP_bound = (5.646885307179586, 2*np.pi)
+    else:
+        QP_bound = (0, 2*np.pi)
+    if setup=='C0':
+        # theta_uv, phi, theta_B
+        return [H_bound, QP_bound, H_bound]
+    elif setup=='C1':
+        return [H_bound, QP_bound, H_bound, Q_bound]
+    elif setup=='C2':
+        return [H_bound, QP_bound, H_bound, Q_bound, Q_bound]
+    elif setup=='I':
+        return [H_bound, Q_bound, Q_bound, H_bound, H_bound, Q_bound, Q_bound, Q_bound, Q_bound]
+    else:
+        raise ValueError(f'Invalid setup. Must be either "C0", "C1", "C2" or "I". You have {setup}.')
 
-    def get_angles():
-
-        if setup=='C0':
-            # UV HWP
-            theta_UV = np.random.rand()*np.pi/4
-            # QP
-            if expt: 
-                # phi = np.random.uniform(0, np.deg2rad(38.299))
-                phi = np.random.uniform(5.646885307179586, 2*np.pi)
-            else:
-                phi = np.random.rand()*2*np.pi
-            # B HWP
-            theta_B = np.random.rand()*np.pi/4
-            
-            angles= [theta_UV, phi, theta_B]
-
-        elif setup=='C1':
-            # UV HWP
-            theta_UV = np.random.rand()*np.pi/4
-            # QP
-            if expt:
-                # phi = np.random.uniform(0, np.deg2rad(38.299)) # 40 degrees is the max angle for the QP
-                phi = np.random.uniform(5.646885307179586, 2*np.pi)
-            else:
-                phi = np.random.rand()*2*np.pi
-            # B HWP
-            theta_B = np.random.rand()*np.pi/4
-            # QWPs
-            alpha = np.random.rand()*np.pi/2
-            angles= [theta_UV, phi, theta_B, alpha]
-            
-        
-        elif setup=='C2':
-            # UV HWP
-            theta_UV = np.random.rand()*np.pi/4
-            # QP
-            if expt:
-                # phi =np.random.uniform(0, np.deg2rad(38.299)) # 40 degrees is the max angle for the QP
-                phi = np.random.uniform(5.646885307179586, 2*np.pi)
-
-            else:
-                phi = np.random.rand()*2*np.pi
-            # B HWP
-            theta_B = np.random.rand()*np.pi/4
-            # QWPs
-            alpha_ls = np.random.rand(2)*np.pi/2
-         
-            angles= [theta_UV, phi, theta_B, *alpha_ls]
-
-        elif setup=='I':
-            # UVHWP 
-            theta_0 = np.random.rand()*np.pi/4
-            # initial QWPs
-            Q_init = np.random.rand(2)*np.pi/2
-            # HWPs
-            theta_ls = np.random.rand(2)*np.pi/4
-            # B and A QWPs
-            alpha_ls = np.random.rand(4)*np.pi/2
+JONES_STRAT_METRICS = {'concurrence': (get_concurrence_batch, (0, 1))} # name: (batched metric, its range). No purity: the Jones states all share one, so its bins could never fill
 
-            angles= [theta_0, *Q_init, *theta_ls, *alpha_ls]
+def get_random_Jangles_batch(num, setup='C1', expt=True, strat=None, num_bins=10, strat_range=None, add_noise=False, p=0.04, max_rounds=100, return_rhos=False):
+    ''' Draws num random angle settings, uniform within get_Jangle_bounds, whose states are valid. Candidates are simulated together with get_Jrho_batch and filtered with is_valid_rho_batch, refilling until num are valid.
+    params:
+        num: number of settings
+        setup: see get_Jrho
+        expt: whether to use experimental components
+        strat: None, a key of JONES_STRAT_METRICS, or a function of (n,4,4) states returning (n,) values; if given, the settings are balanced over num_bins equal bins of the metric instead of following the uniform distribution of the angles
+        num_bins: number of bins for strat
+        strat_range: (low, high) of the bins; the range of the metric in JONES_STRAT_METRICS if None, and required for a function. States outside it, or with a nan metric, are dropped
+        add_noise, p: see get_Jrho
+        max_rounds: max number of batches of candidates to draw before giving up
+        return_rhos: whether to also return the states
+    returns:
+        (num,k) angles, and (num,4,4) density matrices if return_rhos
+    '''
+    low, high = np.array(get_Jangle_bounds(setup, expt)).T
+    def gen_batch(n):
+        angles = np.random.uniform(low, high, (n, len(low)))
+        return get_Jrho_batch(angles, setup, add_noise, p, expt), angles
 
+    if strat is None:
+        rhos, angles = sample_valid_batch(gen_batch, num, max_rounds)
+    else:
+        if isinstance(strat, str):
+            if strat not in JONES_STRAT_METRICS:
+                raise ValueError(f'Invalid strat {strat}. Must be one of {list(JONES_STRAT_METRICS)} or a function of the states; the Jones states all have the same purity, so they cannot be stratified by it.')
+            metric, default_range = JONES_STRAT_METRICS[strat]
         else:
-            raise ValueError(f'Invalid setup. You have {setup} but needs to be either "C" or "I" or "Ca".')
-
-        return angles
-
-    # confirm angles are valid #
-    angles = get_angles()
-    while not(is_valid_rho(get_Jrho(angles=angles, setup=setup))):
-        angles = get_angles()
-    # while np.isclose(get_Jrho(angles=angles, setup=setup) , np.zeros):
-    #     angles = get_angles()
+            if strat_range is None:
+                raise ValueError('strat_range is required when strat is a function, as the range of its values is not known.')
+            metric, default_range = strat, None
+        lo, hi = default_range if strat_range is None else strat_range
+        quota = num // num_bins + (np.arange(num_bins) < num % num_bins)
+        rhos_ls, angles_ls = [], []
+        for _ in range(max_rounds):
+            rhos, angles = gen_batch(max(4*np.sum(quota), 256))
+            valid, _ = is_valid_rho_batch(rhos)
+            vals = np.asarray(metric(rhos[valid]), dtype=float)
+            rhos, angles = rhos[valid], angles[valid]
+            finite = np.isfinite(vals) # nan metrics would fall in an arbitrary bin
+            vals, rhos, angles = vals[finite], rhos[finite], angles[finite]
+            bins = np.floor((vals - lo) / (hi - lo) * num_bins).astype(int)
+            bins[vals == hi] = num_bins - 1
+            for b in np.nonzero(quota)[0]:
+                i = np.nonzero(bins == b)[0][:quota[b]]
+                rhos_ls.append(rhos[i])
+                angles_ls.append(angles[i])
+                quota[b] -= len(i)
+            if not np.any(quota):
+                break
+        else:
+            raise RuntimeError(f'bins {np.nonzero(quota)[0]} of {strat} are not filled after {max_rounds} batches')
+        order = np.random.permutation(num)
+        rhos, angles = np.concatenate(rhos_ls)[order], np.concatenate(angles_ls)[order]
+    if return_rhos:
+        return angles, rhos
     return angles
 
+def get_random_Jangles(setup='C1', expt=True):
+    ''' Returns random angles for the Jrho_C setup. Confirms that the density matrix is valid.
+    params: 
+        setup: see get_Jrho
+        expt: whether to use experimental components
+    '''
+    return list(get_random_Jangles_batch(1, setup, expt)[0])
+
 
 def get_random_jones(setup='C1', expt=True, return_params=False):
     ''' Computes random angles in the ranges specified and generates the resulting states'''
@@ -412,175 +565,56 @@ def get_random_jones(setup='C1', expt=True, return_params=False):
     if return_params: return [rho, angles]
     else: return rho
 
-def jones_decompose(targ_rho, targ_name='Test', setup = 'C0', adapt=0, debug=False, frac = 0.001, zeta = 0.01, expt=True, gd_tune=False, save_rho = False, verbose=True, epsilon=0.999, N = 1000, add_noise=False):
-    ''' Function to decompose a given density matrix into jones matrices
+def get_random_jones_batch(num, setup='C1', expt=True, return_params=False, **kwargs):
+    ''' Batched get_random_jones: num random valid states (num,4,4), and optionally their angles (num,k). kwargs are passed to get_random_Jangles_batch, e.g. strat to balance them over concurrence. '''
+    angles, rhos = get_random_Jangles_batch(num, setup, expt, return_rhos=True, **kwargs)
+    if return_params: return rhos, angles
+    else: return rhos
+
+def jones_decompose(targ_rho, targ_name='Test', setup = 'C0', adapt=0, debug=False, frac = 0.001, zeta = 0.01, expt=True, gd_tune=False, save_rho = False, verbose=True, epsilon=0.999, N = 1000, add_noise=False, index=None, num_starts=32):
+    ''' Function to decompose a given density matrix into jones matrices; runs jones_decompose_population with the same arguments and outputs as before
     params:
         targ_rho: target density matrix
         targ_name: name of target state
         setup: see get_Jrho
-        adapt: 0: random hop, 1: random fan, 2: gradient descent
-        frac: what percentage of the domain of the angles to change each time in adapt
-        zeta: learning rate for gradient descent
+        adapt: kept for the callers and returned as given; every start now follows the analytic gradient
+        frac, zeta: kept for the callers and returned when gd_tune; no longer used
         expt: whether to use experimental components
-        state_num: number of the state to decompose for progress tracking
         gd_tune: whether to output parameters for gd tuning
         save_rho: whether to save the density matrix
         verbose: whether to include print statements.
         debug: whether to enforce try/excpet to block errors
         epsilon: maximum tolerance for fidelity; if reached, halleljuah and break early!
-        N: max number of times to try to optimize
+        N: max number of local optimizations, counted over the starts of all rounds
         add_noise: whether to add noise when trying to predict the state
-        BBO_corr: what level of BBO corection to do
+        index: JonesIndex for this setup and expt; if given, the first round starts from the nearest indexed settings instead of random ones
+        num_starts: starts optimized together per round
     returns:
         targ_name: name of target state
         setup: string representation
-        adapt: 0: random hop, 1: random fan, 2: gradient descent
-        frac, zeta: params for GD
-        n: num of iterations until solution
+        adapt: as given
+        n: num of local optimizations until solution
         max_best_fidelity: fidelity of best guess
         max_best_angles: angle settings corresponding to best guess
         best_pred_rho: best guess at density matrix
         targ_rho: target density matrix
     '''
-
-    # set zeta to be more aggressive for C based on tuning
-    if setup=='C2':
-        zeta=0.07
-
-    elif setup=='C0':
-        frac=.02
-        zeta=1
-
-    elif setup=='C1': # change these values with tuning
-        frac=.02
-        zeta=1
+    # outside decompose, so a mismatched index is not swallowed in debug mode
+    if index is not None:
+        index.check(setup, expt)
 
     def decompose():
-        func = lambda angles: get_Jrho(angles=angles, setup=setup, expt=expt, add_noise=add_noise)
-
-        # iset bounds for guesses
-        H_bound = (0, np.pi/4)
-        Q_bound = (0, np.pi/2)
-        if expt:
-            # QP_bound = (0, np.deg2rad(38.299))
-            QP_bound = (5.646885307179586, 2*np.pi)
-        else:
-            QP_bound = (0, 2*np.pi)
-        if setup=='C0':
-            # theta_uv, phi, theta_B
-            bounds = [H_bound, QP_bound, H_bound]
-        elif setup=='C1':
-            bounds = [H_bound, QP_bound, H_bound, Q_bound]
-        elif setup=='C2':
-            bounds = [H_bound, QP_bound, H_bound, Q_bound, Q_bound]
-        elif setup=='I':
-            bounds = [H_bound, Q_bound, Q_bound, H_bound, H_bound, Q_bound, Q_bound, Q_bound, Q_bound]
-        else:
-            raise ValueError(f'Invalid setup. Must be either "C" or "I" or "Ca". You have {setup}.')
-
-        def loss_fidelity(angles):
-            ''' Function to quantify the distance between the targ and pred density matrices'''
-            pred_rho = func(angles)
-            fidelity = get_fidelity(pred_rho, targ_rho)
-            
-            return 1-np.sqrt(fidelity)
-
-        # get initial result
-        def minimize_angles(x0):
-            result = minimize(loss_fidelity, x0=x0, bounds=bounds)
-            best_angles = result.x
-            rho = func(best_angles)
-            fidelity = get_fidelity(rho, targ_rho)
-            return best_angles, fidelity, rho
-
-        x0 = get_random_Jangles(setup=setup, expt=expt)
-        best_angles, fidelity, rho = minimize_angles(x0)
-        
-        # iterate eiher until we hit max bound or we get a valid rho with fidelity above the min
-        if is_valid_rho(rho) and (fidelity < 1 or np.isclose(fidelity, 1, rtol=1e-9)):
-            max_best_fidelity = fidelity
-            max_best_angles = best_angles
-        else:
-            max_best_fidelity = 0
-            max_best_angles = [0 for _ in best_angles]
-        # max_best_fidelity = fidelity
-        # max_best_angles = best_angles
-        grad_angles = max_best_angles # keep track of the angles for gradient descent
-
-        n=0 # keep track of overall number of iterations
-        index_since_improvement = 0 # keep track of number of iterations since the max fidelity last improved
-        while n < N and max_best_fidelity<epsilon:
-            try:
-                if verbose: 
-                    print('n', n)
-                    print(fidelity, max_best_fidelity)
-                
-                ### different strategies ###
-                ## random fan ##
-                if adapt==1 and not(np.all(max_best_angles == np.zeros(len(max_best_angles)))):
-                    m+=1
-                    if m>0:
-                        if m==frac*N:
-                            x0 = get_random_Jangles(setup=setup)
-                            m=-frac*N
-
-                        x0 = [np.random.uniform(max(bounds[i][0], max_best_angles[i] * (1 - m * ((bounds[i][1] - bounds[i][0]) / (frac * N)))),
-                            min(bounds[i][1], max_best_angles[i] * (1 + m * ((bounds[i][1] - bounds[i][0]) / (frac * N)))))
-        for i in range(len(max_best_angles))]
-
-                    else: # cool down
-                        x0 = get_random_Jangles(setup=setup)
-
-                ## gradient descent ##
-                elif adapt==2:            
-                    if index_since_improvement % (frac*N)==0: # periodic random search (hop)
-                        x0 = get_random_Jangles(setup=setup)
-                    else:
-                        gradient = approx_fprime(grad_angles, loss_fidelity, epsilon=1e-8) # epsilon is step size in finite difference
-                        # if verbose: print(gradient)
-                        # update angles
-                        x0 = [max_best_angles[i] - zeta*gradient[i] for i in range(len(max_best_angles))]
-                        grad_angles = x0
-
-
-                ## random hop ##
-                else:
-                    x0 = get_random_Jangles(setup=setup)
-
-                best_angles, fidelity, rho = minimize_angles(x0)
-
-                if fidelity > max_best_fidelity and is_valid_rho(rho) and (fidelity < 1 or np.isclose(fidelity, 1, rtol=1e-9)):
-                    max_best_fidelity = fidelity
-                    max_best_angles = best_angles
-                    index_since_improvement = 0
-                elif not(is_valid_rho(rho)):
-                    n-=1
-                # if fidelity > max_best_fidelity and (fidelity < 1 or np.isclose(fidelity, 1, rtol=1e-9)):
-                #     max_best_fidelity = fidelity
-                #     max_best_angles = best_angles
-                #     index_since_improvement = 0
-                else:
-                    index_since_improvement += 1
-
-                n+=1
-
-            except KeyboardInterrupt:
-                print('interrupted...saving best result so far')
-                break
-
-        # compute projections in 12 basis states
-        best_pred_rho = func(max_best_angles)
-        proj_pred = get_all_projs(func(max_best_angles))
-        proj_targ = get_all_projs(targ_rho)
-
-        # if verbose:
-        # print('index of state generated', i)
-        print('actual state', targ_rho)
-        print('predicted state', func(max_best_angles) )
-        print('num iterations', n)
-        print('fidelity', max_best_fidelity)
-        print('projections of predicted', proj_pred)
-        print('projections of actual', proj_targ)
+        starts = max(1, min(num_starts, N))
+        _, _, rounds, max_best_fidelity, max_best_angles, best_pred_rho, targ_rho_ = jones_decompose_population(targ_rho, targ_name, setup, expt, num_starts=starts, max_rounds=max(1, int(np.ceil(N / starts))), epsilon=epsilon, add_noise=add_noise, verbose=verbose, index=index)
+        n = rounds*starts
+
+        if verbose:
+            print('actual state', targ_rho_)
+            print('predicted state', best_pred_rho)
+            print('num iterations', n)
+            print('fidelity', max_best_fidelity)
+            print('projections of predicted', get_all_projs(best_pred_rho))
+            print('projections of actual', get_all_projs(targ_rho_))
 
         if not(gd_tune):
             if save_rho: # save best predicted and actual rho
@@ -589,9 +623,9 @@ def jones_decompose(targ_rho, targ_name='Test', setup = 'C0', adapt=0, debug=Fal
                     os.makedirs(join('decomp', targ_name, setup))
                 # save rho
                 np.save(join('decomp', targ_name, setup, f'pred_rho_{n}_{max_best_fidelity}'), best_pred_rho)
-                np.save(join('decomp', targ_name, setup, f'targ_rho'), targ_rho)
+                np.save(join('decomp', targ_name, setup, f'targ_rho'), targ_rho_)
 
-            return targ_name,setup, adapt, n, max_best_fidelity, max_best_angles, best_pred_rho, targ_rho
+            return targ_name, setup, adapt, n, max_best_fidelity, max_best_angles, best_pred_rho, targ_rho_
 
         else:
             return setup, frac, zeta, n, max_best_fidelity
@@ -604,6 +638,175 @@ def jones_decompose(targ_rho, targ_name='Test', setup = 'C0', adapt=0, debug=Fal
     else:
         return decompose()
 
+#### settings -> state index ####
+JONES_INDEX_GRID_SIZE = {'C0': 48, 'C1': 24, 'C2': 12, 'I': 4} # default points per angle
+
+def get_Jstokes_batch(rhos):
+    ''' The 15 real Stokes coordinates (...,15) of a stack of density matrices, dropping the trivial II term. Euclidean distance between them is twice the Hilbert-Schmidt distance of the states. '''
+    return np.real(get_expec_vals(rhos)).reshape(np.shape(rhos)[:-2] + (16,))[..., 1:]
+
+class JonesIndex:
+    ''' Nearest-neighbor index from target states to waveplate settings of one setup, for warm-starting the decompositions.
+    A dense grid of settings within get_Jangle_bounds is simulated once with get_Jrho_batch, and a KD-tree over the Stokes coordinates of the states answers queries.
+    params:
+        angles: (M,k) indexed settings
+        stokes: (M,15) Stokes coordinates of their states
+        setup: see get_Jrho
+        expt: whether the states used the experimental components
+    '''
+    def __init__(self, angles, stokes, setup='C0', expt=True):
+        from scipy.spatial import cKDTree
+        self.angles = np.asarray(angles)
+        self.stokes = np.asarray(stokes)
+        self.setup = setup
+        self.expt = expt
+        self.tree = cKDTree(self.stokes)
+
+    @classmethod
+    def build(cls, setup='C0', expt=True, grid_size=None, chunk_size=2**18):
+        ''' Simulates the grid of settings.
+        params:
+            setup: see get_Jrho
+            expt: whether to use experimental components
+            grid_size: points per angle; JONES_INDEX_GRID_SIZE[setup] if None, or a tuple with one entry per angle
+            chunk_size: number of settings simulated at once
+        '''
+        bounds = get_Jangle_bounds(setup, expt)
+        if grid_size is None: grid_size = JONES_INDEX_GRID_SIZE[setup]
+        if np.isscalar(grid_size): grid_size = (grid_size,)*len(bounds)
+        axes = [np.linspace(low, high, n) for (low, high), n in zip(bounds, grid_size)]
+        angles = np.stack(np.meshgrid(*axes, indexing='ij'), axis=-1).reshape((-1, len(bounds)))
+        stokes = np.concatenate([get_Jstokes_batch(get_Jrho_batch(angles[i:i+chunk_size], setup, expt=expt)) for i in range(0, len(angles), chunk_size)])
+        return cls(angles, stokes, setup, expt)
+
+    def save(self, path):
+        ''' Saves the grid and its states to an .npz; the tree is rebuilt on load. '''
+        np.savez(path, angles=self.angles, stokes=self.stokes, setup=self.setup, expt=self.expt)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        return cls(data['angles'], data['stokes'], str(data['setup']), bool(data['expt']))
+
+    @classmethod
+    def load_or_build(cls, setup='C0', expt=True, grid_size=None, path=None):
+        ''' Loads the index persisted at path, building and saving it first if it doesn't exist. Defaults to decomp/jones_index_{setup}_{expt}.npz. '''
+        if path is None:
+            path = join('decomp', f'jones_index_{setup}_{expt}.npz')
+        if os.path.isfile(path):
+            return cls.load(path)
+        index = cls.build(setup, expt, grid_size)
+        if os.path.dirname(path) and not(isdir(os.path.dirname(path))): os.makedirs(os.path.dirname(path))
+        index.save(path)
+        return index
+
+    def check(self, setup, expt):
+        ''' Raises ValueError unless the index was built for this setup and expt, so its settings fit the model being decomposed. '''
+        if self.setup != setup or self.expt != expt:
+            raise ValueError(f'Index is for setup {self.setup} with expt={self.expt}, but the decomposition uses setup {setup} with expt={expt}.')
+
+    def query(self, targ_rhos, k=1):
+        ''' Nearest indexed settings of one or a stack of targets.
+        params:
+            targ_rhos: (...,4,4) target density matrices
+            k: number of neighbors
+        returns:
+            dist: (...,k) Hilbert-Schmidt distances of the neighbors' states to the targets
+            angles: (...,k,n_angles) settings of the neighbors, closest first
+        '''
+        dist, i = self.tree.query(get_Jstokes_batch(targ_rhos), k=[j+1 for j in range(k)])
+        return dist/2, self.angles[i]
+
+#### population decomposition ####
+def get_Jfidelity_grad(angles, targ_rho, setup='C0', expt=True):
+    ''' Fidelity F = <psi|targ_rho|psi> / <psi|psi> of the (pure) Jones state with the target for a stack of settings, and its analytic gradient.
+    Params:
+        angles: (...,k) settings
+        targ_rho: (4,4) target, or (...,4,4) one per setting
+    Returns:
+        F: (...)
+        dF: (...,k)
+    '''
+    psi, dpsi = get_Jpsi_batch(angles, setup, expt, return_grad=True)
+    targ_psi = np.einsum('...ij,...j->...i', targ_rho, psi)
+    norm = np.maximum(np.real(np.einsum('...i,...i->...', np.conj(psi), psi)), 1e-300)
+    F = np.real(np.einsum('...i,...i->...', np.conj(psi), targ_psi)) / norm
+    dF = 2*(np.real(np.einsum('...ki,...i->...k', np.conj(dpsi), targ_psi)) - F[..., None]*np.real(np.einsum('...ki,...i->...k', np.conj(dpsi), psi))) / norm[..., None]
+    return F, dF
+
+def jones_decompose_population(targ_rho, targ_name='Test', setup='C0', expt=True, num_starts=32, max_rounds=20, epsilon=0.999, add_noise=False, p=0.04, seed=None, verbose=False, index=None):
+    ''' Decomposes a density matrix into waveplate settings from a population of random starts evaluated together.
+    Each round draws num_starts settings uniformly within get_Jangle_bounds and maximizes all of their fidelities in one bounded L-BFGS-B call on the stacked angles:
+    the starts are independent, so the summed loss has a block-diagonal Hessian and its analytic gradient (get_Jfidelity_grad) is each start's own. Rounds stop once the best fidelity reaches epsilon.
+    params:
+        targ_rho: target density matrix
+        targ_name: name of target state
+        setup: see get_Jrho
+        expt: whether to use experimental components
+        num_starts: starts per round
+        max_rounds: max number of rounds
+        epsilon: fidelity at which to stop early
+        add_noise, p: whether to mix the predicted state with the maximally mixed one, as in get_Jrho; the settings maximize the noiseless fidelity, which the noise only rescales for pure targets
+        seed: seed for the starts, for reproducible decompositions
+        verbose: whether to print the best fidelity after each round
+        index: JonesIndex for this setup and expt; if given, the first round starts from the num_starts nearest indexed settings
+    returns:
+        targ_name: name of target state
+        setup: string representation
+        n: number of rounds used
+        max_best_fidelity: fidelity of best guess
+        max_best_angles: angle settings corresponding to best guess
+        best_pred_rho: best guess at density matrix
+        targ_rho: target density matrix
+    '''
+    targ_rho = np.asarray(targ_rho, dtype=complex)
+    if index is not None:
+        index.check(setup, expt)
+    bounds = get_Jangle_bounds(setup, expt)
+    k = len(bounds)
+    low, high = np.array(bounds).T
+    rng = np.random.default_rng(seed)
+
+    def loss(x):
+        F, dF = get_Jfidelity_grad(x.reshape((-1, k)), targ_rho, setup, expt)
+        return np.sum(1 - F), -dF.reshape(-1)
+
+    max_best_fidelity, max_best_angles = -np.inf, None
+    for n in range(1, max_rounds + 1):
+        if n == 1 and index is not None:
+            x0 = index.query(targ_rho, num_starts)[1]
+        else:
+            x0 = rng.uniform(low, high, (num_starts, k))
+        result = minimize(loss, x0=x0.reshape(-1), jac=True, bounds=bounds*num_starts, method='L-BFGS-B', options={'maxiter': 1000, 'ftol': 1e-14, 'gtol': 1e-10})
+        angles = result.x.reshape((num_starts, k))
+        fidelity = get_fidelity_batch(get_Jrho_batch(angles, setup, add_noise, p, expt), targ_rho)
+        best = np.nanargmax(fidelity)
+        if fidelity[best] > max_best_fidelity:
+            max_best_fidelity, max_best_angles = float(fidelity[best]), angles[best]
+        if verbose: print('round', n, 'fidelity', max_best_fidelity)
+        if max_best_fidelity >= epsilon:
+            break
+    best_pred_rho = get_Jrho_batch(max_best_angles, setup, add_noise, p, expt)
+    return targ_name, setup, n, max_best_fidelity, max_best_angles, best_pred_rho, targ_rho
+
+def jones_decompose_pool(targ_rhos, targ_names=None, setup='C0', num_workers=None, **kwargs):
+    ''' Runs jones_decompose_population on many targets concurrently across a process pool.
+    params:
+        targ_rhos: list or (N,4,4) array of target density matrices
+        targ_names: names of the targets; their indices if None
+        setup: see get_Jrho
+        num_workers: size of the pool; cpu_count() if None
+        kwargs: passed on to jones_decompose_population
+    returns:
+        list of the results of jones_decompose_population, in the order of targ_rhos
+    '''
+    from multiprocessing import cpu_count, Pool
+    from functools import partial
+    targ_names = [str(i) for i in range(len(targ_rhos))] if targ_names is None else targ_names
+    decomp = partial(jones_decompose_population, setup=setup, **kwargs)
+    with Pool(cpu_count() if num_workers is None else num_workers) as pool:
+        return pool.starmap(decomp, zip(targ_rhos, targ_names))
+
 if __name__=='__main__':
     # for loading data
     import pandas as pd
@@ -13,7 +13,7 @@ from roik_gen import * # actual roik code
 from random_gen import *
 from jones import *
 
-def gen_rand_info(func, return_prob, include_w = True, log_params = False, verbose=False, log_roik_prob=False):
+def gen_rand_info(func, return_prob, include_w = True, log_params = False, verbose=False, log_roik_prob=False, state=None):
     ''' Function to compute random state based on imput method and return measurement projections, witness values, concurrence, and purity.
         params:
             func: function to generate random state
@@ -22,25 +22,26 @@ def gen_rand_info(func, return_prob, include_w = True, log_params = False, verbo
             include_w: bool, whether to include witness values in return
             log_params: bool, whether to 
             verbose: bool, whether to print progress
+            state: optional pregenerated state, or (state, params) with log_params, used instead of calling func
     '''
 
     # generate random state
-    if not(log_params):rho = func()
-    else: rho, params = func()
+    if state is None: state = func()
+    if not(log_params):rho = state
+    else: rho, params = state
     
     W_min, Wp_t1, Wp_t2, Wp_t3 = compute_witnesses(rho)
-    concurrence = get_concurrence(rho)
-    purity = get_purity(rho)
-    min_eig = get_min_eig(rho)
+    state = DensityMatrix(rho) # each decomposition once
+    concurrence, min_eig, purity = float(state.concurrence), float(state.min_eig), float(state.purity)
     if verbose: print(f'made state with concurrence {concurrence} and purity {purity}')
     
     if include_w:
 
         if not(return_prob): # if we want to return stokes's parameters
-            II, IX, IY, IZ, XI, XX, XY, XZ, YI, YX, YY, YZ, ZI, ZX, ZY, ZZ = np.real(get_expec_vals(rho).reshape(16,))
-            return IX, IY, IZ, XI, XX, XY, XZ, YI, YX, YY, YZ, ZI, ZX, ZY, ZZ, W_min, Wp_t1, Wp_t2, Wp_t3, concurrence, purity
+            II, IX, IY, IZ, XI, XX, XY, XZ, YI, YX, YY, YZ, ZI, ZX, ZY, ZZ = state.stokes.reshape(16,)
+            return IX, IY, IZ, XI, XX, XY, XZ, YI, YX, YY, YZ, ZI, ZX, ZY, ZZ, W_min, Wp_t1, Wp_t2, Wp_t3, concurrence, purity, min_eig
         else:
-            projs = get_all_projs(rho)
+            projs = state.projs
             HH, HV, HD, HA, HR, HL = projs[0]
             VH, VV, VD, VA, VR, VL = projs[1]
             DH, DV, DD, DA, DR, DL = projs[2]
@@ -72,7 +73,7 @@ def gen_rand_info(func, return_prob, include_w = True, log_params = False, verbo
         
         else: return concurrence, purity, min_eig, params[0], params[1], params[2], params[3]
 
-def build_dataset(random_method, return_prob, num_to_gen, savename, do_stokes=False, include_w=True, log_params = False, log_roik_prob = False, verbose=False):
+def build_dataset(random_method, return_prob, num_to_gen, savename, do_stokes=False, include_w=True, log_params = False, log_roik_prob = False, verbose=False, include_coherence=False):
     ''' Fuction to build a dataset of randomly generated states.
     params:
         random_method: string, either 'simplex', 'jones_I','jones_C' or 'random'
@@ -83,6 +84,7 @@ def build_dataset(random_method, return_prob, num_to_gen, savename, do_stokes=Fa
         log_params: bool, whether to collect the parameters that make up the 3rd unitary
         log_roik_prob: bool, whether to collect the probabilities using the roik et al definition
         verbose: bool, whether to print progress
+        include_coherence: bool, whether to add the rel_ent_coh_HH, _DD and _RR columns, the relative entropy of coherence in the HV, DA and RL product bases; off by default so the schema is unchanged. Needs include_w for the measurements
     '''
 
     # confirm valid random method
@@ -113,10 +115,10 @@ def build_dataset(random_method, return_prob, num_to_gen, savename, do_stokes=Fa
     ## generate states ##
     if random_method == 'simplex':
         func = get_random_simplex 
-    elif random_method=='jones_C':
-        func = get_random_jones(setup='C')
-    elif random_method=='jones_I':
-        func = get_random_jones(setup='I')
+    elif random_method in ['jones_C', 'jones_I']: # all states in one batched draw, handed to the workers below
+        func = None
+        jones_states = get_random_jones_batch(num_to_gen, setup='C1' if random_method=='jones_C' else 'I', return_params=log_params)
+        jones_states = list(zip(*jones_states)) if log_params else list(jones_states)
     elif random_method=='hurwitz':
         method = int(input('which method for phi random gen do you want? 0, 1, 2: '))
         assert method in [0, 1, 2], f'Invalid method. You have {method}.'
@@ -128,7 +130,10 @@ def build_dataset(random_method, return_prob, num_to_gen, savename, do_stokes=Fa
     # build multiprocessing pool ##
     pool = Pool(cpu_count())
     # gen_rand_info(func, return_prob, do_stokes=False, include_w = True, log_params = False, verbose=True)
-    inputs = [(func, return_prob, include_w, log_params, verbose, log_roik_prob) for _ in range(num_to_gen)]
+    if func is None:
+        inputs = [(func, return_prob, include_w, log_params, verbose, log_roik_prob, state) for state in jones_states]
+    else:
+        inputs = [(func, return_prob, include_w, log_params, verbose, log_roik_prob) for _ in range(num_to_gen)]
     results = pool.starmap_async(gen_rand_info, inputs).get()
 
     ## end multiprocessing ##
@@ -140,6 +145,17 @@ def build_dataset(random_method, return_prob, num_to_gen, savename, do_stokes=Fa
 
     # build df
     df = pd.DataFrame.from_records(results, columns = columns)
+
+    # relative entropy of coherence, batched over the states rebuilt from the saved measurements
+    if include_w and include_coherence:
+        if return_prob:
+            rhos = reconstruct_rho(df[columns[:36]].to_numpy().reshape((-1, 6, 6)))
+        else:
+            S = np.concatenate([np.ones((len(df), 1)), df[columns[:15]].to_numpy()], axis=1)
+            rhos = get_rho_from_stokes(S.reshape((-1, 4, 4)))
+        for basis_key in ['HH', 'DD', 'RR']:
+            df[f'rel_ent_coh_{basis_key}'] = get_rel_entropy_coherence_batch(rhos, basis_key)
+
     print('saving!')
     df.to_csv(savename+'.csv', index=False)
 
@@ -269,6 +269,23 @@ def get_rho_from_file(filename, verbose=True, angles=None, do_richard = False):
 
             return trial, rho, unc, Su, rho_actual, fidelity, purity, angles
 
+def get_physical_rhos(filenames):
+    '''Loads the archived rho_*.npy files and reconstructs all of them in one batched maximum-likelihood pass, so every returned density matrix is physical. Uses the raw counts when the file saved them, otherwise the projections of the saved linear-inversion rho.
+    --
+    Parameters
+        filenames : list of str, names of files in DATA_PATH
+    Returns
+        (N,4,4) array of density matrices, in the order of filenames
+    '''
+    all_projs = []
+    for filename in filenames:
+        data = np.load(join(DATA_PATH,filename), allow_pickle=True)
+        if len(data) == 9: # rho, unc, Su, un_proj, un_proj_unc, rho_actual, angles, fidelity, purity
+            all_projs.append(normalize_counts(np.array(data[3], dtype=float)))
+        else:
+            all_projs.append(get_all_projs(np.array(data[0], dtype=complex)))
+    return reconstruct_rho_mle(np.array(all_projs))
+
 def analyze_rhos(filenames, UV_HWP_offset, settings=None, id='id', model=None, do_W = False, do_richard = False):
     '''Extending get_rho_from_file to include multiple files; 
     __
@@ -312,7 +329,8 @@ def analyze_rhos(filenames, UV_HWP_offset, settings=None, id='id', model=None, d
         rho_adj = load_saved_get_E0_rho_c(rho_actual = rho_actual, angles_save = [eta, chi], angles_cor = [eta_c, chi_c], purity = purity, model = model, UV_HWP_offset = UV_HWP_offset, do_W = do_W)
 
         # get the fixed fidelity based on the offset to UVHWP
-        fidelity = get_fidelity(rho, rho_actual)
+        state = DensityMatrix(rho) # sqrt(rho) is shared by both fidelities
+        fidelity = float(state.fidelity(rho_actual))
 
         # calculate W and W' theory
         W_T_ls = compute_witnesses(rho = rho_actual) # theory
@@ -358,8 +376,8 @@ def analyze_rhos(filenames, UV_HWP_offset, settings=None, id='id', model=None, d
         #         adj_rho = adjust_rho(rho_actual, [eta_c, chi_c], purity)
         #     else:
         #         adj_rho = load_saved_get_E0_rho_c(rho_actual = rho_actual, angles = [eta, chi], purity = purity, model = model, UV_HWP_offset = UV_HWP_offset, do_W = do_W)
-        adj_fidelity = get_fidelity(rho_adj, rho)
-        adj_purity = get_purity(rho_adj)
+        adj_fidelity = float(state.fidelity(rho_adj))
+        adj_purity = float(DensityMatrix(rho_adj).purity)
 
         df = pd.concat([df, pd.DataFrame.from_records([{'trial':trial, 'eta':eta, 'chi':chi, 'eta_c': eta_c, 'chi_c': chi_c, 'fidelity':fidelity, 'purity':purity, 'AT_fidelity':adj_fidelity, 'AT_purity': adj_purity,
         'W_min_T': W_min_T, 'Wp_t1_T':Wp_t1_T, 'Wp_t2_T':Wp_t2_T, 'Wp_t3_T':Wp_t3_T,'W_min_AT':W_min_AT, 'W_min_expt':W_min_expt, 'W_min_unc':W_min_unc, 'Wp_t1_AT':Wp_t1_AT, 'Wp_t2_AT':Wp_t2_AT, 'Wp_t3_AT':Wp_t3_AT, 'Wp_t1_expt':Wp_t1_expt, 'Wp_t1_unc':Wp_t1_unc, 'Wp_t2_expt':Wp_t2_expt, 'Wp_t2_unc':Wp_t2_unc, 'Wp_t3_expt':Wp_t3_expt, 'Wp_t3_unc':Wp_t3_unc, 'UV_HWP':angles[0], 'QP':angles[1], 'B_HWP':angles[2]}])])
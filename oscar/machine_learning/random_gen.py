@@ -41,6 +41,50 @@ def get_random_simplex(return_params=False):
     if return_params: return [rho, params]
     else: return rho
 
+def sample_valid_batch(gen_batch, num, max_rounds=100):
+    ''' Draws num valid density matrices from a batched generator, filtering each batch of candidates with is_valid_rho_batch instead of checking them one at a time.
+    params:
+        gen_batch: function of n returning (n,4,4) candidate density matrices, or a tuple of them and (n,...) params
+        num: number of valid states to return
+        max_rounds: max number of batches to draw before giving up
+    returns:
+        (num,4,4) density matrices, and (num,...) params if gen_batch returns them
+    '''
+    rhos_ls, params_ls = [], []
+    num_valid = 0
+    for _ in range(max_rounds):
+        out = gen_batch(num - num_valid)
+        rhos, params = out if isinstance(out, tuple) else (out, None)
+        valid, _ = is_valid_rho_batch(rhos)
+        rhos_ls.append(np.asarray(rhos)[valid])
+        if params is not None:
+            params_ls.append(np.asarray(params)[valid])
+        num_valid += np.sum(valid)
+        if num_valid >= num:
+            break
+    else:
+        raise RuntimeError(f'only {num_valid} of {num} valid states after {max_rounds} batches')
+    rhos = np.concatenate(rhos_ls)[:num]
+    if params is None:
+        return rhos
+    return rhos, np.concatenate(params_ls)[:num]
+
+def get_random_simplex_batch(num, return_params=False):
+    ''' Batched get_random_simplex: num density matrices (num,4,4) of random states a|HH> + be^(i*beta)|01> + ce^(i*gamma)*|10> + de^(i*delta)*|11>, and optionally their parameters (num,7). '''
+    def gen_batch(n):
+        a = np.random.rand(n)
+        b = np.random.rand(n)*(1-a)
+        c = np.random.rand(n)*(1-a-b)
+        d = 1-a-b-c
+        real_ls = np.sqrt(np.stack([a, b, c, d], axis=-1))
+        real_ls = np.take_along_axis(real_ls, np.argsort(np.random.rand(n, 4), axis=-1), axis=-1) # shuffle each row
+        rand_angle = np.random.rand(n, 3)*2*np.pi
+        state_vecs = real_ls * np.exp(1j*np.concatenate([np.zeros((n, 1)), rand_angle], axis=-1))
+        return np.einsum('ni,nj->nij', state_vecs, np.conj(state_vecs)), np.concatenate([real_ls, rand_angle], axis=-1)
+    rhos, params = sample_valid_batch(gen_batch, num)
+    if return_params: return rhos, params
+    else: return rhos
+
 def get_random_hurwitz(method=1, log_params=False, conc_cond = 0, purity_cond = 1):
     ''' Function to generate random density matrix with roik method.
     params:
@@ -2,7 +2,14 @@
 # methods adapted my (oscar) code as well as Alec (concurrence)
 
 # main imports #
-from os.path import join
+import os
+from os.path import join, isfile
+import pickle
+import hashlib
+import inspect
+from copy import deepcopy
+from functools import wraps
+from collections import OrderedDict
 import numpy as np
 import pandas as pd
 import scipy.linalg as la
@@ -13,129 +20,287 @@ from tqdm import trange
 from uncertainties import ufloat
 from uncertainties import unumpy as unp
 
+import witness_kernels # generated by witness_sym.py
+
+##############################################
+## opt-in cache for repeated evaluations of the same state ##
+# disabled by default; turn on with enable_cache(). Keys are a hash of the function name, the arguments with arrays rounded to
+# `decimals`, and the options, so the same rho (or counts) with the same options is only computed once per session, or across
+# sessions and scripts if a cache directory is given.
+CACHE = {'enabled': False, 'maxsize': 4096, 'path': None, 'decimals': 10, 'lru': OrderedDict()}
+
+def enable_cache(maxsize=4096, path=None, decimals=10):
+    ''' Turns on the cache for compute_witnesses, get_concurrence and get_fidelity.
+    params:
+        maxsize: max number of results kept in memory; least recently used results are dropped first
+        path: optional directory for an on-disk store shared across sessions and scripts
+        decimals: rho and counts are rounded to this many decimals before hashing
+    '''
+    CACHE.update(enabled=True, maxsize=maxsize, path=path, decimals=decimals)
+    if path is not None:
+        os.makedirs(path, exist_ok=True)
+
+def disable_cache(clear=True):
+    ''' Turns off the cache; the in-memory results are dropped unless clear is False. The on-disk store is left as is.'''
+    CACHE['enabled'] = False
+    if clear:
+        CACHE['lru'].clear()
+
+def get_cache_key(name, arguments):
+    ''' Hash of a call, given its bound arguments (name: value, with the defaults filled in) so the same call gives the same key however
+    it was spelled. Arrays (including unumpy arrays of counts) are rounded so that the same state gives the same key; other values,
+    including ragged sequences, are hashed by their repr.'''
+    h = hashlib.sha1(name.encode())
+    def add(x):
+        arr = None
+        if isinstance(x, (np.ndarray, list, tuple)):
+            try:
+                arr = np.asarray(x)
+                if arr.dtype == object: # unumpy array
+                    arr = np.stack([unp.nominal_values(arr), unp.std_devs(arr)])
+            except (ValueError, TypeError, AttributeError): # ragged, or objects that are not ufloats
+                arr = None
+        if arr is not None and arr.dtype.kind in 'biufc':
+            arr = np.round(np.asarray(arr, dtype=complex), CACHE['decimals']) + 0 # + 0 turns -0 into 0
+            h.update(str(arr.shape).encode())
+            h.update(arr.tobytes())
+        else:
+            h.update(repr(x).encode())
+    for key, x in arguments.items():
+        h.update(key.encode())
+        add(x)
+    return h.hexdigest()
+
+def cached(func):
+    ''' Decorator for the opt-in cache: serves repeated calls from the in-memory LRU, then the on-disk store, and only then computes.'''
+    signature = inspect.signature(func)
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if not CACHE['enabled']:
+            return func(*args, **kwargs)
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        key = get_cache_key(func.__name__, bound.arguments)
+        lru = CACHE['lru']
+        if key in lru:
+            lru.move_to_end(key)
+            return deepcopy(lru[key])
+        filename = join(CACHE['path'], key + '.pkl') if CACHE['path'] is not None else None
+        if filename is not None and isfile(filename):
+            with open(filename, 'rb') as f:
+                result = pickle.load(f)
+        else:
+            result = func(*args, **kwargs)
+            if filename is not None: # write then rename, so parallel workers never read a partial file
+                tmp = f'{filename}.{os.getpid()}.tmp'
+                with open(tmp, 'wb') as f:
+                    pickle.dump(result, f)
+                os.replace(tmp, filename)
+        lru[key] = result
+        if len(lru) > CACHE['maxsize']:
+            lru.popitem(last=False)
+        return deepcopy(result)
+    return wrapper
+
 ##############################################
 ## for more basic stats about a state ##
 
 def get_rho(state):
-    ''' Function to compute density matrix from a given 2-qubit state vector. '''
-    return np.matrix(state @ np.conjugate(state.reshape((1,4))))
+    ''' Function to compute density matrix from a given state vector, as a column (d,1). '''
+    return np.matrix(state @ np.conjugate(state.reshape((1,-1))))
 
 def adjoint(state):
     ''' Returns the adjoint of a state vector. For a np.matrix, can use .H'''
     return np.conjugate(state).T
 
+# reason codes of is_valid_rho_batch, in the order the checks are applied
+RHO_VALID, RHO_NONFINITE, RHO_ZERO, RHO_NOT_HERMITIAN, RHO_BAD_TRACE, RHO_NOT_PSD = range(6)
+RHO_REASONS = ['is valid', 'has infs or nans', 'is 0 matrix', 'is not Hermitian', 'trace is not 1', 'is not positive semidefinite']
+
+def is_valid_rho_batch(rhos, tol=1e-8, eig_vals=None):
+    ''' Checks a stack of density matrices (...,d,d) at once, with a single eigvalsh call for all of them.
+    params:
+        rhos: density matrices to check
+        tol: absolute tolerance of the zero, Hermiticity, trace and positivity checks
+        eig_vals: optional eigenvalues (...,d) of herm_part(rhos), e.g. cached by DensityMatrix
+    returns:
+        valid: (...) bool mask
+        reason: (...) code of the first failed check, an index into RHO_REASONS; RHO_VALID where valid
+    '''
+    rhos = np.asarray(rhos, dtype=complex)
+    finite = np.all(np.isfinite(rhos), axis=(-2, -1))
+    rhos = np.where(finite[..., None, None], rhos, 0) # keep eigvalsh away from infs and nans
+    if eig_vals is None:
+        eig_vals = np.linalg.eigvalsh(herm_part(rhos))
+    failed = [~finite,
+              np.all(np.abs(rhos) <= tol, axis=(-2, -1)),
+              np.any(np.abs(rhos - np.conj(np.swapaxes(rhos, -1, -2))) > tol, axis=(-2, -1)),
+              np.abs(np.trace(rhos, axis1=-2, axis2=-1) - 1) > tol,
+              eig_vals[..., 0] < -tol]
+    reason = np.full(finite.shape, RHO_VALID)
+    for code, fail in reversed(list(zip([RHO_NONFINITE, RHO_ZERO, RHO_NOT_HERMITIAN, RHO_BAD_TRACE, RHO_NOT_PSD], failed))): # the first failure wins
+        reason = np.where(fail, code, reason)
+    return reason == RHO_VALID, reason
+
 def is_valid_rho(rho, verbose=True):
     ''' Checks if a density matrix is valid. 
     params:
         rho: density matrix to check
         verbose: bool, whether to print out what is wrong with rho
     '''
-    tolerance = 1e-17
-    # make sure not a 0 matrix
-    if np.all(np.isclose(rho, np.zeros((4,4)), rtol=tolerance)):
-        if verbose: print('rho is 0 matrix')
-        return False
-    # check if Hermitian
-    if not(np.all(np.isclose(rho,adjoint(rho), rtol=tolerance))):
-        if verbose: print('rho is not Hermitian')
-        return False
-    # check if trace 1, within tolerance. can use param rtol to change tolerance
-    if not(np.isclose(np.trace(rho), 1, tolerance)):
-        if verbose: print('rho trace is not 1', np.trace(rho))
-        return False
-    # check if positive semidefinite
-    eig_val = la.eigvals(rho)
-    if not(np.all(np.greater_equal(eig_val,np.zeros(len(eig_val))) | np.isclose(eig_val,np.zeros(len(eig_val)), rtol=tolerance))):
-        if verbose: print('rho is not positive semidefinite. eigenvalues:', eig_val)
-        return False
-    # square root of rho must exist
-    if np.isnan(rho).any() or np.isinf(rho).any():
-        if verbose: 
-            print('rho has infs or nans')
-            print('nan', np.isnan(rho))
-            print('inf', np.isinf(rho))
-            print(rho)
-        return False
-    return True
+    valid, reason = is_valid_rho_batch(rho)
+    if not valid and verbose:
+        print('rho', RHO_REASONS[reason])
+        if reason == RHO_BAD_TRACE: print('trace', np.trace(rho))
+        elif reason == RHO_NOT_PSD: print('eigenvalues:', np.linalg.eigvalsh(herm_part(rho)))
+        elif reason == RHO_NONFINITE: print(rho)
+    return bool(valid)
 
 def get_purity(rho):
     ''' Calculates the purity of a density matrix. '''
     return np.real(np.trace(rho @ rho))
 
+@cached
 def get_fidelity(rho1, rho2):
     '''Compute fidelity of 2 density matrices'''
-    try:
-        fidelity = np.real((np.trace(la.sqrtm(la.sqrtm(rho1)@rho2@la.sqrtm(rho1))))**2)
-        return fidelity
-    except:
-        print('error computing fidelity!')
-        print('rho1', rho1)
-        print('rho2', rho2)
-        return 1e-5
+    return float(get_fidelity_batch(rho1, rho2))
 
 def Bures_distance(rho1, rho2):
     '''Compute the distance between 2 density matrices'''
     fidelity = get_fidelity(rho1, rho2)
     return np.sqrt(2*(1-np.sqrt(fidelity)))
 
+##############################################
+## for batches of density matrices ##
+
+def herm_part(rhos):
+    ''' Returns the Hermitian part of a density matrix or stack of density matrices, (...,d,d). Removes numerical asymmetry before using a Hermitian eigensolver.'''
+    rhos = np.asarray(rhos, dtype=complex)
+    return 0.5*(rhos + np.conj(np.swapaxes(rhos, -1, -2)))
+
+def eigh_batch(rhos):
+    ''' Hermitian eigendecomposition of a stack of density matrices with shape (...,d,d).
+    Returns the eigenvalues in ascending order, clipped at 0, and the eigenvectors as columns.'''
+    eig_vals, eig_vecs = np.linalg.eigh(herm_part(rhos))
+    return np.clip(eig_vals, 0, None), eig_vecs
+
+def sqrtm_batch(rhos, eig=None):
+    ''' Computes the positive square root of a stack of density matrices, (...,d,d), from a single batched eigendecomposition.
+    eig: optional precomputed (eig_vals, eig_vecs) of the Hermitian part of rhos, as from np.linalg.eigh; the eigenvalues are clipped at 0.'''
+    eig_vals, eig_vecs = eigh_batch(rhos) if eig is None else (np.clip(eig[0], 0, None), eig[1])
+    return (eig_vecs * np.sqrt(eig_vals)[..., None, :]) @ np.conj(np.swapaxes(eig_vecs, -1, -2))
+
+def is_pure_batch(rhos, tol=1e-9):
+    ''' Checks whether each matrix in a stack (...,d,d) is a positive rank-1 matrix |psi><psi|, in O(d^2).
+    rho must equal the outer product of its column with the largest diagonal element (get_ket_batch); unlike Tr(rho^2) = Tr(rho)^2, this rejects
+    non-positive matrices such as diag(2/3, 2/3, -1/3, 0). tol is relative to the trace.'''
+    rhos = np.asarray(rhos)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        kets = get_ket_batch(rhos)
+        diff = np.max(np.abs(rhos - np.einsum('...i,...j->...ij', kets, np.conj(kets))), axis=(-2, -1))
+    trace = np.abs(np.trace(rhos, axis1=-2, axis2=-1))
+    return (diff < tol*trace) & (trace > 0)
+
+def get_ket_batch(rhos):
+    ''' Recovers the state vector (up to a global phase) of rank-1 density matrices, (...,d,d) -> (...,d), from the column with the largest diagonal element.'''
+    rhos = np.asarray(rhos, dtype=complex)
+    diag = np.real(np.diagonal(rhos, axis1=-2, axis2=-1))
+    k = np.argmax(diag, axis=-1)[..., None]
+    col = np.take_along_axis(rhos, k[..., None], axis=-1)[..., 0]
+    return col / np.sqrt(np.take_along_axis(diag, k, axis=-1))
+
+def get_fidelity_pure_batch(rhos, kets):
+    ''' Computes the fidelity F = <psi|rho|psi> of density matrices against pure targets in O(d^2).
+    params:
+        rhos: array of shape (d,d) or (N,d,d)
+        kets: target state vectors of shape (d,), (d,1), (N,d) or (N,d,1), e.g. from get_E0 before get_rho; broadcast against rhos
+    '''
+    kets = np.asarray(kets, dtype=complex)
+    if kets.shape[-1] == 1: # column vectors
+        kets = kets[..., 0]
+    rhos = np.asarray(rhos, dtype=complex)
+    num = np.einsum('...i,...ij,...j->...', np.conj(kets), rhos, kets)
+    return np.real(num) / np.sum(np.abs(kets)**2, axis=-1)
+
+def get_fidelity_batch(rhos1, rhos2, sqrt_rho1=None):
+    ''' Computes the fidelity for stacks of density matrices.
+    params:
+        rhos1, rhos2: arrays of shape (d,d) or (N,d,d), e.g. d = 4 for 2 qubits; broadcast against each other, so one target can be scored against N predictions
+        sqrt_rho1: optional precomputed sqrtm_batch(rhos1)
+    returns: array of N fidelities (0-d for a single pair)
+    '''
+    rhos1 = np.asarray(rhos1, dtype=complex)
+    rhos2 = np.asarray(rhos2, dtype=complex)
+    # if either side is pure, F = <psi|rho|psi> and no square roots are needed
+    if np.all(is_pure_batch(rhos2)):
+        return get_fidelity_pure_batch(rhos1, get_ket_batch(rhos2))
+    if np.all(is_pure_batch(rhos1)):
+        return get_fidelity_pure_batch(rhos2, get_ket_batch(rhos1))
+
+    if sqrt_rho1 is None:
+        sqrt_rho1 = sqrtm_batch(rhos1)
+    M = sqrt_rho1 @ rhos2 @ sqrt_rho1
+    # M is positive semidefinite, so Tr(sqrt(M)) is the sum of the roots of its eigenvalues
+    eig_vals = np.clip(np.linalg.eigvalsh(herm_part(M)), 0, None)
+    return np.sum(np.sqrt(eig_vals), axis=-1)**2
+
+def Bures_distance_batch(rhos1, rhos2):
+    ''' Computes the Bures distance for stacks of density matrices; see get_fidelity_batch for shapes.'''
+    fidelity = np.clip(get_fidelity_batch(rhos1, rhos2), 0, 1)
+    return np.sqrt(2*(1-np.sqrt(fidelity)))
+
+def get_trace_distance_batch(rhos1, rhos2):
+    ''' Computes the trace distance 1/2 Tr|rho1 - rho2| for stacks of density matrices; see get_fidelity_batch for shapes.'''
+    eig_vals = np.linalg.eigvalsh(herm_part(np.asarray(rhos1) - np.asarray(rhos2)))
+    return 0.5*np.sum(np.abs(eig_vals), axis=-1)
+
 ##############################################
 ## for tomography ##
 
+# tensor bank, built once at import: Pauli products, HVDARL projectors and the linear-inversion map #
+PAULI = np.array([[[1, 0], [0, 1]], [[0, 1], [1, 0]], [[0, -1j], [1j, 0]], [[1, 0], [0, -1]]], dtype=complex) # I, X, Y, Z
+PAULI_2 = np.einsum('aij,bkl->abikjl', PAULI, PAULI).reshape(16, 4, 4) # kron(P_a, P_b) at index 4*a + b
+
+HVDARL = np.array([[1, 0], [0, 1], [1, 1], [1, -1], [1, 1j], [1, -1j]], dtype=complex) / np.sqrt([1, 1, 2, 2, 2, 2]).reshape((6,1))
+PROJ_1 = np.einsum('ki,kj->kij', HVDARL, np.conj(HVDARL)) # |k><k| for k in H, V, D, A, R, L
+PROJ_2 = np.einsum('aij,bkl->abikjl', PROJ_1, PROJ_1).reshape(36, 4, 4) # kron(|a><a|, |b><b|) at index 6*a + b
+
+# Stokes parameters as signed sums of the 36 normalized projections, as in Beili Hu's thesis.
+# Each Pauli is measured in the basis of its +/-1 eigenstates; the identity reuses the other qubit's basis.
+STOKES_FROM_PROJS = np.zeros((16, 36))
+for a in range(4):
+    for b in range(4):
+        if a==0 and b==0: # S_00 = 1 by normalization
+            continue
+        pauli_basis = {1: (2, 3), 2: (4, 5), 3: (0, 1)} # X: D/A, Y: R/L, Z: H/V
+        basis_A = pauli_basis[a if a!=0 else b]
+        basis_B = pauli_basis[b if b!=0 else a]
+        for sign_A, k_A in zip([1, -1], basis_A):
+            for sign_B, k_B in zip([1, -1], basis_B):
+                STOKES_FROM_PROJS[4*a + b, 6*k_A + k_B] = (sign_A if a!=0 else 1) * (sign_B if b!=0 else 1)
+RHO_FROM_PROJS = np.einsum('sk,sij->kij', STOKES_FROM_PROJS, PAULI_2) / 4 # linear inversion, without the I/4 term
+
 def get_expec_vals(rho):
-    ''' Returns all 16 expectation vals given density matrix. '''
-    # pauli matrices
-    I = np.eye(2, dtype=complex)
-    X = np.matrix([[0, 1], [1, 0]], dtype=complex)
-    Y = np.matrix([[0, -1j], [1j, 0]], dtype=complex)
-    Z = np.matrix([[1, 0], [0, -1]], dtype=complex)
-
-    expec_vals=[]
-
-    Pa_matrices = [I, X, Y, Z]
-    for Pa1 in Pa_matrices:
-        for Pa2 in Pa_matrices:
-            expec_vals.append(np.trace(np.kron(Pa1, Pa2) @ rho))
-
-    return np.array(expec_vals).reshape(4,4)
-
-def get_expec_vals_counts(raw_data):
-    '''Takes in unumpy array with counts and count uncertainities. Returns expectation values and uncertainties.'''
-    # normalize groups of orthonormal measurements to get projections
-    projs = np.zeros_like(raw_data)
-    for i in range(0,6,2):
-        for j in range(0,6,2):
-            total_rate = np.sum(raw_data[i:i+2, j:j+2])
-            projs[i:i+2, j:j+2] = raw_data[i:i+2, j:j+2]/total_rate
-    
-    
-    HH, HV, HD, HA, HR, HL = projs[0]
-    VH, VV, VD, VA, VR, VL = projs[1]
-    DH, DV, DD, DA, DR, DL = projs[2]
-    AH, AV, AD, AA, AR, AL = projs[3]
-    RH, RV, RD, RA, RR, RL = projs[4]
-    LH, LV, LD, LA, LR, LL = projs[5]
-
-    # build the stokes's parameters
-    S = np.zeros((4,4), dtype=object)
-    S[0,0] = 1
-    S[0,1] = DD - DA + AD - AA
-    S[0,2] = RR + LR - RL - LL
-    S[0,3] = HH - HV + VH - VV
-    S[1,0] = DD + DA - AD - AA
-    S[1,1] = DD - DA - AD + AA
-    S[1,2] = DR - DL - AR + AL
-    S[1,3] = DH - DV - AH + AV
-    S[2,0] = RR - LR + RL - LL
-    S[2,1] = RD - RA - LD + LA
-    S[2,2] = RR - RL - LR + LL
-    S[2,3] = RH - RV - LH + LV
-    S[3,0] = HH + HV - VH - VV
-    S[3,1] = HD - HA - VD + VA
-    S[3,2] = HR - HL - VR + VL
-    S[3,3] = HH - HV - VH + VV
-
-    return S
-    
+    ''' Returns all 16 expectation vals given density matrix, or a stack of them: (...,4,4) -> (...,4,4). '''
+    rho = np.asarray(rho)
+    return np.einsum('kij,...ji->...k', PAULI_2, rho).reshape(rho.shape[:-2] + (4,4))
+
+def get_expec_vals_counts(raw_data, counts_unc=None):
+    ''' Takes in counts and returns the expectation values (Stokes parameters) and their uncertainties, propagated with get_stokes_cov so the correlations from normalizing each group of 4 projections are kept.
+    params:
+        raw_data: (6,6) or (...,6,6) counts; a unumpy array is split into its nominal values and std devs
+        counts_unc: uncertainty of each count; the std devs of a unumpy raw_data, or Poissonian sqrt(counts), if None
+    returns:
+        S: Stokes parameters, (...,4,4)
+        S_unc: their uncertainties, (...,4,4)
+    '''
+    raw_data = np.asarray(raw_data)
+    if raw_data.dtype == object: # unumpy array
+        raw_data, counts_unc = unp.nominal_values(raw_data), unp.std_devs(raw_data) if counts_unc is None else counts_unc
+    S, cov_S = get_stokes_cov(raw_data, counts_unc)
+    S_unc = np.sqrt(np.clip(np.diagonal(cov_S, axis1=-2, axis2=-1), 0, None))
+    return S, S_unc.reshape(S.shape)
+
 def compute_proj(basis1, basis2, rho):
     ''' Computes projection into desired bases using projection operations on both qubits'''
     # get projection operators
@@ -145,94 +310,160 @@ def compute_proj(basis1, basis2, rho):
     return np.real(np.trace(np.kron(proj1, proj2)@rho))
 
 def get_all_projs(rho):
-    ''' Computes all 36 projections for a given density matrix rho'''
-
-    # define the single bases for projection
-   # -- old -- #
-    # H = np.array([[1,0],[0,0]]) 
-    # V = np.array([[0,0],[0,1]])    
-    # D = np.array([[1/2,1/2],[1/2,1/2]])
-    # A = np.array([[1/2,-1/2],[-1/2,1/2]])
-    # R = np.array([[1/2,-1j/2],[1j/2,1/2]])
-    # L = np.array([[1/2,1j/2],[-1j/2,1/2]])
-    # ------- #
-    H = np.array([[1], [0]])
-    V = np.array([[0], [1]])
-    D = np.array([[1], [1]])/np.sqrt(2)
-    A = np.array([[1], [-1]])/np.sqrt(2)
-    R = np.array([[1], [1j]])/np.sqrt(2)
-    L = np.array([[1], [-1j]])/np.sqrt(2)
-
-    basis_ls =[H, V, D, A, R, L]
-    all_projs =[]
-    for basis in basis_ls:
-        for basis2 in basis_ls:
-            all_projs.append(compute_proj(basis, basis2, rho))
-
-    return np.array(all_projs).reshape(6,6)
+    ''' Computes all 36 projections for a given density matrix rho, or a stack of them: (...,4,4) -> (...,6,6)'''
+    rho = np.asarray(rho)
+    all_projs = np.real(np.einsum('kij,...ji->...k', PROJ_2, rho))
+    return all_projs.reshape(rho.shape[:-2] + (6,6))
+
+def normalize_counts(counts):
+    ''' Normalizes groups of orthonormal measurements in a count table, (...,6,6), to get the 36 projections.'''
+    counts = np.asarray(counts, dtype=float)
+    shape = counts.shape
+    groups = counts.reshape(shape[:-2] + (3, 2, 3, 2))
+    totals = np.sum(groups, axis=(-3, -1), keepdims=True)
+    return (groups / totals).reshape(shape)
+
+def get_stokes_from_projs(all_projs):
+    ''' Takes in the 36 normalized projections, (...,6,6), and returns the Stokes parameters, (...,4,4).'''
+    all_projs = np.asarray(all_projs)
+    S = np.einsum('sk,...k->...s', STOKES_FROM_PROJS, all_projs.reshape(all_projs.shape[:-2] + (36,)))
+    S[..., 0] = 1
+    return S.reshape(all_projs.shape[:-2] + (4,4))
+
+PROJ_GROUPS = np.array([3*(i//2) + j//2 for i in range(6) for j in range(6)]) # normalization group of each of the 36 projections
+
+def get_proj_jacobian(counts):
+    ''' Jacobian of the 36 normalized projections with respect to the 36 raw counts, (...,6,6) -> (...,36,36).'''
+    counts = np.asarray(counts, dtype=float)
+    batch_shape = counts.shape[:-2]
+    projs = normalize_counts(counts).reshape(batch_shape + (36,))
+    totals = np.sum(counts.reshape(batch_shape + (3, 2, 3, 2)), axis=(-3, -1), keepdims=True)
+    totals = np.broadcast_to(totals, batch_shape + (3, 2, 3, 2)).reshape(batch_shape + (36,))
+    same_group = PROJ_GROUPS[:, None] == PROJ_GROUPS[None, :]
+    # d(c_k / T_k) / dc_j = (delta_kj - p_k [j in group of k]) / T_k
+    return (np.eye(36) - projs[..., :, None]*same_group) / totals[..., :, None]
+
+def get_stokes_cov(counts, counts_unc=None):
+    ''' Propagates count uncertainties to the Stokes parameters to first order, keeping the correlations that come from normalizing each group of 4 projections together.
+    params:
+        counts: raw counts, (...,6,6)
+        counts_unc: uncertainty of each count, (...,6,6); Poissonian sqrt(counts) if None
+    returns:
+        S: Stokes parameters, (...,4,4)
+        cov_S: covariance of the 16 flattened Stokes parameters, (...,16,16)
+    '''
+    counts = np.asarray(counts, dtype=float)
+    batch_shape = counts.shape[:-2]
+    if counts_unc is None:
+        var = counts
+    else:
+        var = np.asarray(counts_unc, dtype=float)**2
+    var = var.reshape(batch_shape + (36,))
+    J = STOKES_FROM_PROJS @ get_proj_jacobian(counts)
+    cov_S = (J * var[..., None, :]) @ np.swapaxes(J, -1, -2)
+    return get_stokes_from_projs(normalize_counts(counts)), cov_S
+
+def get_linear_unc(weights, cov_S):
+    ''' Uncertainty of any linear function of the Stokes parameters, sum_s weights_s * S_s, given their covariance.
+    params:
+        weights: (...,16) or (...,4,4) weights
+        cov_S: (...,16,16) covariance from get_stokes_cov
+    '''
+    weights = np.asarray(weights)
+    weights = weights.reshape(weights.shape[:-2] + (16,)) if weights.shape[-2:] == (4,4) else weights
+    return np.sqrt(np.clip(np.einsum('...s,...st,...t->...', weights, cov_S, weights), 0, None))
+
+def get_rho_unc(cov_S):
+    ''' Uncertainty of each density matrix element from the Stokes covariance, (...,16,16) -> (...,4,4). The real and imaginary parts hold the uncertainties of Re(rho) and Im(rho).'''
+    P = PAULI_2.reshape((16, 16)) / 4 # rho_e = sum_s S_s P_s[e] / 4
+    var_re = np.einsum('se,...st,te->...e', np.real(P), cov_S, np.real(P))
+    var_im = np.einsum('se,...st,te->...e', np.imag(P), cov_S, np.imag(P))
+    unc = np.sqrt(np.clip(var_re, 0, None)) + 1j*np.sqrt(np.clip(var_im, 0, None))
+    return unc.reshape(unc.shape[:-1] + (4,4))
+
+def get_witness_unc(W, cov_S):
+    ''' Uncertainty of Tr(W rho) for a witness operator W (4,4), or a stack of them, given the Stokes covariance; Tr(W rho) = sum_s Tr(W P_s) S_s / 4.'''
+    weights = np.real(np.einsum('...ij,sji->...s', np.asarray(W), PAULI_2)) / 4
+    return get_linear_unc(weights, cov_S)
+
+def get_rho_from_stokes(S):
+    ''' Builds the density matrix from the Stokes parameters, (...,4,4) -> (...,4,4). For uncertainties, use get_rho_unc with the covariance from get_stokes_cov.'''
+    S = np.asarray(S)
+    if S.dtype == object:
+        raise TypeError('get_rho_from_stokes takes float Stokes parameters, not ufloat arrays; propagate the uncertainties with get_stokes_cov and get_rho_unc instead.')
+    return np.einsum('...k,kij->...ij', S.reshape(S.shape[:-2] + (16,)), PAULI_2) / 4 # scale by 4 to get the correct density matrix
 
 def reconstruct_rho(all_projs):
-    ''' Takes in all 36 projections and reconstructs the density matrix. Based on Beili Hu's thesis.'''
-    # unpack the projections
-    HH, HV, HD, HA, HR, HL = all_projs[0]
-    VH, VV, VD, VA, VR, VL = all_projs[1]
-    DH, DV, DD, DA, DR, DL = all_projs[2]
-    AH, AV, AD, AA, AR, AL = all_projs[3]
-    RH, RV, RD, RA, RR, RL = all_projs[4]
-    LH, LV, LD, LA, LR, LL = all_projs[5]
-    
-    # build the stokes's parameters
-    S = np.zeros((4,4))
-    S[0,0]=1
-    S[0,1] = DD - DA + AD - AA
-    S[0,2] = RR + LR - RL - LL
-    S[0,3] = HH - HV + VH - VV
-    S[1,0] = DD + DA - AD - AA
-    S[1,1] = DD - DA - AD + AA
-    S[1,2] = DR - DL - AR + AL
-    S[1,3] = DH - DV - AH + AV
-    S[2,0] = RR - LR + RL - LL
-    S[2,1] = RD - RA - LD + LA
-    S[2,2] = RR - RL - LR + LL
-    S[2,3] = RH - RV - LH + LV
-    S[3,0] = HH + HV - VH - VV
-    S[3,1] = HD - HA - VD + VA
-    S[3,2] = HR - HL - VR + VL
-    S[3,3] = HH - HV - VH + VV
-
-
-    # define pauli matrices
-    I = np.eye(2)
-    X = np.matrix([[0, 1], [1, 0]])
-    Y = np.matrix([[0, -1j], [1j, 0]])
-    Z = np.matrix([[1, 0], [0, -1]])
-    P = [I, X, Y, Z]
-
-    # compute rho
-    rho = np.zeros((4,4), dtype=complex)
-    for i1 in range(4):
-        for i2 in range(4):
-            rho+= S[i1,i2]*np.kron(P[i1],P[i2])
-
-    return rho/4 # scale by 4 to get the correct density matrix
+    ''' Takes in all 36 projections and reconstructs the density matrix. Based on Beili Hu's thesis.
+    Works on a single (6,6) table or a stack (...,6,6).'''
+    all_projs = np.asarray(all_projs)
+    return np.eye(4)/4 + np.einsum('...k,kij->...ij', all_projs.reshape(all_projs.shape[:-2] + (36,)), RHO_FROM_PROJS)
+
+def project_physical_batch(rhos):
+    ''' Returns the closest physical density matrix (in Frobenius norm) to each matrix in a stack, (...,d,d), by projecting its eigenvalues onto the probability simplex (Smolin, Gambetta, Smith 2012).'''
+    eig_vals, eig_vecs = np.linalg.eigh(herm_part(rhos))
+    u = eig_vals[..., ::-1] # descending
+    css = np.cumsum(u, axis=-1) - 1
+    k = np.arange(1, u.shape[-1] + 1)
+    r = np.sum(u - css / k > 0, axis=-1, keepdims=True) # number of eigenvalues kept
+    theta = np.take_along_axis(css, r - 1, axis=-1) / r
+    eig_vals = np.clip(eig_vals - theta, 0, None)
+    return (eig_vecs * eig_vals[..., None, :]) @ np.conj(np.swapaxes(eig_vecs, -1, -2))
+
+def reconstruct_rho_mle(all_projs, max_iter=200, tol=1e-8, mix=1e-3):
+    ''' Maximum-likelihood reconstruction from the 36 normalized projections, (...,6,6) -> (...,4,4). Always returns a physical density matrix.
+    Warm starts from the linear-inversion estimate projected onto the physical states, then runs diluted R rho R iterations (Rehacek et al 2007) over the whole stack until each state is stationary, ||(R/9 - I) rho|| < tol.
+    A warm start with an eigenvalue near 0 that is not already stationary is mixed slightly with I/4, since the iterations cannot move an eigenvalue off 0; exact projections of a state, pure or not, are left as they are.
+    Each state keeps its own step size, which grows while the likelihood increases and is halved when a step would decrease it.
+    params:
+        all_projs: normalized projections, as for reconstruct_rho
+        max_iter: maximum number of iterations
+        tol: stationarity tolerance, on the largest entry of (R/9 - I) rho
+        mix: weight of I/4 mixed into a rank-deficient warm start
+    '''
+    all_projs = np.asarray(all_projs, dtype=float)
+    batch_shape = all_projs.shape[:-2]
+    f = all_projs.reshape(batch_shape + (36,))
+
+    def get_loglike(rho):
+        p = np.clip(np.real(np.einsum('kij,...ji->...k', PROJ_2, rho)), 1e-15, None)
+        return np.sum(f*np.log(p), axis=-1), p
+
+    def get_G(p):
+        # the 36 projectors sum to 9*I, so R/9 - I vanishes at the maximum
+        return np.einsum('...k,kij->...ij', f/p, PROJ_2)/9 - np.eye(4)
+
+    def get_residual(G, rho):
+        return np.max(np.abs(G @ rho), axis=(-2, -1))
+
+    rho = project_physical_batch(reconstruct_rho(all_projs))
+    loglike, p = get_loglike(rho)
+    G = get_G(p)
+    stuck = (np.linalg.eigvalsh(rho)[..., 0] < mix/4) & (get_residual(G, rho) >= tol)
+    if np.any(stuck):
+        rho = np.where(stuck[..., None, None], (1-mix)*rho + mix*np.eye(4)/4, rho)
+        loglike, p = get_loglike(rho)
+        G = get_G(p)
+    eps = np.ones(batch_shape)
+    for _ in range(max_iter):
+        active = get_residual(G, rho) >= tol
+        if not np.any(active):
+            break
+        step = np.eye(4) + eps[..., None, None]*G
+        rho_new = step @ rho @ np.conj(np.swapaxes(step, -1, -2))
+        rho_new = herm_part(rho_new / np.real(np.trace(rho_new, axis1=-2, axis2=-1))[..., None, None])
+        loglike_new, p_new = get_loglike(rho_new)
+        accept = active & (loglike_new >= loglike)
+        rho = np.where(accept[..., None, None], rho_new, rho)
+        p = np.where(accept[..., None], p_new, p)
+        loglike = np.where(accept, loglike_new, loglike)
+        eps = np.where(accept, eps*1.5, np.where(active, eps/2, eps))
+        G = get_G(p)
+    return rho
 
 def test_reconstruct_rho(rho):
     ''' Test the reconstruction of the density matrix using the stokes parameters calculated directly from the density matrix.'''
-    S = get_expec_vals(rho)
-    # define pauli matrices
-    I = np.eye(2)
-    X = np.matrix([[0, 1], [1, 0]])
-    Y = np.matrix([[0, -1j], [1j, 0]])
-    Z = np.matrix([[1, 0], [0, -1]])
-    P = [I, X, Y, Z]
-
-    # compute rho
-    rho = np.zeros((4,4), dtype=complex)
-    for i1 in range(4):
-        for i2 in range(4):
-            rho+= S[i1,i2]*np.kron(P[i1],P[i2])
-
-    return rho/4 # scale by 4 to get the correct density matrix
+    return get_rho_from_stokes(get_expec_vals(rho))
 
 def compute_roik_proj(basis1, basis2, rho):
     ''' Computes projection into desired bases as in the Roik et al paper'''
@@ -255,29 +486,17 @@ def compute_roik_proj(basis1, basis2, rho):
         return 0
             
 def get_all_roik_projs(rho):
-    ''' Computes the projections as defined in Roik et al'''
-    # define the single bases for projection
-    h = np.array([[1], [0]])
-    v = np.array([[0], [1]])
-    d = np.array([[1], [1]])/np.sqrt(2)
-    a = np.array([[1], [-1]])/np.sqrt(2)
-    r = np.array([[1], [1j]])/np.sqrt(2)
-    l = np.array([[1], [-1j]])/np.sqrt(2)
-
-    H = np.kron(h, adjoint(h))
-    V = np.kron(v, adjoint(v))
-    D = np.kron(d, adjoint(d))
-    A = np.kron(a, adjoint(a))
-    R = np.kron(r, adjoint(r))
-    L = np.kron(l, adjoint(l))
-
-    basis_ls =[H, V, D, A, R, L]
-    all_projs =[]
-    for basis in basis_ls:
-        for basis2 in basis_ls:
-            all_projs.append(compute_roik_proj(basis, basis2, rho))
-
-    return np.array(all_projs).reshape(6,6)
+    ''' Computes the projections as defined in Roik et al, for a density matrix or a stack of them: (...,4,4) -> (...,6,6)'''
+    Bell_singlet = np.array([[0, 0, 0, 0], [0, .5, -.5, 0], [0, -0.5, .5, 0], [0, 0, 0, 0]]).reshape((2,2,2,2))
+    rho = np.asarray(rho)
+    rho4 = rho.reshape(rho.shape[:-2] + (2,2,2,2)) # indices: A row, B row, A col, B col
+    # project qubit A onto each single-qubit basis state, leaving qubit B; since the second copy of rho
+    # has its subsystems swapped, its outer qubit is also A, so the same reduced operators serve both copies
+    B = np.einsum('...ipjq,kji->...kpq', rho4, PROJ_1)
+    num = np.einsum('...aij,...bkl,jlik->...ab', B, B, Bell_singlet)
+    denom = np.einsum('...aii,...bkk->...ab', B, B)
+    # compute the projection as defined in Roik et al
+    return np.real(np.divide(num, denom, out=np.zeros_like(num), where=denom!=0))
 
 def compute_roik_proj_sc(p_1,p_2,x,m,phi):
     '''Source code from Roik et al to compute projection'''
@@ -461,7 +680,406 @@ def get_adj_E0_fidelity_purity(rho, rho_actual, purity, eta, chi, model, UV_HWP_
     adj_rho = load_saved_get_E0_rho_c(rho_actual, [eta, chi], purity, model, UV_HWP_offset)
     return get_fidelity(adj_rho, rho), get_purity(adj_rho)
 
-def compute_witnesses(rho, counts = None, expt = False, do_counts = False, expt_purity = None, model=None, do_W = False, do_richard = False, UV_HWP_offset=None, angles = None, num_reps = 30, optimize = True, gd=True, zeta=0.7, ads_test=False, return_all=False, return_params=False, return_lynn=False, return_lynn_only=False):
+## closed form for W1-W6 ##
+BELL_STATES = np.array([[1, 0, 0, 1], [1, 0, 0, -1], [0, 1, 1, 0], [0, 1, -1, 0]]) / np.sqrt(2) # PHI_P, PHI_M, PSI_P, PSI_M
+
+# W1-W6 use phi = cos(theta) phi_1 + sin(theta) phi_2, so Tr(PT(|phi><phi|) rho) = A + B cos(2 theta) + C sin(2 theta).
+# W_TRIG_WEIGHTS[i] holds A, B, C for W_(i+1) as weights on the 16 flattened Stokes parameters.
+W_PAIRS = [(BELL_STATES[0], BELL_STATES[1]), (BELL_STATES[2], BELL_STATES[3]), (BELL_STATES[0], BELL_STATES[2]),
+           (BELL_STATES[1], BELL_STATES[3]), (BELL_STATES[0], 1j*BELL_STATES[3]), (BELL_STATES[1], 1j*BELL_STATES[2])]
+W_CLOSED_NAMES = ['W1', 'W2', 'W3', 'W4', 'W5', 'W6'] # the witnesses minimized exactly by get_W_min_batch
+W_TRIG_WEIGHTS = np.zeros((6, 3, 16))
+for i, (phi_1, phi_2) in enumerate(W_PAIRS):
+    P_11, P_22, P_12 = np.outer(phi_1, np.conj(phi_1)), np.outer(phi_2, np.conj(phi_2)), np.outer(phi_1, np.conj(phi_2))
+    trig_ops = np.array([(P_11 + P_22)/2, (P_11 - P_22)/2, (P_12 + np.conj(P_12.T))/2])
+    trig_ops = np.swapaxes(trig_ops.reshape((3, 2, 2, 2, 2)), -3, -1).reshape((3, 4, 4)) # partial transpose on B
+    W_TRIG_WEIGHTS[i] = np.real(np.einsum('cij,sji->cs', trig_ops, PAULI_2)) / 4
+
+def get_W_min_batch(S, cov_S=None):
+    ''' Exact minima of W1-W6 over theta from the Stokes parameters. Each W is A + B cos(2 theta) + C sin(2 theta), so its minimum is A - sqrt(B^2 + C^2).
+    params:
+        S: Stokes parameters, (...,4,4)
+        cov_S: optional covariance of the Stokes parameters, (...,16,16), from get_stokes_cov
+    returns:
+        W_min: (...,6) minimum of each W
+        theta: (...,6) minimizing theta in [0, pi), in the convention of the operator W's in compute_witnesses
+        W_unc: (...,6) only if cov_S is given; by the envelope theorem the minimum varies like W at fixed theta
+    '''
+    S = np.real(np.asarray(S))
+    S = S.reshape(S.shape[:-2] + (16,))
+    coeffs = np.einsum('wcs,...s->...wc', W_TRIG_WEIGHTS, S)
+    A, B, C = coeffs[..., 0], coeffs[..., 1], coeffs[..., 2]
+    W_min = A - np.hypot(B, C)
+    theta = ((np.arctan2(C, B) + np.pi) / 2) % np.pi
+    if cov_S is None:
+        return W_min, theta
+    weights = W_TRIG_WEIGHTS[:, 0] + np.cos(2*theta)[..., None]*W_TRIG_WEIGHTS[:, 1] + np.sin(2*theta)[..., None]*W_TRIG_WEIGHTS[:, 2]
+    W_unc = get_linear_unc(weights, np.asarray(cov_S)[..., None, :, :])
+    return W_min, theta, W_unc
+
+## registry of witness families ##
+# A witness family W = PT(|phi><phi|) is declared once with register_witness: the domain of its params, its ket phi(params) and optionally its Stokes form.
+# The grid of starts, the multi-start, the branch and bound and the batched Newton below read everything from here, so a registered family is minimized like the W / W'.
+PAULI_2_PT = np.swapaxes(PAULI_2.reshape((16, 2, 2, 2, 2)), -3, -1).reshape((16, 4, 4)) # PT(P_s), so that PT(rho) = sum_s S_s PT(P_s) / 4
+WITNESS_FAMILIES = OrderedDict()
+WITNESS_NAMES, WITNESS_NUM_PARAMS, WITNESS_WEIGHTS, WITNESS_WEIGHTS_HESS, WITNESS_KETS = [], [], [], [], []
+
+def get_weights_from_ket(ket):
+    ''' Stokes form of PT(|phi><phi|) from a ket function returning phi (...,4) and dphi (...,k,4): the weights w_s = Re <phi|PT(P_s)|phi> / 4 (...,16) and their derivatives 2 Re <dphi|PT(P_s)|phi> / 4 (...,k,16). '''
+    def weights(params):
+        phi, dphi = ket(params)
+        M_phi = np.einsum('sij,...j->...si', PAULI_2_PT, phi)
+        return np.real(np.einsum('...i,...si->...s', np.conj(phi), M_phi)) / 4, np.real(np.einsum('...ki,...si->...ks', np.conj(dphi), M_phi)) / 2
+    return weights
+
+def get_weights_hess_from_grads(weights, h=1e-5):
+    ''' Second derivatives of the Stokes weights (...,k,k,16) by central differences of their analytic first derivatives. '''
+    def weights_hess(params):
+        params = np.asarray(params, dtype=float)
+        shifts = h*np.eye(params.shape[-1])
+        return np.stack([(weights(params + shift)[1] - weights(params - shift)[1]) / (2*h) for shift in shifts], axis=-3)
+    return weights_hess
+
+def register_witness(name, ket, domain, weights=None, weights_hess=None, grid_size=None, max_freq=None):
+    ''' Adds the witness family W = PT(|phi><phi|) to WITNESS_FAMILIES, after which minimize_witness, compute_witnesses_batch and, if max_freq is given, minimize_witness_certified handle it.
+    params:
+        name: name of the family; registering an existing name replaces it in place
+        ket: function of params (...,k) returning the normalized ket phi (...,4) and dphi / dparams (...,k,4)
+        domain: (low, high, periodic) for each param; periodic params are wrapped into [low, high), the others are bounded by it
+        weights: optional Stokes form, a function of params returning the weights (...,16) with Tr(W rho) = sum_s w_s S_s and their derivatives (...,k,16); derived from the ket if None
+        weights_hess: optional function of params returning the second derivatives of the weights (...,k,k,16); central differences of the first derivatives if None
+        grid_size: points per param of the coarse grid of starts; 5 per param if None
+        max_freq: if W is a trigonometric polynomial of its params (with period 2 pi), its max frequency in any one of them; needed for the certified minimum
+    returns:
+        index of the family, in the order of WITNESS_NAMES
+    '''
+    domain = [(float(low), float(high), bool(periodic)) for low, high, periodic in domain]
+    weights = get_weights_from_ket(ket) if weights is None else weights
+    weights_hess = get_weights_hess_from_grads(weights) if weights_hess is None else weights_hess
+    grid_size = (5,)*len(domain) if grid_size is None else tuple(grid_size)
+    if len(grid_size) != len(domain):
+        raise ValueError(f'{name}: grid_size has {len(grid_size)} entries for {len(domain)} params')
+    WITNESS_FAMILIES[name] = {'num_params': len(domain), 'domain': domain, 'ket': ket, 'weights': weights, 'weights_hess': weights_hess, 'grid_size': grid_size, 'max_freq': max_freq}
+    entries = [len(domain), weights, weights_hess, ket]
+    if name in WITNESS_NAMES:
+        i = WITNESS_NAMES.index(name)
+        for table, entry in zip([WITNESS_NUM_PARAMS, WITNESS_WEIGHTS, WITNESS_WEIGHTS_HESS, WITNESS_KETS], entries):
+            table[i] = entry
+        return i
+    WITNESS_NAMES.append(name)
+    for table, entry in zip([WITNESS_NUM_PARAMS, WITNESS_WEIGHTS, WITNESS_WEIGHTS_HESS, WITNESS_KETS], entries):
+        table.append(entry)
+    return len(WITNESS_NAMES) - 1
+
+def get_witness_index(i):
+    ''' Index in WITNESS_NAMES of a witness given by name or index. '''
+    return WITNESS_NAMES.index(i) if isinstance(i, str) else i
+
+def wrap_witness_params(i, params):
+    ''' Wraps the periodic params of the i-th witness into their period and clips the others to their domain. '''
+    params = np.array(params, dtype=float)
+    for j, (low, high, periodic) in enumerate(WITNESS_FAMILIES[WITNESS_NAMES[i]]['domain']):
+        params[..., j] = low + (params[..., j] - low) % (high - low) if periodic else np.clip(params[..., j], low, high)
+    return params
+
+# the W (theta periodic with period pi) and W' (theta in [0, pi/2], alpha and beta periodic) from witness_sym.py; all are trigonometric polynomials of frequency at most 2
+for name, k, weights, weights_hess, ket in zip(witness_kernels.WITNESS_NAMES, witness_kernels.WITNESS_NUM_PARAMS, witness_kernels.WITNESS_WEIGHTS, witness_kernels.WITNESS_WEIGHTS_HESS, witness_kernels.WITNESS_KETS):
+    if k == 1:
+        register_witness(name, ket, [(0, np.pi, True)], weights, weights_hess, grid_size=(16,), max_freq=2)
+    else:
+        register_witness(name, ket, [(0, np.pi/2, False)] + [(0, 2*np.pi, True)]*(k - 1), weights, weights_hess, grid_size=(9, 16, 12)[:k], max_freq=2)
+WITNESS_DEFAULT_NAMES = list(WITNESS_NAMES) # the 15 W and W' that compute_witnesses_batch runs by default; later families are opt-in through names
+
+def get_Wpp_ket(params):
+    ''' Ket of the W'' candidate from arianna/wpp_characterization.py, the normalized sum of two product kets
+    (cos(theta) H + e^(i phi) sin(theta) V)(cos(alpha) H + e^(i beta) sin(alpha) V) + (-e^(-i chi) sin(eta) H + cos(eta) V)(-e^(-i lam) sin(gamma) H + cos(gamma) V).
+    params:
+        params: (...,8) theta, phi, alpha, beta, eta, chi, gamma, lam
+    returns:
+        phi: (...,4) normalized ket
+        dphi: (...,8,4) its derivatives
+    '''
+    params = np.asarray(params, dtype=float)
+    theta, phi, alpha, beta, eta, chi, gamma, lam = np.moveaxis(params, -1, 0)
+    def first(x, y):
+        ''' cos(x) H + e^(i y) sin(x) V, and its derivatives (...,2,2) '''
+        e = np.exp(1j*y)
+        return np.stack([np.cos(x) + 0j, e*np.sin(x)], axis=-1), np.stack([np.stack([-np.sin(x) + 0j, e*np.cos(x)], axis=-1), np.stack([0j*x, 1j*e*np.sin(x)], axis=-1)], axis=-2)
+    def second(x, y):
+        ''' -e^(-i y) sin(x) H + cos(x) V, and its derivatives (...,2,2) '''
+        e = np.exp(-1j*y)
+        return np.stack([-e*np.sin(x), np.cos(x) + 0j], axis=-1), np.stack([np.stack([-e*np.cos(x), -np.sin(x) + 0j], axis=-1), np.stack([1j*e*np.sin(x), 0j*x], axis=-1)], axis=-2)
+    def kron(u, v):
+        return np.einsum('...i,...j->...ij', u, v).reshape(np.broadcast_shapes(u.shape, v.shape)[:-1] + (4,))
+    a, da = first(theta, phi)
+    b, db = first(alpha, beta)
+    c, dc = second(eta, chi)
+    d, dd = second(gamma, lam)
+    psi = kron(a, b) + kron(c, d)
+    dpsi = np.concatenate([kron(da, b[..., None, :]), kron(a[..., None, :], db), kron(dc, d[..., None, :]), kron(c[..., None, :], dd)], axis=-2)
+    # normalize: d(psi / |psi|) = (dpsi - phi Re<phi|dpsi>) / |psi|
+    norm = np.maximum(np.linalg.norm(psi, axis=-1), 1e-12)[..., None]
+    phi = psi / norm
+    dphi = (dpsi - phi[..., None, :]*np.real(np.einsum('...i,...ki->...k', np.conj(phi), dpsi))[..., None]) / norm[..., None, :]
+    return phi, dphi
+
+# W'' is not a trigonometric polynomial once normalized, so it has no certified minimum; it can reach the smallest eigenvalue of PT(rho)
+register_witness('Wpp', get_Wpp_ket, [(0, 2*np.pi, True)]*8, grid_size=(3,)*8)
+
+## witnesses as quadratic forms of PT(rho) ##
+# Tr(PT(|phi><phi|) rho) = <phi|PT(rho)|phi>, so each W / W' is a quadratic form in the ket phi once PT(rho) is known.
+# The kets, and the equivalent weights on the Stokes parameters, are generated from one symbolic specification in witness_sym.py;
+# each WITNESS_KETS[i] takes params (...,k) and returns phi (...,4) and dphi / dparams (...,k,4).
+def get_witness_quad(pt_rho, phi):
+    ''' Witness value <phi|PT(rho)|phi> for kets phi (...,4) and partial transposes pt_rho (...,4,4). '''
+    return np.real(np.einsum('...i,...ij,...j->...', np.conj(phi), pt_rho, phi))
+
+def get_witness_val_grad(pt_rho, i, params):
+    ''' Value and analytic gradient of the i-th W / W' (order of WITNESS_NAMES) at params, given PT(rho).
+    params:
+        pt_rho: partial transpose of rho, (...,4,4)
+        i: index of the witness
+        params: (...,k) witness parameters
+    returns:
+        W: (...) witness values
+        grad: (...,k) gradient with respect to params; d<phi|M|phi> = 2 Re <dphi|M|phi> since M is Hermitian
+    '''
+    phi, dphi = WITNESS_KETS[i](params)
+    M_phi = np.einsum('...ij,...j->...i', pt_rho, phi)
+    W = np.real(np.einsum('...i,...i->...', np.conj(phi), M_phi))
+    grad = 2*np.real(np.einsum('...ki,...i->...k', np.conj(dphi), M_phi))
+    return W, grad
+
+## batched witnesses ##
+def get_witness_grid(i, grid_size=None):
+    ''' Coarse grid (G,k) over the domain of the i-th witness, with grid_size points per param (the registered grid_size if None).
+    Periodic params are sampled over one period; bounded ones are cell-centred, since at theta = 0 or pi/2 alpha and beta of the W' drop out and starts there are degenerate. '''
+    family = WITNESS_FAMILIES[WITNESS_NAMES[i]]
+    grid_size = family['grid_size'] if grid_size is None else grid_size
+    axes = [np.linspace(low, high, n, endpoint=False) if periodic else low + (np.arange(n) + 0.5) * (high - low)/n for (low, high, periodic), n in zip(family['domain'], grid_size)]
+    return np.stack(np.meshgrid(*axes, indexing='ij'), axis=-1).reshape(-1, family['num_params'])
+
+def get_grid_local_minima(grid_W, i, grid_size=None):
+    ''' Mask (...,G) of the grid points no larger than their neighbours, i.e. one point per basin; periodic params wrap around, the others do not. '''
+    family = WITNESS_FAMILIES[WITNESS_NAMES[i]]
+    grid_size = tuple(family['grid_size'] if grid_size is None else grid_size)
+    k = family['num_params']
+    W = grid_W.reshape(grid_W.shape[:-1] + grid_size)
+    is_min = np.ones(W.shape, dtype=bool)
+    for j, (_, _, periodic) in enumerate(family['domain']):
+        axis = W.ndim - k + j
+        for shift in (1, -1):
+            neighbour = np.roll(W, shift, axis=axis)
+            if not periodic: # the ends only compare inward
+                edge = [slice(None)]*W.ndim
+                edge[axis] = 0 if shift == 1 else -1
+                neighbour[tuple(edge)] = np.inf
+            is_min &= W <= neighbour
+    return is_min.reshape(grid_W.shape)
+
+def get_witness_starts(i, S, num_starts, grid_size=None):
+    ''' Deterministic starting points for the i-th witness: the num_starts lowest local minima of W on the coarse grid.
+    params:
+        i: index of the witness, in the order of WITNESS_NAMES
+        S: (...,16) Stokes parameters
+        num_starts: number of starts per state; if there are fewer local minima, the best one is repeated
+        grid_size: points per param; the registered grid_size if None
+    returns:
+        (...,num_starts,k) params, ordered by their grid value
+    '''
+    grid = get_witness_grid(i, grid_size)
+    grid_W = np.einsum('gs,...s->...g', WITNESS_WEIGHTS[i](grid)[0], S)
+    grid_W = np.where(get_grid_local_minima(grid_W, i, grid_size), grid_W, np.inf)
+    order = np.argsort(grid_W, axis=-1)[..., :num_starts]
+    order = np.where(np.isfinite(np.take_along_axis(grid_W, order, axis=-1)), order, order[..., :1])
+    return grid[order]
+
+def minimize_witness(i, S, max_starts=30, patience=3, tol=1e-10, grid_size=None):
+    ''' Minimizes the i-th witness for one state with a deterministic multi-start: L-BFGS-B with the analytic gradient from each grid local minimum in turn (get_witness_starts), stopping once patience starts in a row fail to improve the minimum by more than tol.
+    params:
+        i: index or name of the witness, in the order of WITNESS_NAMES
+        S: (16,) Stokes parameters
+        max_starts: max number of starts
+        patience: starts without improvement before stopping
+        tol: improvement below which a start counts as converged to a known minimum
+        grid_size: points per param; the registered grid_size if None
+    returns:
+        W_min, params
+    '''
+    i = get_witness_index(i)
+    S = np.real(np.asarray(S)).reshape(16)
+    bounds = [(None, None) if periodic else (low, high) for low, high, periodic in WITNESS_FAMILIES[WITNESS_NAMES[i]]['domain']] # periodic params are left free and wrapped at the end
+    def W(params):
+        return get_witness_stokes_val_grad(i, params, S)
+    w_min, x_min = np.inf, None
+    isi = 0 # starts since last improvement
+    for x0 in get_witness_starts(i, S, max_starts, grid_size):
+        res = minimize(W, x0=x0, jac=True, bounds=bounds, options={'ftol': 1e-15, 'gtol': 1e-10})
+        if res.fun < w_min - tol:
+            w_min, x_min = res.fun, res.x
+            isi = 0
+        else:
+            isi += 1
+            if isi >= patience:
+                break
+    return w_min, wrap_witness_params(i, x_min)
+
+## certified minimum by branch and bound ##
+def get_witness_hess_bound(i, S):
+    ''' Global bound M (k,k) on |d^2 W / dx_j dx_k| for the i-th witness. W is a trigonometric polynomial with frequencies of at most max_freq in each param,
+    so 2 max_freq + 1 samples per param give its Fourier coefficients c_n exactly, and |d^2 W / dx_j dx_k| <= sum_n |c_n| |n_j n_k|. '''
+    family = WITNESS_FAMILIES[WITNESS_NAMES[i]]
+    k, n = family['num_params'], 2*family['max_freq'] + 1
+    axis = np.arange(n) * 2*np.pi/n
+    samples = np.stack(np.meshgrid(*[axis]*k, indexing='ij'), axis=-1).reshape((-1, k))
+    coeffs = np.abs(np.fft.fftn(get_witness_stokes(i, samples, S).reshape((n,)*k))) / n**k
+    freqs = np.abs(np.stack(np.meshgrid(*[np.fft.fftfreq(n, 1/n)]*k, indexing='ij'), axis=-1)).reshape((-1, k))
+    return np.einsum('n,nj,nk->jk', coeffs.reshape(-1), freqs, freqs)
+
+def minimize_witness_certified(i, S, tol=1e-6, max_iter=100, grid_size=None):
+    ''' Global minimum of the i-th witness to within tol, by branch and bound over boxes of its params.
+    On a box with centre c and half-widths h, W >= W(c) - |grad W(c)|.h - h.M.h / 2 with M from get_witness_hess_bound. Boxes whose bound is above the best value found minus tol are pruned;
+    the rest are split in two along the direction that dominates their bound.
+    params:
+        i: index or name of the witness, in the order of WITNESS_NAMES; it must be registered with max_freq
+        S: (16,) Stokes parameters
+        tol: certified gap between the returned minimum and the lower bound
+        max_iter: max rounds of splitting; if reached, the returned lower bound is looser than tol
+        grid_size: boxes to start from, as in get_witness_grid
+    returns:
+        W_min, params, lower_bound: the global minimum over the domain is in [lower_bound, W_min]
+    Degenerate minima (e.g. W' = 0 along whole curves for product states) leave more boxes to split and take longer.
+    '''
+    i = get_witness_index(i)
+    family = WITNESS_FAMILIES[WITNESS_NAMES[i]]
+    if family['max_freq'] is None:
+        raise ValueError(f'{WITNESS_NAMES[i]} is not registered with max_freq, so its minimum cannot be certified')
+    S = np.real(np.asarray(S)).reshape(16)
+    M = get_witness_hess_bound(i, S)
+    # upper bound from the multi-start
+    w_best, x_best = minimize_witness(i, S, grid_size=grid_size)
+    # the grid cells cover the domain, with one period of the periodic params
+    grid_size = family['grid_size'] if grid_size is None else grid_size
+    centers = get_witness_grid(i, grid_size)
+    half = np.array([(high - low)/(2*n) for (low, high, _), n in zip(family['domain'], grid_size)]) * np.ones_like(centers)
+    lower_bound = -np.inf
+    for _ in range(max_iter):
+        w, g = get_witness_stokes_val_grad(i, centers, S)
+        j_best = np.argmin(w)
+        if w[j_best] < w_best:
+            w_best, x_best = w[j_best], centers[j_best]
+        spread = np.abs(g)*half + half*(half @ M) / 2 # contribution of each direction to the bound
+        bound = w - np.sum(spread, axis=-1)
+        keep = bound < w_best - tol
+        if not np.any(keep):
+            lower_bound = w_best - tol
+            break
+        lower_bound = np.min(bound)
+        centers, half, spread = centers[keep], half[keep], spread[keep]
+        # split each box in two along its dominant direction
+        j = np.argmax(spread, axis=-1)
+        half[np.arange(len(half)), j] /= 2
+        shift = np.zeros_like(half)
+        shift[np.arange(len(half)), j] = half[np.arange(len(half)), j]
+        centers, half = np.concatenate([centers - shift, centers + shift]), np.concatenate([half, half])
+    return w_best, wrap_witness_params(i, x_best), min(lower_bound, w_best)
+
+def compute_witnesses_batch(rhos=None, counts=None, names=None, num_starts=4, grid_size=None, max_iter=50, tol=1e-9, chunk_size=1024):
+    ''' Minimizes the registered witnesses for N states at once. W1-W6 are exact (get_W_min_batch); every other family is refined from the num_starts best local minima of its coarse grid with a vectorized damped Newton step using the analytic gradient and Hessian.
+    params:
+        rhos: (N,4,4) density matrices
+        counts: (N,36) or (N,6,6) counts, used instead of rhos; the witnesses are evaluated on the linear reconstruction of rho, which is the same as the Stokes formulas
+        names: witnesses to minimize, e.g. WITNESS_NAMES for every registered family; the 15 W and W' of WITNESS_DEFAULT_NAMES if None
+        num_starts: starts per state and witness
+        grid_size: points per param of the coarse grids; the registered grid_size of each family if None
+        max_iter: max Newton iterations
+        tol: a start stops once every component of its gradient is below this
+        chunk_size: number of states evaluated on the grid at a time, to bound memory
+    returns:
+        W_vals: (N,len(names)) minimized witness values, in the order of names
+        W_params: (N,len(names),k) minimizing params, k the most params of any of the witnesses; unused params are nan
+    '''
+    if counts is not None:
+        S = get_stokes_from_projs(normalize_counts(np.asarray(counts, dtype=float).reshape((-1, 6, 6))))
+    else:
+        S = get_expec_vals(np.asarray(rhos).reshape((-1, 4, 4)))
+    S = np.real(S).reshape((-1, 16))
+    N = len(S)
+    names = list(WITNESS_DEFAULT_NAMES) if names is None else list(names)
+
+    W_vals = np.zeros((N, len(names)))
+    W_params = np.full((N, len(names), max(WITNESS_NUM_PARAMS[get_witness_index(name)] for name in names)), np.nan)
+    W_closed, theta_closed = get_W_min_batch(S.reshape((-1, 4, 4)))
+
+    S_starts = np.repeat(S, num_starts, axis=0) # one row per (state, start)
+    for n, name in enumerate(names):
+        i = get_witness_index(name)
+        if WITNESS_NAMES[i] in W_CLOSED_NAMES:
+            W_vals[:, n], W_params[:, n, 0] = W_closed[:, W_CLOSED_NAMES.index(WITNESS_NAMES[i])], theta_closed[:, W_CLOSED_NAMES.index(WITNESS_NAMES[i])]
+            continue
+        k = WITNESS_NUM_PARAMS[i]
+        x = np.concatenate([get_witness_starts(i, S[start:start+chunk_size], num_starts, grid_size) for start in range(0, N, chunk_size)]).reshape((-1, k))
+
+        # damped Newton on all starts at once; only the starts that have not converged are updated
+        w, g = get_witness_stokes_val_grad(i, x, S_starts)
+        lam = np.full(len(x), 1e-3)
+        active = np.nonzero(np.max(np.abs(g), axis=-1) >= tol)[0]
+        for _ in range(max_iter):
+            if len(active) == 0:
+                break
+            x_a, S_a = x[active], S_starts[active]
+            H = get_witness_stokes_hess(i, x_a, S_a)
+            step = -np.linalg.solve(H + lam[active, None, None]*np.eye(k), g[active, :, None])[..., 0]
+            x_new = wrap_witness_params(i, x_a + step)
+            w_new, g_new = get_witness_stokes_val_grad(i, x_new, S_a)
+            accept = w_new < w[active]
+            lam[active] = np.where(accept, lam[active] / 3, lam[active] * 10)
+            done = active[accept]
+            x[done], w[done], g[done] = x_new[accept], w_new[accept], g_new[accept]
+            # converged once the gradient vanishes, or stalled once no damping gives a decrease
+            active = active[(np.max(np.abs(g[active]), axis=-1) >= tol) & (lam[active] <= 1e6)]
+        # best start per state
+        w, x = w.reshape((N, num_starts)), x.reshape((N, num_starts, k))
+        best = np.argmin(w, axis=1)
+        W_vals[:, n] = w[np.arange(N), best]
+        W_params[:, n, :k] = x[np.arange(N), best]
+    return W_vals, W_params
+
+def get_witness_mins(W_vals):
+    ''' Reduces (...,n) witness values, in the order of WITNESS_DEFAULT_NAMES, to W_min, Wp_t1, Wp_t2, Wp_t3 like compute_witnesses. '''
+    W_vals = np.asarray(W_vals)
+    return np.min(W_vals[..., :6], axis=-1), np.min(W_vals[..., 6:9], axis=-1), np.min(W_vals[..., 9:12], axis=-1), np.min(W_vals[..., 12:15], axis=-1)
+
+## counts-based witnesses from the normalized correlators ##
+# The count-ratio formulas for the W's are trigonometric combinations of the 15 normalized two-qubit correlators,
+# e.g. ZZ = (HH - HV - VH + VV) / (HH + HV + VH + VV). These are the Stokes parameters from get_stokes_from_projs,
+# so they (and their covariance, from get_stokes_cov) are computed once per count table and passed as S.
+# S is the flattened (...,16) Stokes vector and params are (...,k); both broadcast.
+def get_witness_stokes_val_grad(i, params, S):
+    ''' Value and analytic gradient (...,k) of the i-th W / W' (order of WITNESS_NAMES) from the Stokes parameters. '''
+    S = np.real(np.asarray(S))
+    S = S.reshape(S.shape[:-2] + (16,)) if S.shape[-2:] == (4,4) else S
+    weights, grads = WITNESS_WEIGHTS[i](params)
+    return np.einsum('...s,...s->...', weights, S), np.einsum('...ks,...s->...k', grads, S)
+
+def get_witness_stokes_hess(i, params, S):
+    ''' Analytic Hessian (...,k,k) of the i-th W / W' from the Stokes parameters. '''
+    S = np.real(np.asarray(S))
+    S = S.reshape(S.shape[:-2] + (16,)) if S.shape[-2:] == (4,4) else S
+    return np.einsum('...jks,...s->...jk', WITNESS_WEIGHTS_HESS[i](params), S)
+
+def get_witness_stokes(i, params, S):
+    ''' Value of the i-th W / W' from the Stokes parameters. '''
+    return get_witness_stokes_val_grad(i, params, S)[0]
+
+STOKES_WITNESSES = [lambda params, S, i=i: get_witness_stokes(i, params, S) for i in range(15)]
+
+def get_stokes_witness_weights(i, params):
+    ''' Each W is linear in the Stokes parameters; returns its weights (...,16) at params, for get_linear_unc. '''
+    return WITNESS_WEIGHTS[i](params)[0]
+
+@cached
+def compute_witnesses(rho, counts = None, expt = False, do_counts = False, expt_purity = None, model=None, do_W = False, do_richard = False, UV_HWP_offset=None, angles = None, num_reps = 30, optimize = True, gd=True, zeta=0.7, ads_test=False, return_all=False, return_params=False, return_lynn=False, return_lynn_only=False, certify=False, certify_tol=1e-6):
     ''' Computes the minimum of the 6 Ws and the minimum of the 3 triples of the 9 W's. 
         Params:
             rho: the density matrix
@@ -475,13 +1093,15 @@ def compute_witnesses(rho, counts = None, expt = False, do_counts = False, expt_
             UV_HWP_offset: see description in det_noise in process_expt.py
             model_path: path to noise model csvs.
             angles: angles of eta, chi for E0 states to adjust theory
-            num_reps: int, number of times to run the optimization
-            optimize: bool, whether to optimize the Ws with random or gradient descent or to just check bounds
-            gd: bool, whether to use gradient descent or brute random search
-            zeta: learning rate for gradient descent
+            num_reps: int, max number of deterministic starts for each W' (see minimize_witness)
+            optimize: bool, whether to use the multi-start or just the best start on the coarse grid
+            gd: unused; the W's are minimized with analytic gradients. Kept so existing calls still work
+            zeta: unused, as gd
             ads_test: bool, whether to return w2 expec and sin (theta) for the amplitude damped states
             return_all: bool, whether to return all the Ws or just the min of the 6 and the min of the 3 triples
             return_params: bool, whether to return the params that give the min of the 6 and the min of the 3 triples
+            certify: bool, whether to find the W' minima by branch and bound (minimize_witness_certified), so that each is the global minimum to within certify_tol
+            certify_tol: gap to which the W' minima are certified
     '''
 
     # check if experimental data
@@ -500,234 +1120,39 @@ def compute_witnesses(rho, counts = None, expt = False, do_counts = False, expt_
         #     # rho = adjust_rho(rho, angles, expt_purity)
 
     if do_counts:
-        counts = np.reshape(counts, (36,1))
-        def get_W1(params, counts):
-            a, b = np.cos(params), np.sin(params)
-            HH, HV, HD, HA, HR, HL, VH, VV, VD, VA, VR, VL, DH, DV, DD, DA, DR, DL, AH, AV, AD, AA, AR, AL, RH, RV, RD, RA, RR, RL, LH, LV, LD, LA, LR, LL  = counts
-            return np.real(0.25*(1 + ((HH - HV - VH + VV) / (HH + HV + VH + VV)) + (a**2 - b**2)*((DD - DA - AD + AA) / (DD + DA + AD + AA)) + (a**2 - b**2)*((RR - RL - LR + LL) / (RR + RL + LR + LL)) + 2*a*b*(((HH + HV - VH - VV) / (HH + HV + VH + VV)) + ((HH - HV + VH - VV) / (HH + HV + VH + VV)))))
-        def get_W2(params, counts):
-            a, b = np.cos(params), np.sin(params)
-            HH, HV, HD, HA, HR, HL, VH, VV, VD, VA, VR, VL, DH, DV, DD, DA, DR, DL, AH, AV, AD, AA, AR, AL, RH, RV, RD, RA, RR, RL, LH, LV, LD, LA, LR, LL  = counts
-            return np.real(0.25*(1 - ((HH - HV - VH + VV) / (HH + HV + VH + VV)) + (a**2 - b**2)*((DD - DA - AD + AA) / (DD + DA + AD + AA)) - (a**2 - b**2)*((RR - RL - LR + LL) / (RR + RL + LR + LL)) + 2*a*b*(((HH + HV - VH - VV) / (HH + HV + VH + VV)) - ((HH - HV + VH - VV) / (HH + HV + VH + VV)))))
-        def get_W3(params, counts):
-            a, b = np.cos(params), np.sin(params)
-            HH, HV, HD, HA, HR, HL, VH, VV, VD, VA, VR, VL, DH, DV, DD, DA, DR, DL, AH, AV, AD, AA, AR, AL, RH, RV, RD, RA, RR, RL, LH, LV, LD, LA, LR, LL  = counts
-            return np.real(0.25*(1 + ((DD - DA - AD + AA) / (DD + DA + AD + AA)) + (a**2 - b**2)*((HH - HV - VH + VV) / (HH + HV + VH + VV)) + (a**2 - b**2)*((RR - RL - LR + LL) / (RR + RL + LR + LL)) + 2*a*b*(((DD + DA - AD - AA) / (DD + DA + AD + AA)) + ((DD - DA + AD - AA) / (DD + DA + AD + AA)))))
-        def get_W4(params, counts):
-            a, b = np.cos(params), np.sin(params)
-            HH, HV, HD, HA, HR, HL, VH, VV, VD, VA, VR, VL, DH, DV, DD, DA, DR, DL, AH, AV, AD, AA, AR, AL, RH, RV, RD, RA, RR, RL, LH, LV, LD, LA, LR, LL  = counts
-            return np.real(0.25*(1 - ((DD - DA - AD + AA) / (DD + DA + AD + AA)) + (a**2 - b**2)*((HH - HV - VH + VV) / (HH + HV + VH + VV)) - (a**2 - b**2)*((RR - RL - LR + LL) / (RR + RL + LR + LL)) - 2*a*b*(((DD + DA - AD - AA) / (DD + DA + AD + AA)) - ((DD - DA + AD - AA) / (DD + DA + AD + AA)))))
-        def get_W5(params, counts):
-            a, b = np.cos(params), np.sin(params)
-            HH, HV, HD, HA, HR, HL, VH, VV, VD, VA, VR, VL, DH, DV, DD, DA, DR, DL, AH, AV, AD, AA, AR, AL, RH, RV, RD, RA, RR, RL, LH, LV, LD, LA, LR, LL  = counts
-            return np.real(0.25*(1 + ((RR - RL - LR + LL) / (RR + RL + LR + LL)) + (a**2 - b**2)*((HH - HV - VH + VV) / (HH + HV + VH + VV)) + (a**2 - b**2)*((DD - DA - AD + AA) / (DD + DA + AD + AA)) + 2*a*b*(((RR - LR + RL - LL) / (RR + LR + RL + LL)) + ((RR + LR - RL - LL) / (RR + LR + RL + LL)))))
-        def get_W6(params, counts):
-            a, b = np.cos(params), np.sin(params)
-            HH, HV, HD, HA, HR, HL, VH, VV, VD, VA, VR, VL, DH, DV, DD, DA, DR, DL, AH, AV, AD, AA, AR, AL, RH, RV, RD, RA, RR, RL, LH, LV, LD, LA, LR, LL  = counts
-            return np.real(0.25*(1 - ((RR - RL - LR + LL) / (RR + RL + LR + LL)) + (a**2 - b**2)*((HH - HV - VH + VV) / (HH + HV + VH + VV)) - (a**2 - b**2)*((DD - DA - AD + AA) / (DD + DA + AD + AA)) - 2*a*b*(((RR - LR + RL - LL) / (RR + LR + RL + LL)) - ((RR + LR - RL - LL) / (RR + LR + RL + LL)))))
-        
-        ## W' from summer 2022 ##
-        def get_Wp1(params, counts):
-            theta, alpha = params[0], params[1]
-            HH, HV, HD, HA, HR, HL, VH, VV, VD, VA, VR, VL, DH, DV, DD, DA, DR, DL, AH, AV, AD, AA, AR, AL, RH, RV, RD, RA, RR, RL, LH, LV, LD, LA, LR, LL  = counts
-            return np.real(.25*(1 + ((HH - HV - VH + VV) / (HH + HV + VH + VV)) + np.cos(2*theta)*(((DD - DA - AD + AA) / (DD + DA + AD + AA))+((RR - RL - LR + LL) / (RR + RL + LR + LL)))+np.sin(2*theta)*np.cos(alpha)*(((HH + HV - VH - VV) / (HH + HV + VH + VV)) + ((HH - HV + VH - VV) / (HH + HV + VH + VV))) + np.sin(2*theta)*np.sin(alpha)*(((DR - DL - AR + AL) / (DR + DL + AR + AL)) - ((RD - RA - LD + LA) / (RD + RA + LD + LA)))))
-        def get_Wp2(params, counts):
-            theta, alpha = params[0], params[1]
-            HH, HV, HD, HA, HR, HL, VH, VV, VD, VA, VR, VL, DH, DV, DD, DA, DR, DL, AH, AV, AD, AA, AR, AL, RH, RV, RD, RA, RR, RL, LH, LV, LD, LA, LR, LL  = counts
-            return np.real(.25*(1 - ((HH - HV - VH + VV) / (HH + HV + VH + VV)) + np.cos(2*theta)*(((DD - DA - AD + AA) / (DD + DA + AD + AA))-((RR - RL - LR + LL) / (RR + RL + LR + LL)))+np.sin(2*theta)*np.cos(alpha)*(((HH + HV - VH - VV) / (HH + HV + VH + VV)) - ((HH - HV + VH - VV) / (HH + HV + VH + VV))) - np.sin(2*theta)*np.sin(alpha)*(((DR - DL - AR + AL) / (DR + DL + AR + AL)) - ((RD - RA - LD + LA) / (RD + RA + LD + LA)))))
-        def get_Wp3(params, counts):
-            theta, alpha, beta = params[0], params[1], params[2]
-            HH, HV, HD, HA, HR, HL, VH, VV, VD, VA, VR, VL, DH, DV, DD, DA, DR, DL, AH, AV, AD, AA, AR, AL, RH, RV, RD, RA, RR, RL, LH, LV, LD, LA, LR, LL  = counts
-            return np.real(.25 * (np.cos(theta)**2*(1 + ((HH - HV - VH + VV) / (HH + HV + VH + VV))) + np.sin(theta)**2*(1 - ((HH - HV - VH + VV) / (HH + HV + VH + VV))) + np.cos(theta)**2*np.cos(beta)*(((DD - DA - AD + AA) / (DD + DA + AD + AA)) + ((RR - RL - LR + LL) / (RR + RL + LR + LL))) + np.sin(theta)**2*np.cos(2*alpha - beta)*(((DD - DA - AD + AA) / (DD + DA + AD + AA)) - ((RR - RL - LR + LL) / (RR + RL + LR + LL))) + np.sin(2*theta)*np.cos(alpha)*((DD + DA - AD - AA) / (DD + DA + AD + AA)) + np.sin(2*theta)*np.cos(alpha - beta)*((DD - DA + AD - AA) / (DD + DA + AD + AA)) + np.sin(2*theta)*np.sin(alpha)*((RR - LR + RL - LL) / (RR + LR + RL + LL)) + np.sin(2*theta)*np.sin(alpha - beta)*((RR + LR - RL - LL) / (RR + LR + RL + LL))+np.cos(theta)**2*np.sin(beta)*(((RD - RA - LD + LA) / (RD + RA + LD + LA)) - ((DR - DL - AR + AL) / (DR + DL + AR + AL))) + np.sin(theta)**2*np.sin(2*alpha - beta)*(((RD - RA - LD + LA) / (RD + RA + LD + LA)) + ((DR - DL - AR + AL) / (DR + DL + AR + AL)))))
-        def get_Wp4(params, counts):
-            theta, alpha = params[0], params[1]
-            HH, HV, HD, HA, HR, HL, VH, VV, VD, VA, VR, VL, DH, DV, DD, DA, DR, DL, AH, AV, AD, AA, AR, AL, RH, RV, RD, RA, RR, RL, LH, LV, LD, LA, LR, LL  = counts
-            return np.real(.25*(1+((DD - DA - AD + AA) / (DD + DA + AD + AA))+np.cos(2*theta)*(((HH - HV - VH + VV) / (HH + HV + VH + VV)) + ((RR - RL - LR + LL) / (RR + RL + LR + LL))) + np.sin(2*theta)*np.cos(alpha)*(((DD - DA + AD - AA) / (DD + DA + AD + AA)) + ((DD + DA - AD - AA) / (DD + DA + AD + AA))) + np.sin(2*theta)*np.sin(alpha)*(((RH - RV - LH + LV) / (RH + RV + LH + LV)) - ((HR - HL - VR + VL) / (HR + HL + VR + VL)))))
-        def get_Wp5(params, counts):
-            theta, alpha = params[0], params[1]
-            HH, HV, HD, HA, HR, HL, VH, VV, VD, VA, VR, VL, DH, DV, DD, DA, DR, DL, AH, AV, AD, AA, AR, AL, RH, RV, RD, RA, RR, RL, LH, LV, LD, LA, LR, LL  = counts
-            return np.real(.25*(1-((DD - DA - AD + AA) / (DD + DA + AD + AA))+np.cos(2*theta)*(((HH - HV - VH + VV) / (HH + HV + VH + VV)) - ((RR - RL - LR + LL) / (RR + RL + LR + LL))) + np.sin(2*theta)*np.cos(alpha)*(((DD - DA + AD - AA) / (DD + DA + AD + AA)) - ((DD + DA - AD - AA) / (DD + DA + AD + AA))) - np.sin(2*theta)*np.sin(alpha)*(((RH - RV - LH + LV) / (RH + RV + LH + LV)) - ((HR - HL - VR + VL) / (HR + HL + VR + VL)))))
-        def get_Wp6(params, counts):
-            theta, alpha, beta = params[0], params[1], params[2]
-            HH, HV, HD, HA, HR, HL, VH, VV, VD, VA, VR, VL, DH, DV, DD, DA, DR, DL, AH, AV, AD, AA, AR, AL, RH, RV, RD, RA, RR, RL, LH, LV, LD, LA, LR, LL  = counts
-            return np.real(.25*(np.cos(theta)**2*np.cos(alpha)**2*(1 + ((HH - HV - VH + VV) / (HH + HV + VH + VV)) + ((HH + HV - VH - VV) / (HH + HV + VH + VV)) + ((HH - HV + VH - VV) / (HH + HV + VH + VV))) + np.cos(theta)**2*np.sin(alpha)**2*(1 - ((HH - HV - VH + VV) / (HH + HV + VH + VV)) + ((HH + HV - VH - VV) / (HH + HV + VH + VV)) - ((HH - HV + VH - VV) / (HH + HV + VH + VV))) + np.sin(theta)**2*np.cos(beta)**2*(1 + ((HH - HV - VH + VV) / (HH + HV + VH + VV)) - ((HH + HV - VH - VV) / (HH + HV + VH + VV)) - ((HH - HV + VH - VV) / (HH + HV + VH + VV))) + np.sin(theta)**2*np.sin(beta)**2*(1 - ((HH - HV - VH + VV) / (HH + HV + VH + VV)) - ((HH + HV - VH - VV) / (HH + HV + VH + VV)) + ((HH - HV + VH - VV) / (HH + HV + VH + VV))) + np.sin(2*theta)*np.cos(alpha)*np.cos(beta)*(((DD - DA - AD + AA) / (DD + DA + AD + AA)) + ((RR - RL - LR + LL) / (RR + RL + LR + LL))) + np.sin(2*theta)*np.sin(alpha)*np.sin(beta)*(((DD - DA - AD + AA) / (DD + DA + AD + AA)) - ((RR - RL - LR + LL) / (RR + RL + LR + LL))) + np.sin(2*theta)*np.cos(alpha)*np.sin(beta)*(((RH - RV - LH + LV) / (RH + RV + LH + LV)) + ((RR - LR + RL - LL) / (RR + LR + RL + LL))) + np.sin(2*theta)*np.sin(alpha)*np.cos(beta)*(((RH - RV - LH + LV) / (RH + RV + LH + LV)) - ((RR - LR + RL - LL) / (RR + LR + RL + LL))) - np.cos(theta)**2*np.sin(2*alpha)*(((HR - HL - VR + VL) / (HR + HL + VR + VL)) + ((RR + LR - RL - LL) / (RR + LR + RL + LL))) - np.sin(theta)**2*np.sin(2*beta)*(((HR - HL - VR + VL) / (HR + HL + VR + VL)) - ((RR + LR - RL - LL) / (RR + LR + RL + LL)))))
-        def get_Wp7(params, counts):
-            theta, alpha = params[0], params[1]
-            HH, HV, HD, HA, HR, HL, VH, VV, VD, VA, VR, VL, DH, DV, DD, DA, DR, DL, AH, AV, AD, AA, AR, AL, RH, RV, RD, RA, RR, RL, LH, LV, LD, LA, LR, LL  = counts
-            return np.real(.25*(1 + ((RR - RL - LR + LL) / (RR + RL + LR + LL))+np.cos(2*theta)*(((HH - HV - VH + VV) / (HH + HV + VH + VV)) + ((DD - DA - AD + AA) / (DD + DA + AD + AA))) + np.sin(2*theta)*np.cos(alpha)*(((HD - HA - VD + VA) / (HD + HA + VD + VA)) - ((DH - DV - AH + AV) / (DH + DV + AH + AV))) - np.sin(2*theta)*np.sin(alpha)*(((RR - LR + RL - LL) / (RR + LR + RL + LL))+((RR + LR - RL - LL) / (RR + LR + RL + LL)))))
-        def get_Wp8(params, counts):
-            theta, alpha = params[0], params[1]
-            HH, HV, HD, HA, HR, HL, VH, VV, VD, VA, VR, VL, DH, DV, DD, DA, DR, DL, AH, AV, AD, AA, AR, AL, RH, RV, RD, RA, RR, RL, LH, LV, LD, LA, LR, LL  = counts
-            return np.real(.25*(1 - ((RR - RL - LR + LL) / (RR + RL + LR + LL)) + np.cos(2*theta)*(((HH - HV - VH + VV) / (HH + HV + VH + VV))-((DD - DA - AD + AA) / (DD + DA + AD + AA))) + np.sin(2*theta)*np.cos(alpha)*(((HD - HA - VD + VA) / (HD + HA + VD + VA))+((DH - DV - AH + AV) / (DH + DV + AH + AV)))+np.sin(2*theta)*np.sin(alpha)*(((RR - LR + RL - LL) / (RR + LR + RL + LL)) - ((RR + LR - RL - LL) / (RR + LR + RL + LL)))))
-        def get_Wp9(params, counts):
-            theta, alpha, beta = params[0], params[1], params[2]
-            HH, HV, HD, HA, HR, HL, VH, VV, VD, VA, VR, VL, DH, DV, DD, DA, DR, DL, AH, AV, AD, AA, AR, AL, RH, RV, RD, RA, RR, RL, LH, LV, LD, LA, LR, LL  = counts
-            return np.real(.25*(np.cos(theta)**2*np.cos(alpha)**2*(1 + ((HH - HV - VH + VV) / (HH + HV + VH + VV)) + ((HH + HV - VH - VV) / (HH + HV + VH + VV)) + ((HH - HV + VH - VV) / (HH + HV + VH + VV))) + np.cos(theta)**2*np.sin(alpha)**2*(1 - ((HH - HV - VH + VV) / (HH + HV + VH + VV)) + ((HH + HV - VH - VV) / (HH + HV + VH + VV)) - ((HH - HV + VH - VV) / (HH + HV + VH + VV))) + np.sin(theta)**2*np.cos(beta)**2*(1 + ((HH - HV - VH + VV) / (HH + HV + VH + VV)) - ((HH + HV - VH - VV) / (HH + HV + VH + VV)) - ((HH - HV + VH - VV) / (HH + HV + VH + VV))) + np.sin(theta)**2*np.sin(beta)**2*(1 - ((HH - HV - VH + VV) / (HH + HV + VH + VV)) - ((HH + HV - VH - VV) / (HH + HV + VH + VV)) + ((HH - HV + VH - VV) / (HH + HV + VH + VV))) + np.sin(2*theta)*np.cos(alpha)*np.cos(beta)*(((DD - DA - AD + AA) / (DD + DA + AD + AA)) + ((RR - RL - LR + LL) / (RR + RL + LR + LL))) + np.sin(2*theta)*np.sin(alpha)*np.sin(beta)*(((DD - DA - AD + AA) / (DD + DA + AD + AA)) - ((RR - RL - LR + LL) / (RR + RL + LR + LL))) + np.cos(theta)**2*np.sin(2*alpha)*(((DD - DA + AD - AA) / (DD + DA + AD + AA)) + ((HD - HA - VD + VA) / (HD + HA + VD + VA))) + np.sin(theta)**2*np.sin(2*beta)*(((DD - DA + AD - AA) / (DD + DA + AD + AA)) - ((HD - HA - VD + VA) / (HD + HA + VD + VA))) + np.sin(2*theta)*np.cos(alpha)*np.sin(beta)*(((DD + DA - AD - AA) / (DD + DA + AD + AA)) + ((DH - DV - AH + AV) / (DH + DV + AH + AV)))+ np.sin(2*theta)*np.sin(alpha)*np.cos(beta)*(((DD + DA - AD - AA) / (DD + DA + AD + AA)) - ((DH - DV - AH + AV) / (DH + DV + AH + AV)))))
-
-        def get_nom(params, expec_vals, func):
-            '''For use in error propagation; returns the nominal value of the function'''
-            w = func(params, expec_vals)
-            return unp.nominal_values(w)
+        counts = np.reshape(counts, (6,6))
+        # the normalized correlators are computed once; every W is then a trigonometric combination of them
+        if expt: # optimize on the nominal counts; uncertainties are propagated analytically at the minimum
+            S, cov_S = get_stokes_cov(unp.nominal_values(counts), unp.std_devs(counts))
+        else:
+            S = get_stokes_from_projs(normalize_counts(counts))
+        S_flat = np.real(S).reshape(16)
+
+        def get_W_unc(params, i):
+            '''For use in error propagation; each W is affine in the Stokes parameters'''
+            return get_linear_unc(get_stokes_witness_weights(i, params), cov_S)
+
+        # W1-W6 are exact in closed form from the Stokes parameters
+        if expt:
+            W_closed, W_closed_theta, W_closed_unc = get_W_min_batch(S, cov_S)
+        else:
+            W_closed, W_closed_theta = get_W_min_batch(S)
 
         # now perform optimization; break into three groups based on the number of params to optimize
-        all_W = [get_W1,get_W2, get_W3, get_W4, get_W5, get_W6, get_Wp1, get_Wp2, get_Wp3, get_Wp4, get_Wp5, get_Wp6, get_Wp7, get_Wp8, get_Wp9]
         W_expec_vals = []
-        for i, W in enumerate(all_W):
-            if i <= 5: # just theta optimization
-                # get initial guess at boundary
-                if not(expt):
-                    def min_W(x0):
-                        return minimize(W, x0=x0, args=(counts,), bounds=[(0, np.pi)])
-                else:
-                    def min_W(x0):
-                        return minimize(get_nom, x0=x0, args=(counts, W), bounds=[(0, np.pi/2)])
-
-                def min_W_val(x0):
-                    return min_W(x0).fun
-
-                def min_W_params(x0):
-                    return min_W(x0).x
-
-                x0 = [0]
-                w0_val = min_W_val(x0)
-                w0_params = min_W_params(x0)
-                x0 = [np.pi]
-                w1_val = min_W_val(x0)
-                w1_params = min_W_params(x0)
-                if w0_val < w1_val:
-                    w_min_val = w0_val
-                    w_min_params = w0_params
-                else:
-                    w_min_val = w1_val
-                    w_min_params = w1_params
-                if optimize:
-                    isi = 0 # index since last improvement
-                    for _ in range(num_reps): # repeat 10 times and take the minimum
-                        if gd:
-                            if isi == num_reps//2: # if isi hasn't improved in a while, reset to random initial guess
-                                x0 = [np.random.rand()*np.pi]
-                            else:
-                                grad = approx_fprime(x0, min_W_val, 1e-6)
-                                if np.all(grad < 1e-5*np.ones(len(grad))):
-                                    break
-                                else:
-                                    x0 = x0 - zeta*grad
-                        else:
-                            x0 = [np.random.rand()*np.pi]
-
-                        w_val = min_W_val(x0)
-                        w_params = min_W_params(x0)
-                        
-                        if w_val < w_min_val:
-                            w_min_val = w_val
-                            w_min_params = w_params
-                            isi=0
-                        else:
-                            isi+=1
-            elif i==8 or i==11 or i==14: # theta, alpha, and beta
-                if not(expt):
-                    def min_W(x0):
-                        return minimize(W, x0=x0, args=(counts,), bounds=[(0, np.pi/2),(0, np.pi*2), (0, np.pi*2)])
-                else:
-                    def min_W(x0):
-                        return minimize(get_nom, x0=x0, args=(counts, W), bounds=[(0, np.pi/2),(0, np.pi*2), (0, np.pi*2)])
-
-                def min_W_val(x0):
-                    return min_W(x0).fun
-
-                def min_W_params(x0):
-                    return min_W(x0).x
-                    
-                x0 = [0, 0, 0]
-                w0_val = min_W_val(x0)
-                w0_params = min_W_params(x0)
-                x0 = [np.pi/2, 2*np.pi, 2*np.pi]
-                w1_val = min_W_val(x0)
-                w1_params = min_W_params(x0)
-                if w0_val < w1_val:
-                    w_min_val = w0_val
-                    w_min_params = w0_params
-                else:
-                    w_min_val = w1_val
-                    w_min_params = w1_params
-                if optimize:
-                    isi = 0 # index since last improvement
-                    for _ in range(num_reps): # repeat 10 times and take the minimum
-                        if gd:
-                            if isi == num_reps//2: # if isi hasn't improved in a while, reset to random initial guess
-                                x0 = [np.random.rand()*np.pi/2, np.random.rand()*2*np.pi, np.random.rand()*2*np.pi]
-                            else:
-                                grad = approx_fprime(x0, min_W_val, 1e-6)
-                                if np.all(grad < 1e-5*np.ones(len(grad))):
-                                    x0 = [np.random.rand()*np.pi/2, np.random.rand()*2*np.pi, np.random.rand()*2*np.pi]
-                                else:
-                                    x0 = x0 - zeta*grad
-                        else:
-                            x0 = [np.random.rand()*np.pi/2, np.random.rand()*2*np.pi, np.random.rand()*2*np.pi]
-
-                        w_val = min_W_val(x0)
-                        w_params = min_W_params(x0)
-                        # print(w_min_val, w_val)
-                        if w_val < w_min_val:
-                            w_min_val = w_val
-                            w_min_params = w_params
-                            isi=0
-                        else:
-                            isi+=1
-                
-            else:# theta and alpha
-                if not(expt):
-                    def min_W(x0):
-                        return minimize(W, x0=x0, args=(counts,), bounds=[(0, np.pi/2),(0, np.pi*2)])
-                else:
-                    def min_W(x0):
-                        return minimize(get_nom, x0=x0, args=(counts, W), bounds=[(0, np.pi/2),(0, np.pi*2)])
-
-                def min_W_val(x0):
-                    return min_W(x0).fun
-
-                def min_W_params(x0):
-                    return min_W(x0).x
-                    
-                x0 = [0, 0]
-                w0_val = min_W(x0).fun
-                w0_params = min_W(x0).x
-                x0 = [np.pi/2 , 2*np.pi]
-                w1_val = min_W(x0).fun
-                w1_params = min_W(x0).x
-                if w0_val < w1_val:
-                    w_min_val = w0_val
-                    w_min_params = w0_params
-                else:
-                    w_min_val = w1_val
-                    w_min_params = w1_params
-                if optimize:
-                    isi = 0 # index since last improvement
-                    for _ in range(num_reps): # repeat 10 times and take the minimum
-                        if gd:
-                            if isi == num_reps//2: # if isi hasn't improved in a while, reset to random initial guess
-                                x0 = [np.random.rand()*np.pi/2, np.random.rand()*2*np.pi]
-                            else:
-                                grad = approx_fprime(x0, min_W_val, 1e-6)
-                                if np.all(grad < 1e-5*np.ones(len(grad))):
-                                    x0 = [np.random.rand()*np.pi/2, np.random.rand()*2*np.pi]
-                                else:
-                                    x0 = x0 - zeta*grad
-                        else:
-                            x0 = [np.random.rand()*np.pi/2, np.random.rand()*2*np.pi, np.random.rand()*2*np.pi]
-
-                        w_val = min_W_val(x0)
-                        w_params = min_W_params(x0)
-                        
-                        if w_val < w_min_val:
-                            w_min_val = w_val
-                            w_min_params = w_params
-                            isi=0
-                        else:
-                            isi+=1
-
-            if expt: # automatically calculate uncertainty
-                W_expec_vals.append(W(w_min_params, counts))
+        for i, W in enumerate(STOKES_WITNESSES):
+            if i <= 5: # just theta; closed form
+                w_min_val = W_closed[i]
+                w_min_params = [W_closed_theta[i]]
+            elif certify: # global minimum to within certify_tol
+                w_min_val, w_min_params, _ = minimize_witness_certified(i, S_flat, tol=certify_tol)
+            else: # deterministic multi-start with the analytic gradient
+                w_min_val, w_min_params = minimize_witness(i, S_flat, max_starts=num_reps if optimize else 1)
+
+            if expt and i <= 5: # uncertainty from the envelope theorem
+                W_expec_vals.append(unp.uarray([w_min_val], [W_closed_unc[i]]))
+            elif expt: # automatically calculate uncertainty
+                W_expec_vals.append(unp.uarray(np.ravel(W(w_min_params, S_flat)), [get_W_unc(w_min_params, i)]))
             else:
                 W_expec_vals.append(w_min_val)
         W_min = np.real(min(W_expec_vals[:6]))
@@ -735,7 +1160,7 @@ def compute_witnesses(rho, counts = None, expt = False, do_counts = False, expt_
             Wp_t1 = np.real(min(W_expec_vals[6:9])[0])
             Wp_t2 = np.real(min(W_expec_vals[9:12])[0])
             Wp_t3 = np.real(min(W_expec_vals[12:15])[0])
-        except TypeError:
+        except (TypeError, IndexError):
             Wp_t1 = np.real(min(W_expec_vals[6:9]))
             Wp_t2 = np.real(min(W_expec_vals[9:12]))
             Wp_t3 = np.real(min(W_expec_vals[12:15]))
@@ -745,215 +1170,37 @@ def compute_witnesses(rho, counts = None, expt = False, do_counts = False, expt_
 
         
     else: # use operators instead like in eritas's matlab code
-        # bell states #
-        PHI_P = np.array([1/np.sqrt(2), 0, 0, 1/np.sqrt(2)]).reshape((4,1))
-        PHI_M = np.array([1/np.sqrt(2), 0, 0, -1/np.sqrt(2)]).reshape((4,1))
-        PSI_P = np.array([0, 1/np.sqrt(2),  1/np.sqrt(2), 0]).reshape((4,1))
-        PSI_M = np.array([0, 1/np.sqrt(2),  -1/np.sqrt(2), 0]).reshape((4,1))
         # column vectors
         HH = np.array([1, 0, 0, 0]).reshape((4,1))
         HV = np.array([0, 1, 0, 0]).reshape((4,1))
         VH = np.array([0, 0, 1, 0]).reshape((4,1))
         VV = np.array([0, 0, 0, 1]).reshape((4,1))
 
-        # get the operators
-        # take rank 1 projector and return witness
+        # PT(rho) once per state; a witness is then a quadratic form <phi|PT(rho)|phi>
+        pt_rho = partial_transpose_batch(np.asarray(rho))
         def get_witness(phi):
-            ''' Helper function to compute the witness operator for a given state and return trace(W*rho) for a given state rho.'''
-            W = phi * adjoint(phi)
-            W = partial_transpose(W) # take partial transpose
-            return np.real(np.trace(W @ rho))
-
-        ## ------ for W ------ ##
-        def get_W1(param):
-            a,b = np.cos(param), np.sin(param)
-            phi1 = a*PHI_P + b*PHI_M
-            return get_witness(phi1)
-        def get_W2(param):
-            a,b = np.cos(param), np.sin(param)
-            phi2 = a*PSI_P + b*PSI_M
-            return get_witness(phi2)
-        def get_W3(param):
-            a,b = np.cos(param), np.sin(param)
-            phi3 = a*PHI_P + b*PSI_P
-            return get_witness(phi3)
-        def get_W4(param):
-            a,b = np.cos(param), np.sin(param)
-            phi4 = a*PHI_M + b*PSI_M
-            return get_witness(phi4)
-        def get_W5(param):
-            a,b = np.cos(param), np.sin(param)
-            phi5 = a*PHI_P + 1j*b*PSI_M
-            return get_witness(phi5)
-        def get_W6(param):
-            a,b = np.cos(param), np.sin(param)
-            phi6 = a*PHI_M + 1j*b*PSI_P
-            return get_witness(phi6)
-
-        ## ------ for W' ------ ##
-        def get_Wp1(params):
-            theta, alpha = params[0], params[1]
-            phi1_p = np.cos(theta)*PHI_P + np.exp(1j*alpha)*np.sin(theta)*PHI_M
-            return get_witness(phi1_p)
-        def get_Wp2(params):
-            theta, alpha = params[0], params[1]
-            phi2_p = np.cos(theta)*PSI_P + np.exp(1j*alpha)*np.sin(theta)*PSI_M
-            return get_witness(phi2_p)
-        def get_Wp3(params):
-            theta, alpha, beta = params[0], params[1], params[2]
-            phi3_p = 1/np.sqrt(2) * (np.cos(theta)*HH + np.exp(1j*(beta - alpha))*np.sin(theta)*HV + np.exp(1j*alpha)*np.sin(theta)*VH + np.exp(1j*beta)*np.cos(theta)*VV)
-            return get_witness(phi3_p)
-        def get_Wp4(params):
-            theta, alpha = params[0], params[1]
-            phi4_p = np.cos(theta)*PHI_P + np.exp(1j*alpha)*np.sin(theta)*PSI_P
-            return get_witness(phi4_p)
-        def get_Wp5(params):
-            theta, alpha = params[0], params[1]
-            phi5_p = np.cos(theta)*PHI_M + np.exp(1j*alpha)*np.sin(theta)*PSI_M
-            return get_witness(phi5_p)
-        def get_Wp6(params):
-            theta, alpha, beta = params[0], params[1], params[2]
-            phi6_p = np.cos(theta)*np.cos(alpha)*HH + 1j * np.cos(theta)*np.sin(alpha)*HV + 1j * np.sin(theta)*np.sin(beta)*VH + np.sin(theta)*np.cos(beta)*VV
-            return get_witness(phi6_p)
-        def get_Wp7(params):
-            theta, alpha = params[0], params[1]
-            phi7_p = np.cos(theta)*PHI_P + np.exp(1j*alpha)*np.sin(theta)*PSI_M
-            return get_witness(phi7_p)
-        def get_Wp8(params):
-            theta, alpha = params[0], params[1]
-            phi8_p = np.cos(theta)*PHI_M + np.exp(1j*alpha)*np.sin(theta)*PSI_P
-            return get_witness(phi8_p)
-        def get_Wp9(params):
-            theta, alpha, beta = params[0], params[1], params[2]
-            phi9_p = np.cos(theta)*np.cos(alpha)*HH + np.cos(theta)*np.sin(alpha)*HV + np.sin(theta)*np.sin(beta)*VH + np.sin(theta)*np.cos(beta)*VV
-            return get_witness(phi9_p)
-        
+            ''' Helper function to compute trace(W*rho) for the witness W = PT(|phi><phi|).'''
+            return get_witness_quad(pt_rho, np.ravel(phi))
+
         def get_lynn():
             return 1/5*(2*HH +2*np.exp(1j*np.pi/4)*  HV +  np.exp(1j*np.pi/4)*VH +4*VV) 
         if return_lynn_only:
             return get_witness(get_lynn())
         # get the witness values by minimizing the witness function
         if not(ads_test): 
-            all_W = [get_W1,get_W2, get_W3, get_W4, get_W5, get_W6, get_Wp1, get_Wp2, get_Wp3, get_Wp4, get_Wp5, get_Wp6, get_Wp7, get_Wp8, get_Wp9]
+            S = np.real(get_expec_vals(rho)).reshape(16)
+            W_closed, W_closed_theta = get_W_min_batch(S.reshape((4,4)))
             W_expec_vals = []
             if return_params: # to log the params
                 min_params = []
-            for i, W in enumerate(all_W):
-                if i <= 5: # just theta optimization
-                    # get initial guess at boundary
-                    def min_W(x0):
-                        do_min = minimize(W, x0=x0, bounds=[(0, np.pi)])
-                        # print(do_min['x'])
-                        return do_min['fun']
-                    x0 = [0]
-                    w0 = min_W(x0)
-                    x0 = [np.pi]
-                    w1 = min_W(x0)
-                    if w0 < w1:
-                        w_min = w0
-                        x0_best = [0]
-                    else:
-                        w_min = w1
-                        x0_best = [np.pi]
-                    if optimize:
-                        isi = 0 # index since last improvement
-                        for _ in range(num_reps): # repeat 10 times and take the minimum
-                            if gd:
-                                if isi == num_reps//2: # if isi hasn't improved in a while, reset to random initial guess
-                                    x0 = [np.random.rand()*np.pi]
-                                else:
-                                    grad = approx_fprime(x0, min_W, 1e-6)
-                                    if np.all(grad < 1e-5*np.ones(len(grad))):
-                                        break
-                                    else:
-                                        x0 = x0 - zeta*grad
-                            else:
-                                x0 = [np.random.rand()*np.pi]
-
-                            w = min_W(x0)
-                            
-                            if w < w_min:
-                                w_min = w
-                                x0_best = x0
-                                isi=0
-                            else:
-                                isi+=1
-                    # print('------------------')
-                elif i==8 or i==11 or i==14: # theta, alpha, and beta
-                    def min_W(x0):
-                        do_min = minimize(W, x0=x0, bounds=[(0, np.pi/2),(0, np.pi*2), (0, np.pi*2)])
-                        return do_min['fun']
-
-                    x0 = [0, 0, 0]
-                    w0 = min_W(x0)
-                    x0 = [np.pi/2 , 2*np.pi, 2*np.pi]
-                    w1 = min_W(x0)
-                    if w0 < w1:
-                        w_min = w0
-                        x0_best = [0, 0, 0]
-                    else:
-                        w_min = w1
-                        x0_best = [np.pi/2 , 2*np.pi, 2*np.pi]
-                    if optimize:
-                        isi = 0 # index since last improvement
-                        for _ in range(num_reps): # repeat 10 times and take the minimum
-                            if gd:
-                                if isi == num_reps//2: # if isi hasn't improved in a while, reset to random initial guess
-                                    x0 = [np.random.rand()*np.pi/2, np.random.rand()*2*np.pi, np.random.rand()*2*np.pi]
-                                else:
-                                    grad = approx_fprime(x0, min_W, 1e-6)
-                                    if np.all(grad < 1e-5*np.ones(len(grad))):
-                                        x0 = [np.random.rand()*np.pi/2, np.random.rand()*2*np.pi, np.random.rand()*2*np.pi]
-                                    else:
-                                        x0 = x0 - zeta*grad
-                            else:
-                                x0 = [np.random.rand()*np.pi/2, np.random.rand()*2*np.pi, np.random.rand()*2*np.pi]
-
-                            w = min_W(x0)
-                            
-                            if w < w_min:
-                                w_min = w
-                                x0_best = x0
-                                isi=0
-                            else:
-                                isi+=1
-                else:# theta and alpha
-                    def min_W(x0):
-                        return minimize(W, x0=x0, bounds=[(0, np.pi/2),(0, np.pi*2)])['fun']
-                        
-                    x0 = [0, 0]
-                    w0 = min_W(x0)
-                    x0 = [np.pi/2 , 2*np.pi]
-                    w1 = min_W(x0)
-                    if w0 < w1:
-                        w_min = w0
-                        x0_best = [0, 0]
-                    else:
-                        w_min = w1
-                        x0_best = [np.pi/2 , 2*np.pi]
-                    if optimize:
-                        isi = 0 # index since last improvement
-                        for _ in range(num_reps): # repeat 10 times and take the minimum
-                            if gd:
-                                if isi == num_reps//2: # if isi hasn't improved in a while, reset to random initial guess
-                                    x0 = [np.random.rand()*np.pi/2, np.random.rand()*2*np.pi]
-                                else:
-                                    grad = approx_fprime(x0, min_W, 1e-6)
-                                    if np.all(grad < 1e-5*np.ones(len(grad))):
-                                        x0 = [np.random.rand()*np.pi/2, np.random.rand()*2*np.pi]
-                                    else:
-                                        x0 = x0 - zeta*grad
-                            else:
-                                x0 = [np.random.rand()*np.pi/2, np.random.rand()*2*np.pi, np.random.rand()*2*np.pi]
-
-                            w = min_W(x0)
-                            
-                            if w < w_min:
-                                w_min = w
-                                x0_best = x0
-                                isi=0
-                            else:
-                                isi+=1
+            for i in range(15):
+                if i <= 5: # just theta; closed form
+                    w_min = W_closed[i]
+                    x0_best = [W_closed_theta[i]]
+                elif certify: # global minimum to within certify_tol
+                    w_min, x0_best, _ = minimize_witness_certified(i, S, tol=certify_tol)
+                else: # deterministic multi-start with the analytic gradient
+                    w_min, x0_best = minimize_witness(i, S, max_starts=num_reps if optimize else 1)
                 if return_params:
                     min_params.append(x0_best)
                 W_expec_vals.append(w_min)
@@ -989,11 +1236,9 @@ def compute_witnesses(rho, counts = None, expt = False, do_counts = False, expt_
                 else:
                     return W_expec_vals
         else: 
-            W2_main= minimize(get_W2, x0=[0], bounds=[(0, np.pi)])
-            W2_val = W2_main['fun']
-            W2_param = W2_main['x']
+            W_closed, W_closed_theta = get_W_min_batch(get_expec_vals(rho))
 
-            return W2_val, W2_param[0]
+            return W_closed[1], W_closed_theta[1]
 
 def test_witnesses():
     '''Calculate witness vals for select experimental states'''
@@ -1035,61 +1280,291 @@ def get_min_eig(rho):
     '''
     Computes the eigenvalues of the partial transpose; if at least one is negative, then state labeled as '0' for entangled; else, '1'. 
     '''
+    # PT is Hermitian, so use the Hermitian solver; eigenvalues come back sorted
+    return float(np.linalg.eigvalsh(partial_transpose_batch(rho))[0]) # return min eigenvalue
 
-    # compute partial tranpose
-    PT = partial_transpose(rho)
-    eigenvals = la.eigvals(PT)
-    eigenvals.sort() # sort
-
-    return np.real(eigenvals[0]) # return min eigenvalue
-
+@cached
 def get_concurrence(rho):
     ''' Calculates concurrence of a density matrix using R matrix. '''
-    def R_matrix(rho):
-        ''' Calculates the Hermitian R matrix for finding concurrence. '''
-        def spin_flip(rho):
-            ''' Returns the 'spin-flipped' (tilde) version of a density matrix rho.'''
-            # define spin operators
-            Sy = np.array([[0,-1j],[1j,0]])
-            SySy = np.kron(Sy,Sy)
-            # perform spin flipping
-            return SySy @ rho.conj() @ SySy
-        sqrt_rho = la.sqrtm(rho)
-        rho_tilde = spin_flip(rho)
-        return la.sqrtm(sqrt_rho @ rho_tilde @ sqrt_rho)
-    R = R_matrix(rho)
-    eig_vals = np.real(la.eigvals(R))
-    eig_vals = np.sort(eig_vals)[::-1] # reverse sort array
-    return np.max([0,eig_vals[0] - eig_vals[1] - eig_vals[2] - eig_vals[3]])
+    return float(get_concurrence_batch(rho))
 
 def check_conc_min_eig(rho, printf=False):
     ''' Returns both concurence and min eigenvalue of partial transpose. '''
-    concurrence = get_concurrence(rho)
-    min_eig = get_min_eig(rho)
+    concurrence, min_eig, _, _ = get_ent_metrics_batch(rho)
+    concurrence, min_eig = float(concurrence), float(min_eig)
     if printf:
         print('Concurrence: ', concurrence)
         print('Min eigenvalue: ', min_eig)
     return concurrence, min_eig
 
+def partial_transpose_batch(rhos, subsys='B', dims=(2, 2)):
+    ''' Computes the partial transpose of a stack of bipartite density matrices, (...,d_A d_B,d_A d_B), by swapping tensor indices.
+    Params:
+        rhos: density matrix or stack of density matrices
+        subsys: which subsystem to compute partial transpose wrt, i.e. 'A' or 'B'
+        dims: (d_A, d_B), the dimensions of the two subsystems; 2 qubits by default
+    '''
+    rhos = np.asarray(rhos)
+    shape = rhos.shape
+    d_A, d_B = dims
+    rhos = rhos.reshape(shape[:-2] + (d_A, d_B, d_A, d_B)) # indices: A row, B row, A col, B col
+    if subsys=='B':
+        PT = np.swapaxes(rhos, -3, -1)
+    elif subsys=='A':
+        PT = np.swapaxes(rhos, -4, -2)
+    else:
+        raise ValueError(f'Invalid subsys. You have {subsys} but needs to be either "A" or "B".')
+    return PT.reshape(shape)
+
+def spin_flip_batch(rhos):
+    ''' Returns the 'spin-flipped' (tilde) version of a stack of density matrices, (Sy x Sy) rho* (Sy x Sy).'''
+    Sy = np.array([[0,-1j],[1j,0]])
+    SySy = np.kron(Sy,Sy)
+    return SySy @ np.conj(np.asarray(rhos, dtype=complex)) @ SySy
+
+def get_concurrence_batch(rhos, sqrt_rho=None):
+    ''' Calculates the concurrence of a stack of density matrices, (...,4,4).
+    The eigenvalues of rho*rho_tilde equal those of the Hermitian sqrt(rho) rho_tilde sqrt(rho), so this needs one eigh and one eigvalsh per state rather than nested sqrtm.
+    sqrt_rho: optional precomputed sqrtm_batch(rhos)
+    '''
+    if sqrt_rho is None:
+        sqrt_rho = sqrtm_batch(rhos)
+    M = sqrt_rho @ spin_flip_batch(rhos) @ sqrt_rho
+    eig_vals = np.sqrt(np.clip(np.linalg.eigvalsh(herm_part(M)), 0, None))[..., ::-1] # descending
+    return np.maximum(0, eig_vals[..., 0] - eig_vals[..., 1] - eig_vals[..., 2] - eig_vals[..., 3])
+
+def get_ent_metrics_batch(rhos):
+    ''' Computes the entanglement metrics for a stack of density matrices, (N,4,4), in one pass.
+    returns:
+        concurrence
+        min_eig: minimum eigenvalue of the partial transpose
+        negativity: sum of the magnitudes of the negative eigenvalues of the partial transpose
+        log_negativity: log2 of the trace norm of the partial transpose
+    '''
+    concurrence = get_concurrence_batch(rhos)
+    negativity, log_negativity, min_eig = get_negativity_batch(rhos)
+    return concurrence, min_eig, negativity, log_negativity
+
+## qudit kernels ##
+# The kernels below take the subsystem dimensions (d_A, d_B) and cost O(d^3) per state, so the nogo and witness work can go past qubits.
+# partial_transpose_batch, eigh_batch, sqrtm_batch and get_fidelity_batch already work for any dimension.
+def get_rho_batch(kets):
+    ''' Density matrices |psi><psi| (...,d,d) from a stack of state vectors (...,d) or column vectors (...,d,1). '''
+    kets = np.asarray(kets, dtype=complex)
+    if kets.shape[-1] == 1: # column vectors
+        kets = kets[..., 0]
+    return np.einsum('...i,...j->...ij', kets, np.conj(kets))
+
+def get_purity_batch(rhos):
+    ''' Purity Tr(rho^2) = sum |rho_ij|^2 of a stack of Hermitian density matrices (...,d,d), in O(d^2). '''
+    return np.sum(np.abs(np.asarray(rhos))**2, axis=(-2, -1))
+
+def get_negativity_batch(rhos, dims=(2, 2), subsys='B', pt_eigs=None):
+    ''' Negativity and log negativity of a stack of bipartite density matrices (...,d_A d_B,d_A d_B) with subsystem dimensions dims.
+    pt_eigs: optional precomputed ascending eigenvalues of the partial transposes
+    returns:
+        negativity: sum of the magnitudes of the negative eigenvalues of the partial transpose
+        log_negativity: log2 of the trace norm of the partial transpose
+        min_eig: minimum eigenvalue of the partial transpose
+    '''
+    if pt_eigs is None:
+        pt_eigs = np.linalg.eigvalsh(herm_part(partial_transpose_batch(rhos, subsys, dims)))
+    return -np.sum(np.minimum(pt_eigs, 0), axis=-1), np.log2(np.sum(np.abs(pt_eigs), axis=-1)), pt_eigs[..., 0]
+
+def get_bell_basis(d):
+    ''' The d^2 generalized Bell states of two qudits, |Phi_cp> = sum_l e^(2 pi i p l / d) |l>|l + c mod d> / sqrt(d), as rows (d^2,d^2) at index d*c + p.
+    c is the correlation class and p the phase class, as in nogo/solve_prep.HyperBell.get_bell, but in the tensor product basis |l>|m> at index d*l + m rather than the number basis.
+    For d = 2 the rows are PHI_P, PHI_M, PSI_P, PSI_M. '''
+    c, p, l = np.meshgrid(np.arange(d), np.arange(d), np.arange(d), indexing='ij')
+    bell = np.zeros((d, d, d, d*d), dtype=complex)
+    bell[c, p, l, d*l + (l + c) % d] = np.exp(2j*np.pi*p*l/d) / np.sqrt(d)
+    return bell.sum(axis=2).reshape((d*d, d*d))
+
+## optimal decomposable witness ##
+# For a two-qubit state the most violated decomposable witness is W = PT(|v><v|), v the eigenvector of the smallest eigenvalue of PT(rho), with Tr(W rho) = <v|PT(rho)|v>.
+# Its decomposition into the HVDARL projectors follows STOKES_FROM_PROJS, except that a Pauli with an identity factor (and the identity itself) can be read from any basis pair
+# that is measured anyway. The counts are normalized per basis pair (PROJ_GROUPS), so measurements come in groups of 4, and the smallest set of groups for every
+# pattern of nonzero Stokes weights is tabulated on first use (get_group_tables).
+PAULI_BASIS = [None, 1, 2, 0] # basis pair measuring each Pauli, in the order of PROJ_GROUPS: Z in H/V, X in D/A, Y in R/L
+GROUP_PROJS = [np.flatnonzero(PROJ_GROUPS == g) for g in range(9)]
+GROUP_TABLES = {} # filled by get_group_tables on first use, so importing rho_methods (e.g. in each pool worker) does not pay for it
+
+def get_group_tables():
+    ''' The set-cover tables of the 9 basis-pair groups, built on the first call and cached in GROUP_TABLES.
+    returns:
+        masks: (2^9,36) measurements in each subset of the 9 groups
+        decomps: (2^9,36,16) projector coefficients from Stokes weights, using only the groups in the subset
+        min_subsets: (2^16,) smallest subset of groups for each pattern of nonzero Stokes weights; ties go to the lowest subset
+    '''
+    if not GROUP_TABLES:
+        masks = np.zeros((2**9, 36), dtype=bool)
+        decomps = np.zeros((2**9, 36, 16))
+        covers = np.zeros(2**9, dtype=int) # bit s set if the subset can measure P_s
+        for m in range(1, 2**9):
+            groups = [g for g in range(9) if m >> g & 1]
+            for g in groups:
+                masks[m, GROUP_PROJS[g]] = True
+            for a in range(4):
+                for b in range(4):
+                    options = [g for g in groups if (a==0 or g//3 == PAULI_BASIS[a]) and (b==0 or g%3 == PAULI_BASIS[b])]
+                    if len(options) == 0:
+                        continue
+                    g = min(options, key=lambda g: (g//3 != g%3, g)) # same basis on both qubits, like STOKES_FROM_PROJS, if available
+                    for k in GROUP_PROJS[g]:
+                        decomps[m, k, 4*a + b] = (1 if a==0 else (-1)**(k//6 % 2)) * (1 if b==0 else (-1)**(k%6 % 2))
+                    covers[m] |= 1 << (4*a + b)
+        min_subsets = np.zeros(2**16, dtype=int)
+        supports = np.arange(2**16)
+        for m in sorted(range(1, 2**9), key=lambda m: (-bin(m).count('1'), -m)):
+            min_subsets[(supports & ~covers[m]) == 0] = m
+        GROUP_TABLES.update(masks=masks, decomps=decomps, min_subsets=min_subsets)
+    return GROUP_TABLES['masks'], GROUP_TABLES['decomps'], GROUP_TABLES['min_subsets']
+
+def get_min_eig_batch(rhos):
+    ''' Smallest eigenvalue (...) of the partial transpose of a stack of density matrices (...,4,4), and its eigenvector (...,4). '''
+    eig_vals, eig_vecs = np.linalg.eigh(herm_part(partial_transpose_batch(rhos)))
+    return eig_vals[..., 0], eig_vecs[..., :, 0]
+
+def get_optimal_witness_batch(rhos, tol=1e-10):
+    ''' Most violated decomposable witness for a stack of density matrices, its decomposition into the 36 HVDARL projectors, and the fewest measurements needed to estimate it.
+    params:
+        rhos: (...,4,4) density matrices
+        tol: Stokes weights of W below this are treated as 0
+    returns:
+        W: (...,4,4) optimal witness PT(|v><v|)
+        W_val: (...) Tr(W rho), the smallest eigenvalue of PT(rho); negative iff rho is NPT
+        proj_coeffs: (...,6,6) c with W = sum_k c_k |k><k| over the projectors of get_all_projs, so Tr(W rho) = sum_k c_k p_k for the normalized projections p (e.g. from normalize_counts)
+        meas_mask: (...,6,6) smallest set of measurements, in whole basis pairs, from which W can be estimated; c vanishes outside it
+    '''
+    rhos = np.asarray(rhos)
+    W_val, v = get_min_eig_batch(rhos)
+    W = partial_transpose_batch(np.einsum('...i,...j->...ij', v, np.conj(v)))
+    weights = np.real(np.einsum('sij,...ji->...s', PAULI_2, W)) / 4
+    masks, decomps, min_subsets = get_group_tables()
+    subset = min_subsets[(np.abs(weights) > tol) @ (1 << np.arange(16))]
+    proj_coeffs = np.einsum('...ks,...s->...k', decomps[subset], weights)
+    batch_shape = rhos.shape[:-2]
+    return W, W_val, proj_coeffs.reshape(batch_shape + (6,6)), masks[subset].reshape(batch_shape + (6,6))
+
+## state with cached decompositions ##
+class DensityMatrix:
+    ''' A density matrix, or a stack of them (...,4,4), whose decompositions are computed on first use and then cached, so each metric below costs at most one eigendecomposition of rho and one of PT(rho).
+    The wrapped array is treated as immutable; make a new DensityMatrix after changing it.
+    params:
+        rho: (...,4,4) array, np.matrix or DensityMatrix
+    '''
+    __slots__ = ('rho', '_eig', '_sqrt', '_pt_eig', '_stokes', '_projs')
+
+    def __init__(self, rho):
+        self.rho = rho.rho if isinstance(rho, DensityMatrix) else np.asarray(rho, dtype=complex)
+        self._eig, self._sqrt, self._pt_eig, self._stokes, self._projs = None, None, None, None, None
+
+    def __repr__(self):
+        return f'DensityMatrix(shape={self.rho.shape})'
+
+    ## cached decompositions ##
+    @property
+    def eig(self):
+        ''' Eigenvalues (...,4) in ascending order, unclipped, and eigenvectors (...,4,4) as columns. '''
+        if self._eig is None:
+            self._eig = np.linalg.eigh(herm_part(self.rho))
+        return self._eig
+
+    @property
+    def sqrt(self):
+        ''' Positive square root (...,4,4), from the cached eigendecomposition. '''
+        if self._sqrt is None:
+            self._sqrt = sqrtm_batch(self.rho, self.eig)
+        return self._sqrt
+
+    @property
+    def pt_eig(self):
+        ''' Eigenvalues (...,4) in ascending order and eigenvectors (...,4,4) of the partial transpose. '''
+        if self._pt_eig is None:
+            self._pt_eig = np.linalg.eigh(herm_part(partial_transpose_batch(self.rho)))
+        return self._pt_eig
+
+    @property
+    def stokes(self):
+        ''' Stokes parameters (...,4,4), as in get_expec_vals. '''
+        if self._stokes is None:
+            self._stokes = np.real(get_expec_vals(self.rho))
+        return self._stokes
+
+    @property
+    def projs(self):
+        ''' The 36 projections (...,6,6), as in get_all_projs. '''
+        if self._projs is None:
+            self._projs = get_all_projs(self.rho)
+        return self._projs
+
+    ## metrics ##
+    @property
+    def purity(self):
+        ''' Purity from get_purity_batch. '''
+        return get_purity_batch(self.rho)
+
+    @property
+    def min_eig(self):
+        ''' Smallest eigenvalue of the partial transpose. '''
+        return self.pt_eig[0][..., 0]
+
+    @property
+    def negativity(self):
+        ''' Negativity from get_negativity_batch, reusing the cached partial transpose eigenvalues. '''
+        return get_negativity_batch(self.rho, pt_eigs=self.pt_eig[0])[0]
+
+    @property
+    def log_negativity(self):
+        ''' Log negativity from get_negativity_batch, reusing the cached partial transpose eigenvalues. '''
+        return get_negativity_batch(self.rho, pt_eigs=self.pt_eig[0])[1]
+
+    @property
+    def concurrence(self):
+        ''' Concurrence from get_concurrence_batch, reusing the cached square root. '''
+        return get_concurrence_batch(self.rho, self.sqrt)
+
+    def fidelity(self, other):
+        ''' Fidelity with another state (array or DensityMatrix, broadcast against this one) from get_fidelity_batch.
+        The square root of this state is passed only if it is already cached; get_fidelity_batch skips it when either side is pure. '''
+        other = DensityMatrix(other)
+        return get_fidelity_batch(self.rho, other.rho, self._sqrt)
+
+    def is_valid(self, tol=1e-8):
+        ''' Validity mask and reason codes from is_valid_rho_batch, using the cached eigenvalues. '''
+        eig_vals = self.eig[0] if np.all(np.isfinite(self.rho)) else None
+        return is_valid_rho_batch(self.rho, tol, eig_vals)
+
+## relative entropy of coherence ##
+# Product bases keyed by one letter per qubit: H for H/V, D for D/A, R for R/L; each entry holds the 4 product kets as rows.
+COHERENCE_BASES = {a + b: np.einsum('ki,lj->klij', HVDARL[2*i:2*i+2], HVDARL[2*j:2*j+2]).reshape((4, 4)) for i, a in enumerate('HDR') for j, b in enumerate('HDR')}
+
+def get_vn_entropy_batch(rhos):
+    ''' Von Neumann entropy in bits of a stack of density matrices (...,d,d), from eigvalsh. '''
+    eig_vals = np.clip(np.linalg.eigvalsh(herm_part(rhos)), 0, None)
+    return -np.sum(eig_vals * np.log2(np.where(eig_vals > 0, eig_vals, 1)), axis=-1)
+
+def get_rel_entropy_coherence_batch(rhos, basis_key='HH'):
+    ''' Relative entropy of coherence C(rho) = S(Delta(rho)) - S(rho) in bits (Asif et al 2023) for a stack of density matrices (...,4,4),
+    where Delta dephases rho in a product basis. Delta(rho) is diagonal there, so its entropy is the Shannon entropy of the populations <k|rho|k>.
+    params:
+        rhos: density matrices
+        basis_key: two character string identifier in COHERENCE_BASES, e.g. 'HH' for H/V on both qubits, 'DD' for D/A, 'RR' for R/L
+    returns:
+        (...) relative entropy of coherence
+    '''
+    basis = COHERENCE_BASES[basis_key]
+    pops = np.clip(np.real(np.einsum('ki,...ij,kj->...k', np.conj(basis), rhos, basis)), 0, None)
+    dephased_entropy = -np.sum(pops * np.log2(np.where(pops > 0, pops, 1)), axis=-1)
+    return dephased_entropy - get_vn_entropy_batch(rhos)
+
 def get_rel_entropy_concurrence(basis_key, rho):
     ''' Based on the paper Asif et al 2023. 
     Params:
-        basis: two character string identifer
+        basis: two character string identifer, as in COHERENCE_BASES
         rho: density matrix
     Returns: the relative entropy of coherence'''
-
-    # store basis elements in dictionary
-    bases = {}
-    basis = bases[basis_key]
-    def get_rho_diag(rho):
-        rho_d = np.zeros_like(rho)
-        for s in basis:
-            rho_d += adjoint(s) @ rho @ s @ s @ adjoint(s)
-    def get_entropy(rho):
-        return -np.trace(rho @ np.log(rho))
-    rho_diag = get_rho_diag(rho)
-    
-    return get_entropy(rho_diag) - get_entropy(rho)
+    return float(get_rel_entropy_coherence_batch(rho, basis_key))
 
 
 ##############################################
@@ -0,0 +1,1817 @@
+# generated by witness_sym.py from the symbolic witness specification; do not edit by hand
+# each witness W = PT(|phi><phi|) has Tr(W rho) = sum_s w_s(params) S_s = <phi|PT(rho)|phi>
+import numpy as np
+
+
+def get_W1_weights(params):
+    ''' Stokes weights of W1 (...,16) at params (...,1), and their derivatives (...,1,16).'''
+    params = np.asarray(params)
+    theta = params[..., 0]
+    shape = params.shape[:-1]
+    x0 = 2*theta
+    x1 = np.sin(x0)
+    x2 = (1/4)*x1
+    x3 = np.cos(x0)
+    x4 = (1/4)*x3
+    x5 = (1/2)*x3
+    x6 = -1/2*x1
+    weights = np.zeros(shape + (16,), dtype=float)
+    weights[..., 0] = 1/4
+    weights[..., 3] = x2
+    weights[..., 5] = x4
+    weights[..., 10] = x4
+    weights[..., 12] = x2
+    weights[..., 15] = 1/4
+    grads = np.zeros(shape + (1, 16), dtype=float)
+    grads[..., 0, 3] = x5
+    grads[..., 0, 5] = x6
+    grads[..., 0, 10] = x6
+    grads[..., 0, 12] = x5
+    return weights, grads
+
+def get_W1_weights_hess(params):
+    ''' Second derivatives of the Stokes weights of W1 (...,1,1,16) at params (...,1).'''
+    params = np.asarray(params)
+    theta = params[..., 0]
+    shape = params.shape[:-1]
+    x0 = 2*theta
+    x1 = -np.sin(x0)
+    x2 = -np.cos(x0)
+    hess = np.zeros(shape + (1, 1, 16), dtype=float)
+    hess[..., 0, 0, 3] = x1
+    hess[..., 0, 0, 5] = x2
+    hess[..., 0, 0, 10] = x2
+    hess[..., 0, 0, 12] = x1
+    return hess
+
+def get_W1_ket(params):
+    ''' Ket phi (...,4) of W1 at params (...,1), and its derivatives (...,1,4).'''
+    params = np.asarray(params)
+    theta = params[..., 0]
+    shape = params.shape[:-1]
+    x0 = (1/2)*np.sqrt(2)
+    x1 = x0*np.sin(theta)
+    x2 = x0*np.cos(theta)
+    x3 = x1 + x2
+    x4 = -x1 + x2
+    phi = np.zeros(shape + (4,), dtype=complex)
+    phi[..., 0] = x3
+    phi[..., 3] = x4
+    dphi = np.zeros(shape + (1, 4), dtype=complex)
+    dphi[..., 0, 0] = x4
+    dphi[..., 0, 3] = -x3
+    return phi, dphi
+
+
+def get_W2_weights(params):
+    ''' Stokes weights of W2 (...,16) at params (...,1), and their derivatives (...,1,16).'''
+    params = np.asarray(params)
+    theta = params[..., 0]
+    shape = params.shape[:-1]
+    x0 = 2*theta
+    x1 = np.sin(x0)
+    x2 = (1/4)*x1
+    x3 = np.cos(x0)
+    x4 = (1/4)*x3
+    x5 = (1/2)*x3
+    x6 = (1/2)*x1
+    weights = np.zeros(shape + (16,), dtype=float)
+    weights[..., 0] = 1/4
+    weights[..., 3] = -x2
+    weights[..., 5] = x4
+    weights[..., 10] = -x4
+    weights[..., 12] = x2
+    weights[..., 15] = -1/4
+    grads = np.zeros(shape + (1, 16), dtype=float)
+    grads[..., 0, 3] = -x5
+    grads[..., 0, 5] = -x6
+    grads[..., 0, 10] = x6
+    grads[..., 0, 12] = x5
+    return weights, grads
+
+def get_W2_weights_hess(params):
+    ''' Second derivatives of the Stokes weights of W2 (...,1,1,16) at params (...,1).'''
+    params = np.asarray(params)
+    theta = params[..., 0]
+    shape = params.shape[:-1]
+    x0 = 2*theta
+    x1 = np.sin(x0)
+    x2 = np.cos(x0)
+    hess = np.zeros(shape + (1, 1, 16), dtype=float)
+    hess[..., 0, 0, 3] = x1
+    hess[..., 0, 0, 5] = -x2
+    hess[..., 0, 0, 10] = x2
+    hess[..., 0, 0, 12] = -x1
+    return hess
+
+def get_W2_ket(params):
+    ''' Ket phi (...,4) of W2 at params (...,1), and its derivatives (...,1,4).'''
+    params = np.asarray(params)
+    theta = params[..., 0]
+    shape = params.shape[:-1]
+    x0 = (1/2)*np.sqrt(2)
+    x1 = x0*np.sin(theta)
+    x2 = x0*np.cos(theta)
+    x3 = x1 + x2
+    x4 = -x1 + x2
+    phi = np.zeros(shape + (4,), dtype=complex)
+    phi[..., 1] = x3
+    phi[..., 2] = x4
+    dphi = np.zeros(shape + (1, 4), dtype=complex)
+    dphi[..., 0, 1] = x4
+    dphi[..., 0, 2] = -x3
+    return phi, dphi
+
+
+def get_W3_weights(params):
+    ''' Stokes weights of W3 (...,16) at params (...,1), and their derivatives (...,1,16).'''
+    params = np.asarray(params)
+    theta = params[..., 0]
+    shape = params.shape[:-1]
+    x0 = 2*theta
+    x1 = np.sin(x0)
+    x2 = (1/4)*x1
+    x3 = np.cos(x0)
+    x4 = (1/4)*x3
+    x5 = (1/2)*x3
+    x6 = -1/2*x1
+    weights = np.zeros(shape + (16,), dtype=float)
+    weights[..., 0] = 1/4
+    weights[..., 1] = x2
+    weights[..., 4] = x2
+    weights[..., 5] = 1/4
+    weights[..., 10] = x4
+    weights[..., 15] = x4
+    grads = np.zeros(shape + (1, 16), dtype=float)
+    grads[..., 0, 1] = x5
+    grads[..., 0, 4] = x5
+    grads[..., 0, 10] = x6
+    grads[..., 0, 15] = x6
+    return weights, grads
+
+def get_W3_weights_hess(params):
+    ''' Second derivatives of the Stokes weights of W3 (...,1,1,16) at params (...,1).'''
+    params = np.asarray(params)
+    theta = params[..., 0]
+    shape = params.shape[:-1]
+    x0 = 2*theta
+    x1 = -np.sin(x0)
+    x2 = -np.cos(x0)
+    hess = np.zeros(shape + (1, 1, 16), dtype=float)
+    hess[..., 0, 0, 1] = x1
+    hess[..., 0, 0, 4] = x1
+    hess[..., 0, 0, 10] = x2
+    hess[..., 0, 0, 15] = x2
+    return hess
+
+def get_W3_ket(params):
+    ''' Ket phi (...,4) of W3 at params (...,1), and its derivatives (...,1,4).'''
+    params = np.asarray(params)
+    theta = params[..., 0]
+    shape = params.shape[:-1]
+    x0 = (1/2)*np.sqrt(2)
+    x1 = x0*np.cos(theta)
+    x2 = x0*np.sin(theta)
+    x3 = -x2
+    phi = np.zeros(shape + (4,), dtype=complex)
+    phi[..., 0] = x1
+    phi[..., 1] = x2
+    phi[..., 2] = x2
+    phi[..., 3] = x1
+    dphi = np.zeros(shape + (1, 4), dtype=complex)
+    dphi[..., 0, 0] = x3
+    dphi[..., 0, 1] = x1
+    dphi[..., 0, 2] = x1
+    dphi[..., 0, 3] = x3
+    return phi, dphi
+
+
+def get_W4_weights(params):
+    ''' Stokes weights of W4 (...,16) at params (...,1), and their derivatives (...,1,16).'''
+    params = np.asarray(params)
+    theta = params[..., 0]
+    shape = params.shape[:-1]
+    x0 = 2*theta
+    x1 = np.sin(x0)
+    x2 = (1/4)*x1
+    x3 = np.cos(x0)
+    x4 = (1/4)*x3
+    x5 = (1/2)*x3
+    x6 = (1/2)*x1
+    weights = np.zeros(shape + (16,), dtype=float)
+    weights[..., 0] = 1/4
+    weights[..., 1] = x2
+    weights[..., 4] = -x2
+    weights[..., 5] = -1/4
+    weights[..., 10] = -x4
+    weights[..., 15] = x4
+    grads = np.zeros(shape + (1, 16), dtype=float)
+    grads[..., 0, 1] = x5
+    grads[..., 0, 4] = -x5
+    grads[..., 0, 10] = x6
+    grads[..., 0, 15] = -x6
+    return weights, grads
+
+def get_W4_weights_hess(params):
+    ''' Second derivatives of the Stokes weights of W4 (...,1,1,16) at params (...,1).'''
+    params = np.asarray(params)
+    theta = params[..., 0]
+    shape = params.shape[:-1]
+    x0 = 2*theta
+    x1 = np.sin(x0)
+    x2 = np.cos(x0)
+    hess = np.zeros(shape + (1, 1, 16), dtype=float)
+    hess[..., 0, 0, 1] = -x1
+    hess[..., 0, 0, 4] = x1
+    hess[..., 0, 0, 10] = x2
+    hess[..., 0, 0, 15] = -x2
+    return hess
+
+def get_W4_ket(params):
+    ''' Ket phi (...,4) of W4 at params (...,1), and its derivatives (...,1,4).'''
+    params = np.asarray(params)
+    theta = params[..., 0]
+    shape = params.shape[:-1]
+    x0 = (1/2)*np.sqrt(2)
+    x1 = x0*np.cos(theta)
+    x2 = x0*np.sin(theta)
+    x3 = -x2
+    x4 = -x1
+    phi = np.zeros(shape + (4,), dtype=complex)
+    phi[..., 0] = x1
+    phi[..., 1] = x2
+    phi[..., 2] = x3
+    phi[..., 3] = x4
+    dphi = np.zeros(shape + (1, 4), dtype=complex)
+    dphi[..., 0, 0] = x3
+    dphi[..., 0, 1] = x1
+    dphi[..., 0, 2] = x4
+    dphi[..., 0, 3] = x2
+    return phi, dphi
+
+
+def get_W5_weights(params):
+    ''' Stokes weights of W5 (...,16) at params (...,1), and their derivatives (...,1,16).'''
+    params = np.asarray(params)
+    theta = params[..., 0]
+    shape = params.shape[:-1]
+    x0 = 2*theta
+    x1 = np.sin(x0)
+    x2 = -1/4*x1
+    x3 = np.cos(x0)
+    x4 = (1/4)*x3
+    x5 = -1/2*x3
+    x6 = -1/2*x1
+    weights = np.zeros(shape + (16,), dtype=float)
+    weights[..., 0] = 1/4
+    weights[..., 2] = x2
+    weights[..., 5] = x4
+    weights[..., 8] = x2
+    weights[..., 10] = 1/4
+    weights[..., 15] = x4
+    grads = np.zeros(shape + (1, 16), dtype=float)
+    grads[..., 0, 2] = x5
+    grads[..., 0, 5] = x6
+    grads[..., 0, 8] = x5
+    grads[..., 0, 15] = x6
+    return weights, grads
+
+def get_W5_weights_hess(params):
+    ''' Second derivatives of the Stokes weights of W5 (...,1,1,16) at params (...,1).'''
+    params = np.asarray(params)
+    theta = params[..., 0]
+    shape = params.shape[:-1]
+    x0 = 2*theta
+    x1 = np.sin(x0)
+    x2 = -np.cos(x0)
+    hess = np.zeros(shape + (1, 1, 16), dtype=float)
+    hess[..., 0, 0, 2] = x1
+    hess[..., 0, 0, 5] = x2
+    hess[..., 0, 0, 8] = x1
+    hess[..., 0, 0, 15] = x2
+    return hess
+
+def get_W5_ket(params):
+    ''' Ket phi (...,4) of W5 at params (...,1), and its derivatives (...,1,4).'''
+    params = np.asarray(params)
+    theta = params[..., 0]
+    shape = params.shape[:-1]
+    x0 = (1/2)*np.sqrt(2)
+    x1 = x0*np.cos(theta)
+    x2 = x0*np.sin(theta)
+    x3 = 1j*x2
+    x4 = -x2
+    x5 = 1j*x1
+    phi = np.zeros(shape + (4,), dtype=complex)
+    phi[..., 0] = x1
+    phi[..., 1] = x3
+    phi[..., 2] = -x3
+    phi[..., 3] = x1
+    dphi = np.zeros(shape + (1, 4), dtype=complex)
+    dphi[..., 0, 0] = x4
+    dphi[..., 0, 1] = x5
+    dphi[..., 0, 2] = -x5
+    dphi[..., 0, 3] = x4
+    return phi, dphi
+
+
+def get_W6_weights(params):
+    ''' Stokes weights of W6 (...,16) at params (...,1), and their derivatives (...,1,16).'''
+    params = np.asarray(params)
+    theta = params[..., 0]
+    shape = params.shape[:-1]
+    x0 = 2*theta
+    x1 = np.sin(x0)
+    x2 = (1/4)*x1
+    x3 = np.cos(x0)
+    x4 = (1/4)*x3
+    x5 = (1/2)*x3
+    x6 = (1/2)*x1
+    weights = np.zeros(shape + (16,), dtype=float)
+    weights[..., 0] = 1/4
+    weights[..., 2] = -x2
+    weights[..., 5] = -x4
+    weights[..., 8] = x2
+    weights[..., 10] = -1/4
+    weights[..., 15] = x4
+    grads = np.zeros(shape + (1, 16), dtype=float)
+    grads[..., 0, 2] = -x5
+    grads[..., 0, 5] = x6
+    grads[..., 0, 8] = x5
+    grads[..., 0, 15] = -x6
+    return weights, grads
+
+def get_W6_weights_hess(params):
+    ''' Second derivatives of the Stokes weights of W6 (...,1,1,16) at params (...,1).'''
+    params = np.asarray(params)
+    theta = params[..., 0]
+    shape = params.shape[:-1]
+    x0 = 2*theta
+    x1 = np.sin(x0)
+    x2 = np.cos(x0)
+    hess = np.zeros(shape + (1, 1, 16), dtype=float)
+    hess[..., 0, 0, 2] = x1
+    hess[..., 0, 0, 5] = x2
+    hess[..., 0, 0, 8] = -x1
+    hess[..., 0, 0, 15] = -x2
+    return hess
+
+def get_W6_ket(params):
+    ''' Ket phi (...,4) of W6 at params (...,1), and its derivatives (...,1,4).'''
+    params = np.asarray(params)
+    theta = params[..., 0]
+    shape = params.shape[:-1]
+    x0 = (1/2)*np.sqrt(2)
+    x1 = x0*np.cos(theta)
+    x2 = x0*np.sin(theta)
+    x3 = 1j*x2
+    x4 = 1j*x1
+    phi = np.zeros(shape + (4,), dtype=complex)
+    phi[..., 0] = x1
+    phi[..., 1] = x3
+    phi[..., 2] = x3
+    phi[..., 3] = -x1
+    dphi = np.zeros(shape + (1, 4), dtype=complex)
+    dphi[..., 0, 0] = -x2
+    dphi[..., 0, 1] = x4
+    dphi[..., 0, 2] = x4
+    dphi[..., 0, 3] = x2
+    return phi, dphi
+
+
+def get_Wp1_weights(params):
+    ''' Stokes weights of Wp1 (...,16) at params (...,2), and their derivatives (...,2,16).'''
+    params = np.asarray(params)
+    theta, alpha = params[..., 0], params[..., 1]
+    shape = params.shape[:-1]
+    x0 = 2*theta
+    x1 = alpha - x0
+    x2 = np.sin(x1)
+    x3 = alpha + x0
+    x4 = np.sin(x3)
+    x5 = (1/8)*x2 - 1/8*x4
+    x6 = -x5
+    x7 = (1/4)*np.cos(x0)
+    x8 = np.cos(x1)
+    x9 = np.cos(x3)
+    x10 = (1/8)*x8 - 1/8*x9
+    x11 = -x10
+    x12 = (1/4)*x8 + (1/4)*x9
+    x13 = -1/2*np.sin(x0)
+    x14 = (1/4)*x2 + (1/4)*x4
+    weights = np.zeros(shape + (16,), dtype=float)
+    weights[..., 0] = 1/4
+    weights[..., 3] = x6
+    weights[..., 5] = x7
+    weights[..., 6] = x10
+    weights[..., 9] = x11
+    weights[..., 10] = x7
+    weights[..., 12] = x6
+    weights[..., 15] = 1/4
+    grads = np.zeros(shape + (2, 16), dtype=float)
+    grads[..., 0, 3] = x12
+    grads[..., 0, 5] = x13
+    grads[..., 0, 6] = x14
+    grads[..., 0, 9] = -x14
+    grads[..., 0, 10] = x13
+    grads[..., 0, 12] = x12
+    grads[..., 1, 3] = x11
+    grads[..., 1, 6] = x6
+    grads[..., 1, 9] = x5
+    grads[..., 1, 12] = x11
+    return weights, grads
+
+def get_Wp1_weights_hess(params):
+    ''' Second derivatives of the Stokes weights of Wp1 (...,2,2,16) at params (...,2).'''
+    params = np.asarray(params)
+    theta, alpha = params[..., 0], params[..., 1]
+    shape = params.shape[:-1]
+    x0 = 2*theta
+    x1 = alpha - x0
+    x2 = np.sin(x1)
+    x3 = alpha + x0
+    x4 = np.sin(x3)
+    x5 = (1/2)*x2 - 1/2*x4
+    x6 = -np.cos(x0)
+    x7 = np.cos(x1)
+    x8 = np.cos(x3)
+    x9 = (1/2)*x7 - 1/2*x8
+    x10 = -1/4*x2 - 1/4*x4
+    x11 = (1/4)*x7 + (1/4)*x8
+    x12 = -x11
+    x13 = (1/8)*x2 - 1/8*x4
+    x14 = (1/8)*x7 - 1/8*x8
+    hess = np.zeros(shape + (2, 2, 16), dtype=float)
+    hess[..., 0, 0, 3] = x5
+    hess[..., 0, 0, 5] = x6
+    hess[..., 0, 0, 6] = -x9
+    hess[..., 0, 0, 9] = x9
+    hess[..., 0, 0, 10] = x6
+    hess[..., 0, 0, 12] = x5
+    hess[..., 0, 1, 3] = x10
+    hess[..., 0, 1, 6] = x11
+    hess[..., 0, 1, 9] = x12
+    hess[..., 0, 1, 12] = x10
+    hess[..., 1, 0, 3] = x10
+    hess[..., 1, 0, 6] = x11
+    hess[..., 1, 0, 9] = x12
+    hess[..., 1, 0, 12] = x10
+    hess[..., 1, 1, 3] = x13
+    hess[..., 1, 1, 6] = -x14
+    hess[..., 1, 1, 9] = x14
+    hess[..., 1, 1, 12] = x13
+    return hess
+
+def get_Wp1_ket(params):
+    ''' Ket phi (...,4) of Wp1 at params (...,2), and its derivatives (...,2,4).'''
+    params = np.asarray(params)
+    theta, alpha = params[..., 0], params[..., 1]
+    shape = params.shape[:-1]
+    x0 = np.cos(theta)
+    x1 = np.sqrt(2)
+    x2 = (1/2)*x1
+    x3 = x0*x2
+    x4 = np.exp(1j*alpha)
+    x5 = x2*np.sin(theta)
+    x6 = x4*x5
+    x7 = x3*x4
+    x8 = 1j*x6
+    phi = np.zeros(shape + (4,), dtype=complex)
+    phi[..., 0] = x3 + x6
+    phi[..., 3] = (1/2)*x0*x1 - x6
+    dphi = np.zeros(shape + (2, 4), dtype=complex)
+    dphi[..., 0, 0] = -x5 + x7
+    dphi[..., 0, 3] = -x5 - x7
+    dphi[..., 1, 0] = x8
+    dphi[..., 1, 3] = -x8
+    return phi, dphi
+
+
+def get_Wp2_weights(params):
+    ''' Stokes weights of Wp2 (...,16) at params (...,2), and their derivatives (...,2,16).'''
+    params = np.asarray(params)
+    theta, alpha = params[..., 0], params[..., 1]
+    shape = params.shape[:-1]
+    x0 = 2*theta
+    x1 = alpha - x0
+    x2 = np.sin(x1)
+    x3 = alpha + x0
+    x4 = np.sin(x3)
+    x5 = (1/8)*x2 - 1/8*x4
+    x6 = (1/4)*np.cos(x0)
+    x7 = np.cos(x1)
+    x8 = np.cos(x3)
+    x9 = (1/8)*x7 - 1/8*x8
+    x10 = -x9
+    x11 = (1/4)*x7 + (1/4)*x8
+    x12 = (1/2)*np.sin(x0)
+    x13 = -1/4*x2 - 1/4*x4
+    weights = np.zeros(shape + (16,), dtype=float)
+    weights[..., 0] = 1/4
+    weights[..., 3] = x5
+    weights[..., 5] = x6
+    weights[..., 6] = x10
+    weights[..., 9] = x10
+    weights[..., 10] = -x6
+    weights[..., 12] = -x5
+    weights[..., 15] = -1/4
+    grads = np.zeros(shape + (2, 16), dtype=float)
+    grads[..., 0, 3] = -x11
+    grads[..., 0, 5] = -x12
+    grads[..., 0, 6] = x13
+    grads[..., 0, 9] = x13
+    grads[..., 0, 10] = x12
+    grads[..., 0, 12] = x11
+    grads[..., 1, 3] = x9
+    grads[..., 1, 6] = x5
+    grads[..., 1, 9] = x5
+    grads[..., 1, 12] = x10
+    return weights, grads
+
+def get_Wp2_weights_hess(params):
+    ''' Second derivatives of the Stokes weights of Wp2 (...,2,2,16) at params (...,2).'''
+    params = np.asarray(params)
+    theta, alpha = params[..., 0], params[..., 1]
+    shape = params.shape[:-1]
+    x0 = 2*theta
+    x1 = alpha - x0
+    x2 = np.sin(x1)
+    x3 = alpha + x0
+    x4 = np.sin(x3)
+    x5 = (1/2)*x2 - 1/2*x4
+    x6 = np.cos(x0)
+    x7 = np.cos(x1)
+    x8 = np.cos(x3)
+    x9 = (1/2)*x7 - 1/2*x8
+    x10 = (1/4)*x2 + (1/4)*x4
+    x11 = -1/4*x7 - 1/4*x8
+    x12 = -x10
+    x13 = (1/8)*x2 - 1/8*x4
+    x14 = (1/8)*x7 - 1/8*x8
+    hess = np.zeros(shape + (2, 2, 16), dtype=float)
+    hess[..., 0, 0, 3] = -x5
+    hess[..., 0, 0, 5] = -x6
+    hess[..., 0, 0, 6] = x9
+    hess[..., 0, 0, 9] = x9
+    hess[..., 0, 0, 10] = x6
+    hess[..., 0, 0, 12] = x5
+    hess[..., 0, 1, 3] = x10
+    hess[..., 0, 1, 6] = x11
+    hess[..., 0, 1, 9] = x11
+    hess[..., 0, 1, 12] = x12
+    hess[..., 1, 0, 3] = x10
+    hess[..., 1, 0, 6] = x11
+    hess[..., 1, 0, 9] = x11
+    hess[..., 1, 0, 12] = x12
+    hess[..., 1, 1, 3] = -x13
+    hess[..., 1, 1, 6] = x14
+    hess[..., 1, 1, 9] = x14
+    hess[..., 1, 1, 12] = x13
+    return hess
+
+def get_Wp2_ket(params):
+    ''' Ket phi (...,4) of Wp2 at params (...,2), and its derivatives (...,2,4).'''
+    params = np.asarray(params)
+    theta, alpha = params[..., 0], params[..., 1]
+    shape = params.shape[:-1]
+    x0 = np.cos(theta)
+    x1 = np.sqrt(2)
+    x2 = (1/2)*x1
+    x3 = x0*x2
+    x4 = np.exp(1j*alpha)
+    x5 = x2*np.sin(theta)
+    x6 = x4*x5
+    x7 = x3*x4
+    x8 = 1j*x6
+    phi = np.zeros(shape + (4,), dtype=complex)
+    phi[..., 1] = x3 + x6
+    phi[..., 2] = (1/2)*x0*x1 - x6
+    dphi = np.zeros(shape + (2, 4), dtype=complex)
+    dphi[..., 0, 1] = -x5 + x7
+    dphi[..., 0, 2] = -x5 - x7
+    dphi[..., 1, 1] = x8
+    dphi[..., 1, 2] = -x8
+    return phi, dphi
+
+
+def get_Wp3_weights(params):
+    ''' Stokes weights of Wp3 (...,16) at params (...,3), and their derivatives (...,3,16).'''
+    params = np.asarray(params)
+    theta, alpha, beta = params[..., 0], params[..., 1], params[..., 2]
+    shape = params.shape[:-1]
+    x0 = 2*theta
+    x1 = -alpha + beta + x0
+    x2 = -beta
+    x3 = alpha + x0
+    x4 = x2 + x3
+    x5 = (1/8)*np.sin(x1) + (1/8)*np.sin(x4)
+    x6 = (1/8)*np.cos(x1) - 1/8*np.cos(x4)
+    x7 = alpha - x0
+    x8 = np.sin(x7)
+    x9 = np.sin(x3)
+    x10 = -1/8*x8 + (1/8)*x9
+    x11 = np.cos(beta)
+    x12 = alpha + x2
+    x13 = np.sin(x12)
+    x14 = np.sin(alpha)
+    x15 = np.sin(theta)
+    x16 = x15**2
+    x17 = (1/2)*x16
+    x18 = x14*x17
+    x19 = -1/4*x11 + x13*x18
+    x20 = np.sin(beta)
+    x21 = (1/4)*x20
+    x22 = np.cos(x12)
+    x23 = x18*x22 - x21
+    x24 = np.cos(x7)
+    x25 = np.cos(x3)
+    x26 = (1/8)*x24 - 1/8*x25
+    x27 = np.cos(theta)
+    x28 = x27**2
+    x29 = 2*alpha + x2
+    x30 = np.sin(x29)
+    x31 = (1/4)*x16
+    x32 = x21*x28 + x30*x31
+    x33 = np.cos(x29)
+    x34 = (1/4)*x11*x28 - x31*x33
+    x35 = 1/2 - x16
+    x36 = x15*x27
+    x37 = x14*x36
+    x38 = (1/2)*x36
+    x39 = x17*x30
+    x40 = x17*x33
+    weights = np.zeros(shape + (16,), dtype=float)
+    weights[..., 0] = 1/4
+    weights[..., 1] = x5
+    weights[..., 2] = x6
+    weights[..., 4] = x10
+    weights[..., 5] = -x19
+    weights[..., 6] = x23
+    weights[..., 8] = x26
+    weights[..., 9] = x32
+    weights[..., 10] = x34
+    weights[..., 15] = (1/4)*np.cos(x0)
+    grads = np.zeros(shape + (3, 16), dtype=float)
+    grads[..., 0, 1] = x22*x35
+    grads[..., 0, 2] = x13*x35
+    grads[..., 0, 4] = (1/4)*x24 + (1/4)*x25
+    grads[..., 0, 5] = -x13*x37
+    grads[..., 0, 6] = x22*x37
+    grads[..., 0, 8] = (1/4)*x8 + (1/4)*x9
+    grads[..., 0, 9] = x38*(-x20 + x30)
+    grads[..., 0, 10] = -x38*(x11 + x33)
+    grads[..., 0, 15] = -1/2*np.sin(x0)
+    grads[..., 1, 1] = -x6
+    grads[..., 1, 2] = x5
+    grads[..., 1, 4] = -x26
+    grads[..., 1, 5] = -x39
+    grads[..., 1, 6] = x40
+    grads[..., 1, 8] = x10
+    grads[..., 1, 9] = x40
+    grads[..., 1, 10] = x39
+    grads[..., 2, 1] = x6
+    grads[..., 2, 2] = -x5
+    grads[..., 2, 5] = x23
+    grads[..., 2, 6] = x19
+    grads[..., 2, 9] = x34
+    grads[..., 2, 10] = -x32
+    return weights, grads
+
+def get_Wp3_weights_hess(params):
+    ''' Second derivatives of the Stokes weights of Wp3 (...,3,3,16) at params (...,3).'''
+    params = np.asarray(params)
+    theta, alpha, beta = params[..., 0], params[..., 1], params[..., 2]
+    shape = params.shape[:-1]
+    x0 = 2*theta
+    x1 = beta + x0
+    x2 = -alpha + x1
+    x3 = np.sin(x2)
+    x4 = -beta
+    x5 = alpha + x0
+    x6 = x4 + x5
+    x7 = np.sin(x6)
+    x8 = np.cos(x2)
+    x9 = np.cos(x6)
+    x10 = -x0
+    x11 = alpha + x10
+    x12 = np.sin(x11)
+    x13 = np.sin(x5)
+    x14 = alpha + x4
+    x15 = np.sin(x14)
+    x16 = np.cos(x0)
+    x17 = np.sin(alpha)
+    x18 = x16*x17
+    x19 = np.cos(x14)
+    x20 = np.cos(x11)
+    x21 = np.cos(x5)
+    x22 = beta + x10
+    x23 = 2*alpha
+    x24 = x1 - x23
+    x25 = (1/4)*np.sin(x24)
+    x26 = x23 + x4
+    x27 = x0 + x26
+    x28 = np.sin(x27)
+    x29 = (1/4)*np.cos(x24)
+    x30 = (1/4)*np.cos(x27)
+    x31 = (1/2)*x16
+    x32 = x15*x31
+    x33 = x19*x31
+    x34 = -1/4*x12 - 1/4*x13
+    x35 = -x29 + x30
+    x36 = (1/4)*x20 + (1/4)*x21
+    x37 = np.cos(x26)
+    x38 = np.cos(theta)
+    x39 = np.sin(theta)
+    x40 = x38*x39
+    x41 = x37*x40
+    x42 = np.sin(x26)
+    x43 = x40*x42
+    x44 = x17*x40
+    x45 = x19*x44
+    x46 = x15*x44
+    x47 = np.cos(beta)
+    x48 = (1/2)*x40
+    x49 = -x48*(x37 + x47)
+    x50 = np.sin(beta)
+    x51 = x48*(-x42 + x50)
+    x52 = x39**2
+    x53 = 2*x52 - 1
+    x54 = (1/2)*x15
+    x55 = -x53
+    x56 = (1/2)*x19
+    x57 = (1/8)*x3 + (1/8)*x7
+    x58 = -x57
+    x59 = (1/8)*x8 - 1/8*x9
+    x60 = -x59
+    x61 = x37*x52
+    x62 = x42*x52
+    x63 = -x62
+    x64 = (1/2)*x61
+    x65 = (1/2)*x62
+    x66 = -x64
+    x67 = (1/4)*x47
+    x68 = x17*x52
+    x69 = x38**2
+    hess = np.zeros(shape + (3, 3, 16), dtype=float)
+    hess[..., 0, 0, 1] = -1/2*x3 - 1/2*x7
+    hess[..., 0, 0, 2] = -1/2*x8 + (1/2)*x9
+    hess[..., 0, 0, 4] = (1/2)*x12 - 1/2*x13
+    hess[..., 0, 0, 5] = -x15*x18
+    hess[..., 0, 0, 6] = x18*x19
+    hess[..., 0, 0, 8] = -1/2*x20 + (1/2)*x21
+    hess[..., 0, 0, 9] = -x25 + (1/4)*x28 - 1/4*np.sin(x1) - 1/4*np.sin(x22)
+    hess[..., 0, 0, 10] = -x29 - x30 - 1/4*np.cos(x1) - 1/4*np.cos(x22)
+    hess[..., 0, 0, 15] = -x16
+    hess[..., 0, 1, 1] = -x32
+    hess[..., 0, 1, 2] = x33
+    hess[..., 0, 1, 4] = x34
+    hess[..., 0, 1, 5] = x35
+    hess[..., 0, 1, 6] = x25 + (1/4)*x28
+    hess[..., 0, 1, 8] = x36
+    hess[..., 0, 1, 9] = x41
+    hess[..., 0, 1, 10] = x43
+    hess[..., 0, 2, 1] = x32
+    hess[..., 0, 2, 2] = -x33
+    hess[..., 0, 2, 5] = x45
+    hess[..., 0, 2, 6] = x46
+    hess[..., 0, 2, 9] = x49
+    hess[..., 0, 2, 10] = x51
+    hess[..., 1, 0, 1] = x53*x54
+    hess[..., 1, 0, 2] = x55*x56
+    hess[..., 1, 0, 4] = x34
+    hess[..., 1, 0, 5] = x35
+    hess[..., 1, 0, 6] = x41
+    hess[..., 1, 0, 8] = x36
+    hess[..., 1, 0, 9] = x41
+    hess[..., 1, 0, 10] = x43
+    hess[..., 1, 1, 1] = x58
+    hess[..., 1, 1, 2] = x60
+    hess[..., 1, 1, 4] = (1/8)*x12 - 1/8*x13
+    hess[..., 1, 1, 5] = -x61
+    hess[..., 1, 1, 6] = x63
+    hess[..., 1, 1, 8] = -1/8*x20 + (1/8)*x21
+    hess[..., 1, 1, 9] = x63
+    hess[..., 1, 1, 10] = x61
+    hess[..., 1, 2, 1] = x57
+    hess[..., 1, 2, 2] = x59
+    hess[..., 1, 2, 5] = x64
+    hess[..., 1, 2, 6] = x65
+    hess[..., 1, 2, 9] = x65
+    hess[..., 1, 2, 10] = x66
+    hess[..., 2, 0, 1] = x54*x55
+    hess[..., 2, 0, 2] = x53*x56
+    hess[..., 2, 0, 5] = x45
+    hess[..., 2, 0, 6] = x46
+    hess[..., 2, 0, 9] = x49
+    hess[..., 2, 0, 10] = x51
+    hess[..., 2, 1, 1] = x57
+    hess[..., 2, 1, 2] = x59
+    hess[..., 2, 1, 5] = x64
+    hess[..., 2, 1, 6] = x65
+    hess[..., 2, 1, 9] = x65
+    hess[..., 2, 1, 10] = x66
+    hess[..., 2, 2, 1] = x58
+    hess[..., 2, 2, 2] = x60
+    hess[..., 2, 2, 5] = x54*x68 - x67
+    hess[..., 2, 2, 6] = (1/4)*x50 - x56*x68
+    hess[..., 2, 2, 9] = -1/4*x50*x69 - 1/4*x62
+    hess[..., 2, 2, 10] = (1/4)*x61 - x67*x69
+    return hess
+
+def get_Wp3_ket(params):
+    ''' Ket phi (...,4) of Wp3 at params (...,3), and its derivatives (...,3,4).'''
+    params = np.asarray(params)
+    theta, alpha, beta = params[..., 0], params[..., 1], params[..., 2]
+    shape = params.shape[:-1]
+    x0 = (1/2)*np.sqrt(2)
+    x1 = x0*np.cos(theta)
+    x2 = 1j*alpha
+    x3 = np.exp(-x2)
+    x4 = np.exp(1j*beta)
+    x5 = x0*np.sin(theta)
+    x6 = x4*x5
+    x7 = x3*x6
+    x8 = np.exp(x2)
+    x9 = x5*x8
+    x10 = x1*x4
+    x11 = 1j*x7
+    phi = np.zeros(shape + (4,), dtype=complex)
+    phi[..., 0] = x1
+    phi[..., 1] = x7
+    phi[..., 2] = x9
+    phi[..., 3] = x10
+    dphi = np.zeros(shape + (3, 4), dtype=complex)
+    dphi[..., 0, 0] = -x5
+    dphi[..., 0, 1] = x10*x3
+    dphi[..., 0, 2] = x1*x8
+    dphi[..., 0, 3] = -x6
+    dphi[..., 1, 1] = -x11
+    dphi[..., 1, 2] = 1j*x9
+    dphi[..., 2, 1] = x11
+    dphi[..., 2, 3] = 1j*x10
+    return phi, dphi
+
+
+def get_Wp4_weights(params):
+    ''' Stokes weights of Wp4 (...,16) at params (...,2), and their derivatives (...,2,16).'''
+    params = np.asarray(params)
+    theta, alpha = params[..., 0], params[..., 1]
+    shape = params.shape[:-1]
+    x0 = 2*theta
+    x1 = alpha - x0
+    x2 = np.sin(x1)
+    x3 = alpha + x0
+    x4 = np.sin(x3)
+    x5 = (1/8)*x2 - 1/8*x4
+    x6 = -x5
+    x7 = (1/4)*np.cos(x0)
+    x8 = np.cos(x1)
+    x9 = np.cos(x3)
+    x10 = (1/8)*x8 - 1/8*x9
+    x11 = -x10
+    x12 = (1/4)*x8 + (1/4)*x9
+    x13 = -1/2*np.sin(x0)
+    x14 = (1/4)*x2 + (1/4)*x4
+    weights = np.zeros(shape + (16,), dtype=float)
+    weights[..., 0] = 1/4
+    weights[..., 1] = x6
+    weights[..., 4] = x6
+    weights[..., 5] = 1/4
+    weights[..., 10] = x7
+    weights[..., 11] = x10
+    weights[..., 14] = x11
+    weights[..., 15] = x7
+    grads = np.zeros(shape + (2, 16), dtype=float)
+    grads[..., 0, 1] = x12
+    grads[..., 0, 4] = x12
+    grads[..., 0, 10] = x13
+    grads[..., 0, 11] = x14
+    grads[..., 0, 14] = -x14
+    grads[..., 0, 15] = x13
+    grads[..., 1, 1] = x11
+    grads[..., 1, 4] = x11
+    grads[..., 1, 11] = x6
+    grads[..., 1, 14] = x5
+    return weights, grads
+
+def get_Wp4_weights_hess(params):
+    ''' Second derivatives of the Stokes weights of Wp4 (...,2,2,16) at params (...,2).'''
+    params = np.asarray(params)
+    theta, alpha = params[..., 0], params[..., 1]
+    shape = params.shape[:-1]
+    x0 = 2*theta
+    x1 = alpha - x0
+    x2 = np.sin(x1)
+    x3 = alpha + x0
+    x4 = np.sin(x3)
+    x5 = (1/2)*x2 - 1/2*x4
+    x6 = -np.cos(x0)
+    x7 = np.cos(x1)
+    x8 = np.cos(x3)
+    x9 = (1/2)*x7 - 1/2*x8
+    x10 = -1/4*x2 - 1/4*x4
+    x11 = (1/4)*x7 + (1/4)*x8
+    x12 = -x11
+    x13 = (1/8)*x2 - 1/8*x4
+    x14 = (1/8)*x7 - 1/8*x8
+    hess = np.zeros(shape + (2, 2, 16), dtype=float)
+    hess[..., 0, 0, 1] = x5
+    hess[..., 0, 0, 4] = x5
+    hess[..., 0, 0, 10] = x6
+    hess[..., 0, 0, 11] = -x9
+    hess[..., 0, 0, 14] = x9
+    hess[..., 0, 0, 15] = x6
+    hess[..., 0, 1, 1] = x10
+    hess[..., 0, 1, 4] = x10
+    hess[..., 0, 1, 11] = x11
+    hess[..., 0, 1, 14] = x12
+    hess[..., 1, 0, 1] = x10
+    hess[..., 1, 0, 4] = x10
+    hess[..., 1, 0, 11] = x11
+    hess[..., 1, 0, 14] = x12
+    hess[..., 1, 1, 1] = x13
+    hess[..., 1, 1, 4] = x13
+    hess[..., 1, 1, 11] = -x14
+    hess[..., 1, 1, 14] = x14
+    return hess
+
+def get_Wp4_ket(params):
+    ''' Ket phi (...,4) of Wp4 at params (...,2), and its derivatives (...,2,4).'''
+    params = np.asarray(params)
+    theta, alpha = params[..., 0], params[..., 1]
+    shape = params.shape[:-1]
+    x0 = (1/2)*np.sqrt(2)
+    x1 = x0*np.cos(theta)
+    x2 = np.exp(1j*alpha)
+    x3 = x0*np.sin(theta)
+    x4 = x2*x3
+    x5 = -x3
+    x6 = x1*x2
+    x7 = 1j*x4
+    phi = np.zeros(shape + (4,), dtype=complex)
+    phi[..., 0] = x1
+    phi[..., 1] = x4
+    phi[..., 2] = x4
+    phi[..., 3] = x1
+    dphi = np.zeros(shape + (2, 4), dtype=complex)
+    dphi[..., 0, 0] = x5
+    dphi[..., 0, 1] = x6
+    dphi[..., 0, 2] = x6
+    dphi[..., 0, 3] = x5
+    dphi[..., 1, 1] = x7
+    dphi[..., 1, 2] = x7
+    return phi, dphi
+
+
+def get_Wp5_weights(params):
+    ''' Stokes weights of Wp5 (...,16) at params (...,2), and their derivatives (...,2,16).'''
+    params = np.asarray(params)
+    theta, alpha = params[..., 0], params[..., 1]
+    shape = params.shape[:-1]
+    x0 = 2*theta
+    x1 = alpha - x0
+    x2 = np.sin(x1)
+    x3 = alpha + x0
+    x4 = np.sin(x3)
+    x5 = (1/8)*x2 - 1/8*x4
+    x6 = (1/4)*np.cos(x0)
+    x7 = np.cos(x1)
+    x8 = np.cos(x3)
+    x9 = (1/8)*x7 - 1/8*x8
+    x10 = -x9
+    x11 = (1/4)*x7 + (1/4)*x8
+    x12 = (1/2)*np.sin(x0)
+    x13 = -1/4*x2 - 1/4*x4
+    weights = np.zeros(shape + (16,), dtype=float)
+    weights[..., 0] = 1/4
+    weights[..., 1] = -x5
+    weights[..., 4] = x5
+    weights[..., 5] = -1/4
+    weights[..., 10] = -x6
+    weights[..., 11] = x10
+    weights[..., 14] = x10
+    weights[..., 15] = x6
+    grads = np.zeros(shape + (2, 16), dtype=float)
+    grads[..., 0, 1] = x11
+    grads[..., 0, 4] = -x11
+    grads[..., 0, 10] = x12
+    grads[..., 0, 11] = x13
+    grads[..., 0, 14] = x13
+    grads[..., 0, 15] = -x12
+    grads[..., 1, 1] = x10
+    grads[..., 1, 4] = x9
+    grads[..., 1, 11] = x5
+    grads[..., 1, 14] = x5
+    return weights, grads
+
+def get_Wp5_weights_hess(params):
+    ''' Second derivatives of the Stokes weights of Wp5 (...,2,2,16) at params (...,2).'''
+    params = np.asarray(params)
+    theta, alpha = params[..., 0], params[..., 1]
+    shape = params.shape[:-1]
+    x0 = 2*theta
+    x1 = alpha - x0
+    x2 = np.sin(x1)
+    x3 = alpha + x0
+    x4 = np.sin(x3)
+    x5 = (1/2)*x2 - 1/2*x4
+    x6 = np.cos(x0)
+    x7 = np.cos(x1)
+    x8 = np.cos(x3)
+    x9 = (1/2)*x7 - 1/2*x8
+    x10 = (1/4)*x2 + (1/4)*x4
+    x11 = -x10
+    x12 = -1/4*x7 - 1/4*x8
+    x13 = (1/8)*x2 - 1/8*x4
+    x14 = (1/8)*x7 - 1/8*x8
+    hess = np.zeros(shape + (2, 2, 16), dtype=float)
+    hess[..., 0, 0, 1] = x5
+    hess[..., 0, 0, 4] = -x5
+    hess[..., 0, 0, 10] = x6
+    hess[..., 0, 0, 11] = x9
+    hess[..., 0, 0, 14] = x9
+    hess[..., 0, 0, 15] = -x6
+    hess[..., 0, 1, 1] = x11
+    hess[..., 0, 1, 4] = x10
+    hess[..., 0, 1, 11] = x12
+    hess[..., 0, 1, 14] = x12
+    hess[..., 1, 0, 1] = x11
+    hess[..., 1, 0, 4] = x10
+    hess[..., 1, 0, 11] = x12
+    hess[..., 1, 0, 14] = x12
+    hess[..., 1, 1, 1] = x13
+    hess[..., 1, 1, 4] = -x13
+    hess[..., 1, 1, 11] = x14
+    hess[..., 1, 1, 14] = x14
+    return hess
+
+def get_Wp5_ket(params):
+    ''' Ket phi (...,4) of Wp5 at params (...,2), and its derivatives (...,2,4).'''
+    params = np.asarray(params)
+    theta, alpha = params[..., 0], params[..., 1]
+    shape = params.shape[:-1]
+    x0 = (1/2)*np.sqrt(2)
+    x1 = x0*np.cos(theta)
+    x2 = np.exp(1j*alpha)
+    x3 = x0*np.sin(theta)
+    x4 = x2*x3
+    x5 = x1*x2
+    x6 = 1j*x4
+    phi = np.zeros(shape + (4,), dtype=complex)
+    phi[..., 0] = x1
+    phi[..., 1] = x4
+    phi[..., 2] = -x4
+    phi[..., 3] = -x1
+    dphi = np.zeros(shape + (2, 4), dtype=complex)
+    dphi[..., 0, 0] = -x3
+    dphi[..., 0, 1] = x5
+    dphi[..., 0, 2] = -x5
+    dphi[..., 0, 3] = x3
+    dphi[..., 1, 1] = x6
+    dphi[..., 1, 2] = -x6
+    return phi, dphi
+
+
+def get_Wp6_weights(params):
+    ''' Stokes weights of Wp6 (...,16) at params (...,3), and their derivatives (...,3,16).'''
+    params = np.asarray(params)
+    theta, alpha, beta = params[..., 0], params[..., 1], params[..., 2]
+    shape = params.shape[:-1]
+    x0 = np.cos(theta)
+    x1 = x0**2
+    x2 = (1/2)*x1
+    x3 = np.sin(alpha)
+    x4 = x3*np.cos(alpha)
+    x5 = x2*x4
+    x6 = np.sin(theta)
+    x7 = x6**2
+    x8 = (1/2)*x7
+    x9 = np.sin(beta)
+    x10 = x9*np.cos(beta)
+    x11 = x10*x8
+    x12 = x9**2
+    x13 = x12*x8
+    x14 = x3**2
+    x15 = (1/2)*x14
+    x16 = x15*x7 - x15 + 1/4
+    x17 = 2*theta
+    x18 = -alpha + beta + x17
+    x19 = alpha - beta
+    x20 = x17 + x19
+    x21 = (1/8)*np.sin(x18) + (1/8)*np.sin(x20)
+    x22 = (1/8)*np.cos(x18) - 1/8*np.cos(x20)
+    x23 = -x22
+    x24 = alpha + beta
+    x25 = -x17 + x24
+    x26 = x17 + x24
+    x27 = -1/8*np.sin(x25) + (1/8)*np.sin(x26)
+    x28 = (1/8)*np.cos(x25) - 1/8*np.cos(x26)
+    x29 = 2*alpha
+    x30 = np.sin(x29)
+    x31 = 2*beta
+    x32 = np.sin(x31)
+    x33 = x0*x6
+    x34 = (1/2)*x33
+    x35 = 2*x7 - 1
+    x36 = -1/2*x35
+    x37 = -x2*np.cos(x29)
+    x38 = -x1*x4
+    x39 = -x28
+    x40 = x8*np.cos(x31)
+    x41 = x10*x7
+    weights = np.zeros(shape + (16,), dtype=float)
+    weights[..., 0] = 1/4
+    weights[..., 2] = x11 - x5
+    weights[..., 3] = x13 + x16 - x8
+    weights[..., 5] = x21
+    weights[..., 8] = x23
+    weights[..., 10] = x27
+    weights[..., 11] = x28
+    weights[..., 12] = (1/4)*np.cos(x17)
+    weights[..., 14] = -x11 - x5
+    weights[..., 15] = -x13 + x16
+    grads = np.zeros(shape + (3, 16), dtype=float)
+    grads[..., 0, 2] = x34*(x30 + x32)
+    grads[..., 0, 3] = x33*(x12 + x14 - 1)
+    grads[..., 0, 5] = x36*np.cos(x19)
+    grads[..., 0, 8] = (1/2)*x35*np.sin(x19)
+    grads[..., 0, 10] = x36*np.cos(x24)
+    grads[..., 0, 11] = x36*np.sin(x24)
+    grads[..., 0, 12] = -1/2*np.sin(x17)
+    grads[..., 0, 14] = x34*(x30 - x32)
+    grads[..., 0, 15] = x33*(-x12 + x14)
+    grads[..., 1, 2] = x37
+    grads[..., 1, 3] = x38
+    grads[..., 1, 5] = x23
+    grads[..., 1, 8] = -x21
+    grads[..., 1, 10] = x39
+    grads[..., 1, 11] = x27
+    grads[..., 1, 14] = x37
+    grads[..., 1, 15] = x38
+    grads[..., 2, 2] = x40
+    grads[..., 2, 3] = x41
+    grads[..., 2, 5] = x22
+    grads[..., 2, 8] = x21
+    grads[..., 2, 10] = x39
+    grads[..., 2, 11] = x27
+    grads[..., 2, 14] = -x40
+    grads[..., 2, 15] = -x41
+    return weights, grads
+
+def get_Wp6_weights_hess(params):
+    ''' Second derivatives of the Stokes weights of Wp6 (...,3,3,16) at params (...,3).'''
+    params = np.asarray(params)
+    theta, alpha, beta = params[..., 0], params[..., 1], params[..., 2]
+    shape = params.shape[:-1]
+    x0 = 2*beta
+    x1 = 2*theta
+    x2 = -x1
+    x3 = x0 + x2
+    x4 = (1/4)*np.sin(x3)
+    x5 = x0 + x1
+    x6 = (1/4)*np.sin(x5)
+    x7 = 2*alpha
+    x8 = x2 + x7
+    x9 = x1 + x7
+    x10 = (1/4)*np.sin(x8) + (1/4)*np.sin(x9)
+    x11 = np.cos(theta)
+    x12 = x11**2
+    x13 = np.sin(theta)
+    x14 = x13**2
+    x15 = -alpha + beta + x1
+    x16 = np.sin(x15)
+    x17 = alpha - beta
+    x18 = x1 + x17
+    x19 = np.sin(x18)
+    x20 = np.cos(x15)
+    x21 = np.cos(x18)
+    x22 = alpha + beta
+    x23 = x2 + x22
+    x24 = np.sin(x23)
+    x25 = x1 + x22
+    x26 = np.sin(x25)
+    x27 = np.cos(x23)
+    x28 = np.cos(x25)
+    x29 = np.cos(x1)
+    x30 = -x6
+    x31 = (1/4)*np.cos(x8)
+    x32 = (1/4)*np.cos(x9)
+    x33 = (1/4)*np.cos(x3)
+    x34 = -1/4*np.cos(x5)
+    x35 = np.cos(x7)
+    x36 = x11*x13
+    x37 = x35*x36
+    x38 = x31 - x32
+    x39 = np.sin(x17)
+    x40 = (1/2)*x29
+    x41 = x39*x40
+    x42 = np.cos(x17)
+    x43 = x40*x42
+    x44 = np.sin(x22)
+    x45 = -x40*x44
+    x46 = np.cos(x22)
+    x47 = x40*x46
+    x48 = np.cos(x0)
+    x49 = x36*x48
+    x50 = x33 + x34
+    x51 = x30 + x4
+    x52 = -x50
+    x53 = 2*x14 - 1
+    x54 = (1/2)*x53
+    x55 = x44*x54
+    x56 = -1/2*x53
+    x57 = x46*x56
+    x58 = x12*np.sin(x7)
+    x59 = -x12*x35
+    x60 = (1/8)*x16 + (1/8)*x19
+    x61 = -x60
+    x62 = (1/8)*x20 - 1/8*x21
+    x63 = (1/8)*x24 - 1/8*x26
+    x64 = -1/8*x27 + (1/8)*x28
+    x65 = -x62
+    x66 = x14*np.sin(x0)
+    x67 = x14*x48
+    hess = np.zeros(shape + (3, 3, 16), dtype=float)
+    hess[..., 0, 0, 2] = x10 + x4 + x6
+    hess[..., 0, 0, 3] = x12*(np.sin(alpha)**2 + np.sin(beta)**2 - 1) + x14*(np.cos(alpha)**2 + np.cos(beta)**2 - 1)
+    hess[..., 0, 0, 5] = -1/2*x16 - 1/2*x19
+    hess[..., 0, 0, 8] = (1/2)*x20 - 1/2*x21
+    hess[..., 0, 0, 10] = (1/2)*x24 - 1/2*x26
+    hess[..., 0, 0, 11] = -1/2*x27 + (1/2)*x28
+    hess[..., 0, 0, 12] = -x29
+    hess[..., 0, 0, 14] = x10 + x30 - x4
+    hess[..., 0, 0, 15] = -x31 - x32 + x33 - x34
+    hess[..., 0, 1, 2] = x37
+    hess[..., 0, 1, 3] = x38
+    hess[..., 0, 1, 5] = -x41
+    hess[..., 0, 1, 8] = -x43
+    hess[..., 0, 1, 10] = x45
+    hess[..., 0, 1, 11] = x47
+    hess[..., 0, 1, 14] = x37
+    hess[..., 0, 1, 15] = x38
+    hess[..., 0, 2, 2] = x49
+    hess[..., 0, 2, 3] = x50
+    hess[..., 0, 2, 5] = x41
+    hess[..., 0, 2, 8] = x43
+    hess[..., 0, 2, 10] = x45
+    hess[..., 0, 2, 11] = x47
+    hess[..., 0, 2, 14] = x51
+    hess[..., 0, 2, 15] = x52
+    hess[..., 1, 0, 2] = x37
+    hess[..., 1, 0, 3] = x38
+    hess[..., 1, 0, 5] = x39*x54
+    hess[..., 1, 0, 8] = x42*x54
+    hess[..., 1, 0, 10] = x55
+    hess[..., 1, 0, 11] = x57
+    hess[..., 1, 0, 14] = x37
+    hess[..., 1, 0, 15] = x38
+    hess[..., 1, 1, 2] = x58
+    hess[..., 1, 1, 3] = x59
+    hess[..., 1, 1, 5] = x61
+    hess[..., 1, 1, 8] = x62
+    hess[..., 1, 1, 10] = x63
+    hess[..., 1, 1, 11] = x64
+    hess[..., 1, 1, 14] = x58
+    hess[..., 1, 1, 15] = x59
+    hess[..., 1, 2, 5] = x60
+    hess[..., 1, 2, 8] = x65
+    hess[..., 1, 2, 10] = x63
+    hess[..., 1, 2, 11] = x64
+    hess[..., 2, 0, 2] = x49
+    hess[..., 2, 0, 3] = x50
+    hess[..., 2, 0, 5] = x39*x56
+    hess[..., 2, 0, 8] = x42*x56
+    hess[..., 2, 0, 10] = x55
+    hess[..., 2, 0, 11] = x57
+    hess[..., 2, 0, 14] = x51
+    hess[..., 2, 0, 15] = x52
+    hess[..., 2, 1, 5] = x60
+    hess[..., 2, 1, 8] = x65
+    hess[..., 2, 1, 10] = x63
+    hess[..., 2, 1, 11] = x64
+    hess[..., 2, 2, 2] = -x66
+    hess[..., 2, 2, 3] = x67
+    hess[..., 2, 2, 5] = x61
+    hess[..., 2, 2, 8] = x62
+    hess[..., 2, 2, 10] = x63
+    hess[..., 2, 2, 11] = x64
+    hess[..., 2, 2, 14] = x66
+    hess[..., 2, 2, 15] = -x67
+    return hess
+
+def get_Wp6_ket(params):
+    ''' Ket phi (...,4) of Wp6 at params (...,3), and its derivatives (...,3,4).'''
+    params = np.asarray(params)
+    theta, alpha, beta = params[..., 0], params[..., 1], params[..., 2]
+    shape = params.shape[:-1]
+    x0 = np.cos(alpha)
+    x1 = np.cos(theta)
+    x2 = x0*x1
+    x3 = np.sin(alpha)
+    x4 = x1*x3
+    x5 = np.sin(beta)
+    x6 = np.sin(theta)
+    x7 = x5*x6
+    x8 = np.cos(beta)
+    x9 = x6*x8
+    phi = np.zeros(shape + (4,), dtype=complex)
+    phi[..., 0] = x2
+    phi[..., 1] = 1j*x4
+    phi[..., 2] = 1j*x7
+    phi[..., 3] = x9
+    dphi = np.zeros(shape + (3, 4), dtype=complex)
+    dphi[..., 0, 0] = -x0*x6
+    dphi[..., 0, 1] = -1j*x3*x6
+    dphi[..., 0, 2] = 1j*x1*x5
+    dphi[..., 0, 3] = x1*x8
+    dphi[..., 1, 0] = -x4
+    dphi[..., 1, 1] = 1j*x2
+    dphi[..., 2, 2] = 1j*x9
+    dphi[..., 2, 3] = -x7
+    return phi, dphi
+
+
+def get_Wp7_weights(params):
+    ''' Stokes weights of Wp7 (...,16) at params (...,2), and their derivatives (...,2,16).'''
+    params = np.asarray(params)
+    theta, alpha = params[..., 0], params[..., 1]
+    shape = params.shape[:-1]
+    x0 = 2*theta
+    x1 = alpha - x0
+    x2 = np.cos(x1)
+    x3 = alpha + x0
+    x4 = np.cos(x3)
+    x5 = (1/8)*x2 - 1/8*x4
+    x6 = -x5
+    x7 = (1/4)*np.cos(x0)
+    x8 = np.sin(x1)
+    x9 = np.sin(x3)
+    x10 = (1/8)*x8 - 1/8*x9
+    x11 = -1/4*x8 - 1/4*x9
+    x12 = -1/2*np.sin(x0)
+    x13 = (1/4)*x2 + (1/4)*x4
+    weights = np.zeros(shape + (16,), dtype=float)
+    weights[..., 0] = 1/4
+    weights[..., 2] = x6
+    weights[..., 5] = x7
+    weights[..., 7] = x10
+    weights[..., 8] = x6
+    weights[..., 10] = 1/4
+    weights[..., 13] = -x10
+    weights[..., 15] = x7
+    grads = np.zeros(shape + (2, 16), dtype=float)
+    grads[..., 0, 2] = x11
+    grads[..., 0, 5] = x12
+    grads[..., 0, 7] = -x13
+    grads[..., 0, 8] = x11
+    grads[..., 0, 13] = x13
+    grads[..., 0, 15] = x12
+    grads[..., 1, 2] = x10
+    grads[..., 1, 7] = x5
+    grads[..., 1, 8] = x10
+    grads[..., 1, 13] = x6
+    return weights, grads
+
+def get_Wp7_weights_hess(params):
+    ''' Second derivatives of the Stokes weights of Wp7 (...,2,2,16) at params (...,2).'''
+    params = np.asarray(params)
+    theta, alpha = params[..., 0], params[..., 1]
+    shape = params.shape[:-1]
+    x0 = 2*theta
+    x1 = alpha - x0
+    x2 = np.cos(x1)
+    x3 = alpha + x0
+    x4 = np.cos(x3)
+    x5 = (1/2)*x2 - 1/2*x4
+    x6 = -np.cos(x0)
+    x7 = np.sin(x1)
+    x8 = np.sin(x3)
+    x9 = (1/2)*x7 - 1/2*x8
+    x10 = -1/4*x2 - 1/4*x4
+    x11 = (1/4)*x7 + (1/4)*x8
+    x12 = -x11
+    x13 = (1/8)*x2 - 1/8*x4
+    x14 = (1/8)*x7 - 1/8*x8
+    hess = np.zeros(shape + (2, 2, 16), dtype=float)
+    hess[..., 0, 0, 2] = x5
+    hess[..., 0, 0, 5] = x6
+    hess[..., 0, 0, 7] = -x9
+    hess[..., 0, 0, 8] = x5
+    hess[..., 0, 0, 13] = x9
+    hess[..., 0, 0, 15] = x6
+    hess[..., 0, 1, 2] = x10
+    hess[..., 0, 1, 7] = x11
+    hess[..., 0, 1, 8] = x10
+    hess[..., 0, 1, 13] = x12
+    hess[..., 1, 0, 2] = x10
+    hess[..., 1, 0, 7] = x11
+    hess[..., 1, 0, 8] = x10
+    hess[..., 1, 0, 13] = x12
+    hess[..., 1, 1, 2] = x13
+    hess[..., 1, 1, 7] = -x14
+    hess[..., 1, 1, 8] = x13
+    hess[..., 1, 1, 13] = x14
+    return hess
+
+def get_Wp7_ket(params):
+    ''' Ket phi (...,4) of Wp7 at params (...,2), and its derivatives (...,2,4).'''
+    params = np.asarray(params)
+    theta, alpha = params[..., 0], params[..., 1]
+    shape = params.shape[:-1]
+    x0 = (1/2)*np.sqrt(2)
+    x1 = x0*np.cos(theta)
+    x2 = np.exp(1j*alpha)
+    x3 = x0*np.sin(theta)
+    x4 = x2*x3
+    x5 = -x3
+    x6 = x1*x2
+    x7 = 1j*x4
+    phi = np.zeros(shape + (4,), dtype=complex)
+    phi[..., 0] = x1
+    phi[..., 1] = x4
+    phi[..., 2] = -x4
+    phi[..., 3] = x1
+    dphi = np.zeros(shape + (2, 4), dtype=complex)
+    dphi[..., 0, 0] = x5
+    dphi[..., 0, 1] = x6
+    dphi[..., 0, 2] = -x6
+    dphi[..., 0, 3] = x5
+    dphi[..., 1, 1] = x7
+    dphi[..., 1, 2] = -x7
+    return phi, dphi
+
+
+def get_Wp8_weights(params):
+    ''' Stokes weights of Wp8 (...,16) at params (...,2), and their derivatives (...,2,16).'''
+    params = np.asarray(params)
+    theta, alpha = params[..., 0], params[..., 1]
+    shape = params.shape[:-1]
+    x0 = 2*theta
+    x1 = alpha - x0
+    x2 = np.cos(x1)
+    x3 = alpha + x0
+    x4 = np.cos(x3)
+    x5 = (1/8)*x2 - 1/8*x4
+    x6 = -x5
+    x7 = (1/4)*np.cos(x0)
+    x8 = np.sin(x1)
+    x9 = np.sin(x3)
+    x10 = (1/8)*x8 - 1/8*x9
+    x11 = -x10
+    x12 = (1/4)*x8 + (1/4)*x9
+    x13 = (1/2)*np.sin(x0)
+    x14 = (1/4)*x2 + (1/4)*x4
+    weights = np.zeros(shape + (16,), dtype=float)
+    weights[..., 0] = 1/4
+    weights[..., 2] = x6
+    weights[..., 5] = -x7
+    weights[..., 7] = x11
+    weights[..., 8] = x5
+    weights[..., 10] = -1/4
+    weights[..., 13] = x11
+    weights[..., 15] = x7
+    grads = np.zeros(shape + (2, 16), dtype=float)
+    grads[..., 0, 2] = -x12
+    grads[..., 0, 5] = x13
+    grads[..., 0, 7] = x14
+    grads[..., 0, 8] = x12
+    grads[..., 0, 13] = x14
+    grads[..., 0, 15] = -x13
+    grads[..., 1, 2] = x10
+    grads[..., 1, 7] = x6
+    grads[..., 1, 8] = x11
+    grads[..., 1, 13] = x6
+    return weights, grads
+
+def get_Wp8_weights_hess(params):
+    ''' Second derivatives of the Stokes weights of Wp8 (...,2,2,16) at params (...,2).'''
+    params = np.asarray(params)
+    theta, alpha = params[..., 0], params[..., 1]
+    shape = params.shape[:-1]
+    x0 = 2*theta
+    x1 = alpha - x0
+    x2 = np.cos(x1)
+    x3 = alpha + x0
+    x4 = np.cos(x3)
+    x5 = (1/2)*x2 - 1/2*x4
+    x6 = np.cos(x0)
+    x7 = np.sin(x1)
+    x8 = np.sin(x3)
+    x9 = (1/2)*x7 - 1/2*x8
+    x10 = (1/4)*x2 + (1/4)*x4
+    x11 = -x10
+    x12 = -1/4*x7 - 1/4*x8
+    x13 = (1/8)*x2 - 1/8*x4
+    x14 = (1/8)*x7 - 1/8*x8
+    hess = np.zeros(shape + (2, 2, 16), dtype=float)
+    hess[..., 0, 0, 2] = x5
+    hess[..., 0, 0, 5] = x6
+    hess[..., 0, 0, 7] = x9
+    hess[..., 0, 0, 8] = -x5
+    hess[..., 0, 0, 13] = x9
+    hess[..., 0, 0, 15] = -x6
+    hess[..., 0, 1, 2] = x11
+    hess[..., 0, 1, 7] = x12
+    hess[..., 0, 1, 8] = x10
+    hess[..., 0, 1, 13] = x12
+    hess[..., 1, 0, 2] = x11
+    hess[..., 1, 0, 7] = x12
+    hess[..., 1, 0, 8] = x10
+    hess[..., 1, 0, 13] = x12
+    hess[..., 1, 1, 2] = x13
+    hess[..., 1, 1, 7] = x14
+    hess[..., 1, 1, 8] = -x13
+    hess[..., 1, 1, 13] = x14
+    return hess
+
+def get_Wp8_ket(params):
+    ''' Ket phi (...,4) of Wp8 at params (...,2), and its derivatives (...,2,4).'''
+    params = np.asarray(params)
+    theta, alpha = params[..., 0], params[..., 1]
+    shape = params.shape[:-1]
+    x0 = (1/2)*np.sqrt(2)
+    x1 = x0*np.cos(theta)
+    x2 = np.exp(1j*alpha)
+    x3 = x0*np.sin(theta)
+    x4 = x2*x3
+    x5 = x1*x2
+    x6 = 1j*x4
+    phi = np.zeros(shape + (4,), dtype=complex)
+    phi[..., 0] = x1
+    phi[..., 1] = x4
+    phi[..., 2] = x4
+    phi[..., 3] = -x1
+    dphi = np.zeros(shape + (2, 4), dtype=complex)
+    dphi[..., 0, 0] = -x3
+    dphi[..., 0, 1] = x5
+    dphi[..., 0, 2] = x5
+    dphi[..., 0, 3] = x3
+    dphi[..., 1, 1] = x6
+    dphi[..., 1, 2] = x6
+    return phi, dphi
+
+
+def get_Wp9_weights(params):
+    ''' Stokes weights of Wp9 (...,16) at params (...,3), and their derivatives (...,3,16).'''
+    params = np.asarray(params)
+    theta, alpha, beta = params[..., 0], params[..., 1], params[..., 2]
+    shape = params.shape[:-1]
+    x0 = np.cos(theta)
+    x1 = x0**2
+    x2 = (1/2)*x1
+    x3 = np.sin(alpha)
+    x4 = x3*np.cos(alpha)
+    x5 = x2*x4
+    x6 = np.sin(theta)
+    x7 = x6**2
+    x8 = (1/2)*x7
+    x9 = np.sin(beta)
+    x10 = x9*np.cos(beta)
+    x11 = x10*x8
+    x12 = x9**2
+    x13 = x12*x8
+    x14 = x3**2
+    x15 = (1/2)*x14
+    x16 = x15*x7 - x15 + 1/4
+    x17 = 2*theta
+    x18 = alpha + beta
+    x19 = -x17 + x18
+    x20 = x17 + x18
+    x21 = (1/8)*np.cos(x19) - 1/8*np.cos(x20)
+    x22 = -alpha + beta + x17
+    x23 = alpha - beta
+    x24 = x17 + x23
+    x25 = (1/8)*np.sin(x22) + (1/8)*np.sin(x24)
+    x26 = (1/8)*np.cos(x22) - 1/8*np.cos(x24)
+    x27 = -x26
+    x28 = -1/8*np.sin(x19) + (1/8)*np.sin(x20)
+    x29 = 2*alpha
+    x30 = np.sin(x29)
+    x31 = 2*beta
+    x32 = np.sin(x31)
+    x33 = x0*x6
+    x34 = (1/2)*x33
+    x35 = 2*x7 - 1
+    x36 = -1/2*x35
+    x37 = x2*np.cos(x29)
+    x38 = -x1*x4
+    x39 = -x21
+    x40 = x8*np.cos(x31)
+    x41 = x10*x7
+    weights = np.zeros(shape + (16,), dtype=float)
+    weights[..., 0] = 1/4
+    weights[..., 1] = x11 + x5
+    weights[..., 3] = x13 + x16 - x8
+    weights[..., 4] = x21
+    weights[..., 5] = x25
+    weights[..., 7] = x27
+    weights[..., 10] = x28
+    weights[..., 12] = (1/4)*np.cos(x17)
+    weights[..., 13] = -x11 + x5
+    weights[..., 15] = -x13 + x16
+    grads = np.zeros(shape + (3, 16), dtype=float)
+    grads[..., 0, 1] = x34*(-x30 + x32)
+    grads[..., 0, 3] = x33*(x12 + x14 - 1)
+    grads[..., 0, 4] = x36*np.sin(x18)
+    grads[..., 0, 5] = x36*np.cos(x23)
+    grads[..., 0, 7] = (1/2)*x35*np.sin(x23)
+    grads[..., 0, 10] = x36*np.cos(x18)
+    grads[..., 0, 12] = -1/2*np.sin(x17)
+    grads[..., 0, 13] = -x34*(x30 + x32)
+    grads[..., 0, 15] = x33*(-x12 + x14)
+    grads[..., 1, 1] = x37
+    grads[..., 1, 3] = x38
+    grads[..., 1, 4] = x28
+    grads[..., 1, 5] = x27
+    grads[..., 1, 7] = -x25
+    grads[..., 1, 10] = x39
+    grads[..., 1, 13] = x37
+    grads[..., 1, 15] = x38
+    grads[..., 2, 1] = x40
+    grads[..., 2, 3] = x41
+    grads[..., 2, 4] = x28
+    grads[..., 2, 5] = x26
+    grads[..., 2, 7] = x25
+    grads[..., 2, 10] = x39
+    grads[..., 2, 13] = -x40
+    grads[..., 2, 15] = -x41
+    return weights, grads
+
+def get_Wp9_weights_hess(params):
+    ''' Second derivatives of the Stokes weights of Wp9 (...,3,3,16) at params (...,3).'''
+    params = np.asarray(params)
+    theta, alpha, beta = params[..., 0], params[..., 1], params[..., 2]
+    shape = params.shape[:-1]
+    x0 = 2*beta
+    x1 = 2*theta
+    x2 = x0 + x1
+    x3 = (1/4)*np.sin(x2)
+    x4 = -x3
+    x5 = -x1
+    x6 = x0 + x5
+    x7 = (1/4)*np.sin(x6)
+    x8 = 2*alpha
+    x9 = x5 + x8
+    x10 = (1/4)*np.sin(x9)
+    x11 = x1 + x8
+    x12 = (1/4)*np.sin(x11)
+    x13 = x10 + x12
+    x14 = np.cos(theta)
+    x15 = x14**2
+    x16 = np.sin(theta)
+    x17 = x16**2
+    x18 = alpha + beta
+    x19 = x18 + x5
+    x20 = np.cos(x19)
+    x21 = x1 + x18
+    x22 = np.cos(x21)
+    x23 = -alpha + beta + x1
+    x24 = np.sin(x23)
+    x25 = alpha - beta
+    x26 = x1 + x25
+    x27 = np.sin(x26)
+    x28 = np.cos(x23)
+    x29 = np.cos(x26)
+    x30 = np.sin(x19)
+    x31 = np.sin(x21)
+    x32 = np.cos(x1)
+    x33 = (1/4)*np.cos(x9)
+    x34 = (1/4)*np.cos(x11)
+    x35 = (1/4)*np.cos(x6)
+    x36 = -1/4*np.cos(x2)
+    x37 = x10 - x12
+    x38 = x33 - x34
+    x39 = np.cos(x18)
+    x40 = (1/2)*x32
+    x41 = x39*x40
+    x42 = np.sin(x25)
+    x43 = x40*x42
+    x44 = np.cos(x25)
+    x45 = x40*x44
+    x46 = np.sin(x18)
+    x47 = -x40*x46
+    x48 = np.cos(x0)
+    x49 = x14*x16*x48
+    x50 = x35 + x36
+    x51 = x4 + x7
+    x52 = -x50
+    x53 = 2*x17 - 1
+    x54 = -1/2*x53
+    x55 = x39*x54
+    x56 = (1/2)*x53
+    x57 = x46*x56
+    x58 = -x15*np.sin(x8)
+    x59 = -x15*np.cos(x8)
+    x60 = -1/8*x20 + (1/8)*x22
+    x61 = (1/8)*x24 + (1/8)*x27
+    x62 = -x61
+    x63 = (1/8)*x28 - 1/8*x29
+    x64 = (1/8)*x30 - 1/8*x31
+    x65 = -x63
+    x66 = x17*np.sin(x0)
+    x67 = x17*x48
+    hess = np.zeros(shape + (3, 3, 16), dtype=float)
+    hess[..., 0, 0, 1] = -x13 - x4 + x7
+    hess[..., 0, 0, 3] = x15*(np.sin(alpha)**2 + np.sin(beta)**2 - 1) + x17*(np.cos(alpha)**2 + np.cos(beta)**2 - 1)
+    hess[..., 0, 0, 4] = -1/2*x20 + (1/2)*x22
+    hess[..., 0, 0, 5] = -1/2*x24 - 1/2*x27
+    hess[..., 0, 0, 7] = (1/2)*x28 - 1/2*x29
+    hess[..., 0, 0, 10] = (1/2)*x30 - 1/2*x31
+    hess[..., 0, 0, 12] = -x32
+    hess[..., 0, 0, 13] = -x13 - x3 - x7
+    hess[..., 0, 0, 15] = -x33 - x34 + x35 - x36
+    hess[..., 0, 1, 1] = x37
+    hess[..., 0, 1, 3] = x38
+    hess[..., 0, 1, 4] = x41
+    hess[..., 0, 1, 5] = -x43
+    hess[..., 0, 1, 7] = -x45
+    hess[..., 0, 1, 10] = x47
+    hess[..., 0, 1, 13] = x37
+    hess[..., 0, 1, 15] = x38
+    hess[..., 0, 2, 1] = x49
+    hess[..., 0, 2, 3] = x50
+    hess[..., 0, 2, 4] = x41
+    hess[..., 0, 2, 5] = x43
+    hess[..., 0, 2, 7] = x45
+    hess[..., 0, 2, 10] = x47
+    hess[..., 0, 2, 13] = x51
+    hess[..., 0, 2, 15] = x52
+    hess[..., 1, 0, 1] = x37
+    hess[..., 1, 0, 3] = x38
+    hess[..., 1, 0, 4] = x55
+    hess[..., 1, 0, 5] = x42*x56
+    hess[..., 1, 0, 7] = x44*x56
+    hess[..., 1, 0, 10] = x57
+    hess[..., 1, 0, 13] = x37
+    hess[..., 1, 0, 15] = x38
+    hess[..., 1, 1, 1] = x58
+    hess[..., 1, 1, 3] = x59
+    hess[..., 1, 1, 4] = x60
+    hess[..., 1, 1, 5] = x62
+    hess[..., 1, 1, 7] = x63
+    hess[..., 1, 1, 10] = x64
+    hess[..., 1, 1, 13] = x58
+    hess[..., 1, 1, 15] = x59
+    hess[..., 1, 2, 4] = x60
+    hess[..., 1, 2, 5] = x61
+    hess[..., 1, 2, 7] = x65
+    hess[..., 1, 2, 10] = x64
+    hess[..., 2, 0, 1] = x49
+    hess[..., 2, 0, 3] = x50
+    hess[..., 2, 0, 4] = x55
+    hess[..., 2, 0, 5] = x42*x54
+    hess[..., 2, 0, 7] = x44*x54
+    hess[..., 2, 0, 10] = x57
+    hess[..., 2, 0, 13] = x51
+    hess[..., 2, 0, 15] = x52
+    hess[..., 2, 1, 4] = x60
+    hess[..., 2, 1, 5] = x61
+    hess[..., 2, 1, 7] = x65
+    hess[..., 2, 1, 10] = x64
+    hess[..., 2, 2, 1] = -x66
+    hess[..., 2, 2, 3] = x67
+    hess[..., 2, 2, 4] = x60
+    hess[..., 2, 2, 5] = x62
+    hess[..., 2, 2, 7] = x63
+    hess[..., 2, 2, 10] = x64
+    hess[..., 2, 2, 13] = x66
+    hess[..., 2, 2, 15] = -x67
+    return hess
+
+def get_Wp9_ket(params):
+    ''' Ket phi (...,4) of Wp9 at params (...,3), and its derivatives (...,3,4).'''
+    params = np.asarray(params)
+    theta, alpha, beta = params[..., 0], params[..., 1], params[..., 2]
+    shape = params.shape[:-1]
+    x0 = np.cos(alpha)
+    x1 = np.cos(theta)
+    x2 = x0*x1
+    x3 = np.sin(alpha)
+    x4 = x1*x3
+    x5 = np.sin(beta)
+    x6 = np.sin(theta)
+    x7 = x5*x6
+    x8 = np.cos(beta)
+    x9 = x6*x8
+    phi = np.zeros(shape + (4,), dtype=complex)
+    phi[..., 0] = x2
+    phi[..., 1] = x4
+    phi[..., 2] = x7
+    phi[..., 3] = x9
+    dphi = np.zeros(shape + (3, 4), dtype=complex)
+    dphi[..., 0, 0] = -x0*x6
+    dphi[..., 0, 1] = -x3*x6
+    dphi[..., 0, 2] = x1*x5
+    dphi[..., 0, 3] = x1*x8
+    dphi[..., 1, 0] = -x4
+    dphi[..., 1, 1] = x2
+    dphi[..., 2, 2] = x9
+    dphi[..., 2, 3] = -x7
+    return phi, dphi
+
+
+WITNESS_NAMES = ['W1', 'W2', 'W3', 'W4', 'W5', 'W6', 'Wp1', 'Wp2', 'Wp3', 'Wp4', 'Wp5', 'Wp6', 'Wp7', 'Wp8', 'Wp9']
+WITNESS_NUM_PARAMS = [1, 1, 1, 1, 1, 1, 2, 2, 3, 2, 2, 3, 2, 2, 3]
+WITNESS_WEIGHTS = [get_W1_weights, get_W2_weights, get_W3_weights, get_W4_weights, get_W5_weights, get_W6_weights, get_Wp1_weights, get_Wp2_weights, get_Wp3_weights, get_Wp4_weights, get_Wp5_weights, get_Wp6_weights, get_Wp7_weights, get_Wp8_weights, get_Wp9_weights]
+WITNESS_WEIGHTS_HESS = [get_W1_weights_hess, get_W2_weights_hess, get_W3_weights_hess, get_W4_weights_hess, get_W5_weights_hess, get_W6_weights_hess, get_Wp1_weights_hess, get_Wp2_weights_hess, get_Wp3_weights_hess, get_Wp4_weights_hess, get_Wp5_weights_hess, get_Wp6_weights_hess, get_Wp7_weights_hess, get_Wp8_weights_hess, get_Wp9_weights_hess]
+WITNESS_KETS = [get_W1_ket, get_W2_ket, get_W3_ket, get_W4_ket, get_W5_ket, get_W6_ket, get_Wp1_ket, get_Wp2_ket, get_Wp3_ket, get_Wp4_ket, get_Wp5_ket, get_Wp6_ket, get_Wp7_ket, get_Wp8_ket, get_Wp9_ket]
@@ -0,0 +1,128 @@
+# file to generate the witness kernels in witness_kernels.py from one symbolic specification of the W and W' families
+# run with: python witness_sym.py
+from sympy import *
+from sympy.printing.numpy import NumPyPrinter
+
+# create angles
+theta, alpha, beta = symbols('theta alpha beta', real=True)
+
+## states ##
+HH, HV, VH, VV = [Matrix([1 if j==i else 0 for j in range(4)]) for i in range(4)]
+PHI_P = (HH + VV)/sqrt(2)
+PHI_M = (HH - VV)/sqrt(2)
+PSI_P = (HV + VH)/sqrt(2)
+PSI_M = (HV - VH)/sqrt(2)
+
+## the specification: each witness is PT(|phi><phi|) for the ket phi(params) ##
+WITNESS_SPEC = [
+    # W from summer 2022; just theta
+    ('W1', [theta], cos(theta)*PHI_P + sin(theta)*PHI_M),
+    ('W2', [theta], cos(theta)*PSI_P + sin(theta)*PSI_M),
+    ('W3', [theta], cos(theta)*PHI_P + sin(theta)*PSI_P),
+    ('W4', [theta], cos(theta)*PHI_M + sin(theta)*PSI_M),
+    ('W5', [theta], cos(theta)*PHI_P + I*sin(theta)*PSI_M),
+    ('W6', [theta], cos(theta)*PHI_M + I*sin(theta)*PSI_P),
+    # W'
+    ('Wp1', [theta, alpha], cos(theta)*PHI_P + exp(I*alpha)*sin(theta)*PHI_M),
+    ('Wp2', [theta, alpha], cos(theta)*PSI_P + exp(I*alpha)*sin(theta)*PSI_M),
+    ('Wp3', [theta, alpha, beta], (cos(theta)*HH + exp(I*(beta - alpha))*sin(theta)*HV + exp(I*alpha)*sin(theta)*VH + exp(I*beta)*cos(theta)*VV)/sqrt(2)),
+    ('Wp4', [theta, alpha], cos(theta)*PHI_P + exp(I*alpha)*sin(theta)*PSI_P),
+    ('Wp5', [theta, alpha], cos(theta)*PHI_M + exp(I*alpha)*sin(theta)*PSI_M),
+    ('Wp6', [theta, alpha, beta], cos(theta)*cos(alpha)*HH + I*cos(theta)*sin(alpha)*HV + I*sin(theta)*sin(beta)*VH + sin(theta)*cos(beta)*VV),
+    ('Wp7', [theta, alpha], cos(theta)*PHI_P + exp(I*alpha)*sin(theta)*PSI_M),
+    ('Wp8', [theta, alpha], cos(theta)*PHI_M + exp(I*alpha)*sin(theta)*PSI_P),
+    ('Wp9', [theta, alpha, beta], cos(theta)*cos(alpha)*HH + cos(theta)*sin(alpha)*HV + sin(theta)*sin(beta)*VH + sin(theta)*cos(beta)*VV),
+]
+
+## operators ##
+PAULI = [eye(2), Matrix([[0, 1], [1, 0]]), Matrix([[0, -I], [I, 0]]), Matrix([[1, 0], [0, -1]])]
+PAULI_2 = [kronecker_product(PAULI[a], PAULI[b]) for a in range(4) for b in range(4)] # II, IX, ..., ZZ
+
+def partial_transpose(M):
+    ''' Partial transpose on the second qubit of a 4x4 sympy matrix.'''
+    return Matrix(4, 4, lambda i, j: M[2*(i//2) + j%2, 2*(j//2) + i%2])
+
+def get_stokes_weights(phi):
+    ''' Weights w_s with Tr(PT(|phi><phi|) rho) = sum_s w_s S_s, for the Stokes parameters S_s = Tr(P_s rho).'''
+    W = partial_transpose(phi * phi.H)
+    return [simplify(expand_complex(re((W * P).trace()) / 4)) for P in PAULI_2]
+
+## code generation ##
+printer = NumPyPrinter()
+def to_code(expr):
+    return printer.doprint(expr).replace('numpy.', 'np.')
+
+def unpack_lines(params):
+    names = ', '.join(str(p) for p in params)
+    return ['    params = np.asarray(params)', f'    {names} = ' + ', '.join(f'params[..., {i}]' for i in range(len(params))), '    shape = params.shape[:-1]']
+
+def cse_lines(exprs):
+    ''' Common subexpressions, so each trig function is computed once.'''
+    subs, reduced = cse(exprs, symbols=numbered_symbols('x'))
+    return [f'    {s} = {to_code(e)}' for s, e in subs], reduced
+
+def fill_lines(out, exprs, index, dtype='float'):
+    ''' Writes the nonzero entries of exprs into a preallocated array, rather than stacking one broadcast array per entry; index(n) is the subscript of the n-th entry.'''
+    lines = [f'    {out} = np.zeros(shape + {tuple(index.shape)}, dtype={dtype})']
+    lines += [f'    {out}[..., {index(n)}] = {to_code(e)}' for n, e in enumerate(exprs) if e != 0]
+    return lines
+
+class Index:
+    ''' Subscripts of the flattened entries of an output with the given trailing shape.'''
+    def __init__(self, *shape):
+        self.shape = shape
+    def __call__(self, n):
+        idx = []
+        for d in reversed(self.shape):
+            idx.append(n % d)
+            n //= d
+        return ', '.join(str(i) for i in reversed(idx))
+
+def gen_kernels(name, params, phi):
+    ''' Source for the Stokes weights and the ket of one witness, each with its derivatives with respect to params.'''
+    k = len(params)
+    weights = get_stokes_weights(phi)
+    grads = [[simplify(diff(w, p)) for w in weights] for p in params]
+    ket = [expand(c) for c in phi]
+    dket = [[expand(diff(c, p)) for c in ket] for p in params]
+
+    src = []
+    # stokes weights
+    src += [f'def get_{name}_weights(params):', f"    ''' Stokes weights of {name} (...,16) at params (...,{k}), and their derivatives (...,{k},16).'''"]
+    src += unpack_lines(params)
+    lines, reduced = cse_lines(weights + sum(grads, []))
+    src += lines
+    src += fill_lines('weights', reduced[:16], Index(16))
+    src += fill_lines('grads', reduced[16:], Index(k, 16))
+    src += ['    return weights, grads', '']
+    # hessian of the stokes weights
+    hess = [[simplify(diff(g, p)) for g in grads[j]] for j in range(k) for p in params]
+    src += [f'def get_{name}_weights_hess(params):', f"    ''' Second derivatives of the Stokes weights of {name} (...,{k},{k},16) at params (...,{k}).'''"]
+    src += unpack_lines(params)
+    lines, reduced = cse_lines(sum(hess, []))
+    src += lines
+    src += fill_lines('hess', reduced, Index(k, k, 16))
+    src += ['    return hess', '']
+    # ket
+    src += [f'def get_{name}_ket(params):', f"    ''' Ket phi (...,4) of {name} at params (...,{k}), and its derivatives (...,{k},4).'''"]
+    src += unpack_lines(params)
+    lines, reduced = cse_lines(ket + sum(dket, []))
+    src += lines
+    src += fill_lines('phi', reduced[:4], Index(4), 'complex')
+    src += fill_lines('dphi', reduced[4:], Index(k, 4), 'complex')
+    src += ['    return phi, dphi', '', '']
+    return '\n'.join(src)
+
+if __name__ == '__main__':
+    names = [name for name, _, _ in WITNESS_SPEC]
+    src = ['# generated by witness_sym.py from the symbolic witness specification; do not edit by hand', '# each witness W = PT(|phi><phi|) has Tr(W rho) = sum_s w_s(params) S_s = <phi|PT(rho)|phi>', 'import numpy as np', '', '']
+    for name, params, phi in WITNESS_SPEC:
+        print('generating', name)
+        src.append(gen_kernels(name, params, phi))
+    src.append('WITNESS_NAMES = [' + ', '.join(f"'{n}'" for n in names) + ']')
+    src.append('WITNESS_NUM_PARAMS = [' + ', '.join(str(len(p)) for _, p, _ in WITNESS_SPEC) + ']')
+    src.append('WITNESS_WEIGHTS = [' + ', '.join(f'get_{n}_weights' for n in names) + ']')
+    src.append('WITNESS_WEIGHTS_HESS = [' + ', '.join(f'get_{n}_weights_hess' for n in names) + ']')
+    src.append('WITNESS_KETS = [' + ', '.join(f'get_{n}_ket' for n in names) + ']')
+    with open('witness_kernels.py', 'w') as f:
+        f.write('\n'.join(src) + '\n')